@@ -0,0 +1,206 @@
+import json
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from deal_store import DealStore, normalize_rows
+from logger import get_logger
+
+logger = get_logger("ann_index")
+
+CENTROIDS_FILE = "centroids.npy"
+ASSIGNMENTS_FILE = "assignments.i32"
+
+# Rows scored at once when assigning vectors to centroids
+ASSIGN_CHUNK = 65536
+
+
+def _nearest_centroids(vectors, centroids):
+    """
+    Returns the index of the most similar centroid for each row.
+    """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK], dtype=np.float32)
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors, n_lists, iterations=10, sample_size=None, seed=0):
+    """
+    Spherical k-means over a sample of normalized vectors. Returns (n_lists, dim) unit centroids.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = sample_size or n_lists * 64
+    if len(vectors) > sample_size:
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    else:
+        sample = np.asarray(vectors)
+    n_lists = min(n_lists, len(sample))
+
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+
+        # Re-seed clusters that lost all their points
+        empty = np.flatnonzero(np.bincount(assignments, minlength=n_lists) == 0)
+        if len(empty):
+            sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index over a DealStore's embeddings.
+
+    Each stored row is assigned to its nearest k-means centroid. A query scores the
+    centroids, then scores exactly only the rows in its n_probe closest lists.
+    Raising n_probe trades speed for recall; n_probe == n_lists is exact search.
+
+    The index lives in a directory next to the store: the centroids, plus one int32
+    list id per store row appended in row order.
+    """
+
+    def __init__(self, path, n_probe=8):
+        self.path = Path(path)
+        self.n_probe = n_probe
+        self.centroids = np.load(self.path / CENTROIDS_FILE)
+
+        assignments_file = self.path / ASSIGNMENTS_FILE
+        assignments = np.fromfile(assignments_file, dtype=np.int32) if assignments_file.exists() else np.zeros(0, dtype=np.int32)
+        self._assignments = open(assignments_file, "ab")
+        self._build_lists(assignments)
+
+    @classmethod
+    def exists(cls, path):
+        return (Path(path) / CENTROIDS_FILE).exists()
+
+    @classmethod
+    def build(cls, path, embeddings, n_lists=None, n_probe=8, iterations=10):
+        """
+        Trains centroids on the embeddings, assigns every row and writes a new index.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        n_lists = n_lists or max(1, int(4 * np.sqrt(len(embeddings))))
+
+        start = time.perf_counter()
+        centroids = train_centroids(embeddings, n_lists, iterations=iterations)
+        np.save(path / CENTROIDS_FILE, centroids)
+        _nearest_centroids(embeddings, centroids).tofile(path / ASSIGNMENTS_FILE)
+        logger.info(
+            f"Built IVF index with {len(centroids)} lists over {len(embeddings)} rows "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return cls(path, n_probe=n_probe)
+
+    def _build_lists(self, assignments):
+        self.count = len(assignments)
+        n_lists = len(self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        sizes = np.bincount(assignments, minlength=n_lists)
+        bounds = np.concatenate(([0], np.cumsum(sizes)))
+
+        self._sizes = sizes.astype(np.int64)
+        self._lists = []
+        for k in range(n_lists):
+            rows = np.empty(max(16, sizes[k] * 2), dtype=np.int64)
+            rows[:sizes[k]] = order[bounds[k]:bounds[k + 1]]
+            self._lists.append(rows)
+
+    def add(self, vectors):
+        """
+        Assigns new rows (appended after the current count) to their nearest lists.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        assignments = _nearest_centroids(vectors, self.centroids)
+        rows = np.arange(self.count, self.count + len(vectors))
+
+        for k in np.unique(assignments):
+            new_rows = rows[assignments == k]
+            size = self._sizes[k]
+            if size + len(new_rows) > len(self._lists[k]):
+                grown = np.empty(max(2 * len(self._lists[k]), size + len(new_rows)), dtype=np.int64)
+                grown[:size] = self._lists[k][:size]
+                self._lists[k] = grown
+            self._lists[k][size:size + len(new_rows)] = new_rows
+            self._sizes[k] += len(new_rows)
+
+        self._assignments.write(assignments.tobytes())
+        self._assignments.flush()
+        self.count += len(vectors)
+
+    def search(self, queries, embeddings, n_probe=None):
+        """
+        Returns a (rows, scores) pair per query, covering every row in its probed lists.
+        """
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        centroid_scores = queries @ self.centroids.T
+        if n_probe < len(self.centroids):
+            probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(len(self.centroids)), centroid_scores.shape)
+
+        results = []
+        for query, probe in zip(queries, probes):
+            rows = np.concatenate([self._lists[k][:self._sizes[k]] for k in probe])
+            rows.sort()
+            results.append((rows, embeddings[rows] @ query))
+        return results
+
+    def close(self):
+        self._assignments.close()
+
+
+def recall_report(store, index, n_queries=200, top_k=5, n_probe_values=(1, 2, 4, 8, 16, 32), seed=0):
+    """
+    Measures recall@k and per-query latency of the index against exact search,
+    using stored rows as queries (each query's own row is excluded).
+    """
+    embeddings = store.embeddings
+    rng = np.random.default_rng(seed)
+    query_rows = rng.choice(len(embeddings), min(n_queries, len(embeddings)), replace=False)
+    queries = np.asarray(embeddings[query_rows])
+
+    def top(rows, scores, own_row):
+        keep = rows != own_row
+        rows, scores = rows[keep], scores[keep]
+        if len(rows) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            rows = rows[best]
+        return set(rows.tolist())
+
+    start = time.perf_counter()
+    all_rows = np.arange(len(embeddings))
+    exact = [top(all_rows, embeddings @ query, own) for query, own in zip(queries, query_rows)]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = {"rows": len(embeddings), "lists": len(index.centroids), "top_k": top_k, "exact_ms": round(exact_ms, 3), "n_probe": {}}
+    for n_probe in n_probe_values:
+        if n_probe > len(index.centroids):
+            break
+        start = time.perf_counter()
+        found = [top(rows, scores, own) for (rows, scores), own in zip(index.search(queries, embeddings, n_probe), query_rows)]
+        ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(a & e) / len(e) for a, e in zip(found, exact) if e])
+        report["n_probe"][n_probe] = {"recall": round(float(recall), 4), "query_ms": round(ann_ms, 3)}
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python ann_index.py <store_dir>")
+        sys.exit(1)
+    store = DealStore(sys.argv[1])
+    index_path = Path(sys.argv[1]) / "ivf"
+    if IVFIndex.exists(index_path):
+        index = IVFIndex(index_path)
+        index.add(store.embeddings[index.count:])
+    else:
+        index = IVFIndex.build(index_path, store.embeddings)
+    print(json.dumps(recall_report(store, index), indent=2))
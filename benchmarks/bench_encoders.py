@@ -0,0 +1,135 @@
+"""
+Compares DealEvaluator encoder backends: encoding throughput and how their deal
+ratings agree with each other and with the price each listing was generated at.
+
+    python benchmarks/bench_encoders.py [--backends sentence-transformers,onnx,hashing]
+                                        [--corpus 2000] [--queries 200]
+                                        [--onnx-model models/all-MiniLM-L6-v2/model.onnx]
+
+Listings are synthetic variations of a few products with known typical prices;
+a query's expected rating is its price against its product's typical price.
+Backends that cannot load (no model download, onnxruntime missing) are reported
+with their error. Prints a JSON summary.
+"""
+import argparse
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from deal_evaluator import DealEvaluator, _rating_for_ratio
+from encoders import BACKENDS
+
+PRODUCTS = [
+    ("macbook pro m1 laptop 13 inch", 900),
+    ("gaming monitor 27 inch 144hz", 220),
+    ("ipad air tablet 64gb wifi", 350),
+    ("dell xps 15 laptop i7", 750),
+    ("nvidia rtx 3080 graphics card", 550),
+    ("samsung 1tb ssd nvme", 80),
+    ("mechanical keyboard rgb cherry switches", 70),
+    ("logitech wireless mouse", 25),
+    ("nintendo switch console with dock", 230),
+    ("sony wh-1000xm4 headphones noise cancelling", 180),
+]
+EXTRAS = "used good condition like new works great barely used with box charger included pickup only cash".split()
+
+
+def make_listings(rng, count, prefix):
+    """
+    Listings as (listing, typical price of its product).
+    """
+    listings = []
+    for n in range(count):
+        title, typical = rng.choice(PRODUCTS)
+        words = title.split()
+        rng.shuffle(words)
+        listing = {
+            "title": " ".join(words[:rng.randint(3, len(words))]),
+            "description": " ".join(rng.choices(EXTRAS, k=rng.randint(3, 8))),
+            "price": round(typical * rng.uniform(0.6, 1.4)),
+            "link": f"{prefix}{n}",
+        }
+        listings.append((listing, typical))
+    return listings
+
+
+def bench_backend(backend, options, corpus, queries, workdir):
+    evaluator = DealEvaluator(
+        storage_file=workdir / backend / "deal_data.pkl", encoder=backend, encoder_options=options
+    )
+    texts = [evaluator._get_text_representation(listing) for listing, _ in corpus]
+    # Load the model outside the timing
+    evaluator.model.encode(texts[:2])
+    start = time.perf_counter()
+    vectors = evaluator.model.encode(texts, batch_size=64)
+    encode_s = time.perf_counter() - start
+
+    evaluator.add_listings(listing for listing, _ in corpus)
+    start = time.perf_counter()
+    ratings = [rating for rating, _ in evaluator.evaluate_deals([listing for listing, _ in queries])]
+    evaluate_s = time.perf_counter() - start
+    evaluator.data.close()
+    evaluator.embedding_cache.close()
+    return {
+        "encoder": evaluator.encoder_id,
+        "dim": int(vectors.shape[1]),
+        "texts_per_s": round(len(texts) / encode_s, 1),
+        "evaluate_ms": round(evaluate_s * 1000 / len(queries), 3),
+    }, ratings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--corpus", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--onnx-model", help="exported model.onnx (tokenizer.json next to it)")
+    parser.add_argument("--hashing-dim", type=int, default=512)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(0)
+    corpus = make_listings(rng, args.corpus, "c")
+    queries = make_listings(rng, args.queries, "q")
+    expected = [_rating_for_ratio(listing["price"] / typical) for listing, typical in queries]
+    options = {
+        "onnx": {"model_path": args.onnx_model} if args.onnx_model else None,
+        "hashing": {"dim": args.hashing_dim},
+    }
+
+    results = {}
+    ratings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in [name for name in args.backends.split(",") if name]:
+            if backend == "onnx" and not args.onnx_model:
+                results[backend] = {"error": "pass --onnx-model"}
+                continue
+            try:
+                results[backend], ratings[backend] = bench_backend(
+                    backend, options.get(backend), corpus, queries, Path(tmp)
+                )
+            except Exception as e:
+                results[backend] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            results[backend]["rating_matches_generated_price"] = round(
+                sum(a == b for a, b in zip(ratings[backend], expected)) / len(expected), 4
+            )
+
+    # Agreement with the reference backend (the first one that ran)
+    reference = next(iter(ratings), None)
+    for backend, backend_ratings in ratings.items():
+        results[backend]["rating_agreement_with"] = reference
+        results[backend]["rating_agreement"] = round(
+            sum(a == b for a, b in zip(backend_ratings, ratings[reference])) / len(expected), 4
+        )
+    print(json.dumps({"corpus": args.corpus, "queries": args.queries, "backends": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares filters.FilterEngine with per-search matches_filters calls.
+
+    python benchmarks/bench_filters.py [--searches 100] [--excludes 20] [--rows 5000]
+
+Prints a JSON summary.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from filters import matches_filters, FilterEngine
+
+WORDS = (
+    "gaming monitor 27 144hz 4k ipad pro air macbook dell hp lenovo thinkpad laptop desktop "
+    "rtx 3080 3070 ryzen intel ssd 1tb broken cracked parts repair new sealed used mint"
+).split()
+
+
+def make_searches(count, excludes, rng):
+    return [
+        {
+            "name": f"search {i}",
+            "max_price": rng.choice([None, 200, 500, 1000]),
+            "keywords": {
+                "include": rng.sample(WORDS, rng.randint(0, 2)),
+                "exclude": rng.sample(WORDS, min(excludes, len(WORDS))),
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def make_rows(count, rng):
+    return [
+        {"title": " ".join(rng.choices(WORDS, k=rng.randint(3, 10))), "price": rng.randint(10, 1500), "link": str(i)}
+        for i in range(count)
+    ]
+
+
+def run(searches, rows):
+    start = time.perf_counter()
+    baseline = [[i for i, rules in enumerate(searches) if matches_filters(row, rules)] for row in rows]
+    baseline_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = FilterEngine(searches)
+    compile_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [engine.matching(row) for row in rows]
+    engine_s = time.perf_counter() - start
+
+    assert compiled == baseline, "engine disagrees with matches_filters"
+    return {
+        "searches": len(searches),
+        "rows": len(rows),
+        "matches_filters_s": round(baseline_s, 4),
+        "engine_compile_s": round(compile_s, 4),
+        "engine_s": round(engine_s, 4),
+        "speedup": round(baseline_s / engine_s, 2) if engine_s else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--excludes", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    result = run(make_searches(args.searches, args.excludes, rng), make_rows(args.rows, rng))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compares in-process detail page parsing with parse_pool.ParsePool.
+
+    python benchmarks/bench_parse_pool.py [--corpus DIR] [--record DIR] [--pages 2000]
+                                          [--workers 0,2,4] [--chunks 1,16,64]
+
+--corpus reads recorded pages (*.html) from DIR; otherwise synthetic pages are
+generated, and --record saves them to DIR for later runs. workers=0 is the
+single-process baseline. Prints a JSON summary.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from html_parsing import get_backend
+from parse_pool import ParsePool
+from synthetic import detail_page
+
+
+def load_pages(args):
+    if args.corpus:
+        paths = sorted(Path(args.corpus).glob("*.html"))[:args.pages]
+        return [path.read_text(encoding="utf-8") for path in paths]
+    rng = random.Random(0)
+    pages = [detail_page(rng, n) for n in range(args.pages)]
+    if args.record:
+        record = Path(args.record)
+        record.mkdir(parents=True, exist_ok=True)
+        for n, page in enumerate(pages):
+            (record / f"{n:06d}.html").write_text(page, encoding="utf-8")
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus")
+    parser.add_argument("--record")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--workers", default=f"0,2,{os.cpu_count() or 1}")
+    parser.add_argument("--chunks", default="1,16,64")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    pages = load_pages(args)
+    megabytes = sum(len(page) for page in pages) / 1e6
+    expected = None
+    runs = []
+    for workers in sorted({int(w) for w in args.workers.split(",")}):
+        for chunk_size in [int(c) for c in args.chunks.split(",")] if workers else [1]:
+            with ParsePool(workers=workers, chunk_size=chunk_size) as pool:
+                # Let the workers start before timing
+                pool.parse_details_many(pages[:workers])
+                start = time.perf_counter()
+                parsed = pool.parse_details_many(pages)
+                elapsed = time.perf_counter() - start
+            if expected is None:
+                expected = parsed
+            assert parsed == expected, "pool output differs from in-process parsing"
+            runs.append({
+                "workers": workers,
+                "chunk_size": chunk_size,
+                "seconds": round(elapsed, 3),
+                "pages_per_s": round(len(pages) / elapsed, 1),
+                "mb_per_s": round(megabytes / elapsed, 2),
+            })
+
+    baseline = runs[0]["seconds"]
+    for run in runs:
+        run["speedup"] = round(baseline / run["seconds"], 2)
+    print(json.dumps({
+        "pages": len(pages),
+        "corpus_mb": round(megabytes, 2),
+        "backend": get_backend(),
+        "cpus": os.cpu_count(),
+        "runs": runs,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
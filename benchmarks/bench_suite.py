@@ -0,0 +1,297 @@
+"""
+Offline benchmark suite: parsing, filtering, deal evaluation and an end-to-end run
+against a local stand-in for Craigslist and the Discord webhook.
+
+    python benchmarks/bench_suite.py [--corpus 10000,100000] [--only parse,evaluate] [--output results.json]
+
+Everything is synthetic (see synthetic.py) and the sentence-transformers model is
+replaced by a hashing encoder, so no network access or model download is needed.
+Prints a JSON document; save one per commit and diff them to spot regressions.
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from requests.adapters import HTTPAdapter
+
+import deal_evaluator
+from deal_evaluator import DealEvaluator
+from deal_store import DealStore
+from filters import FilterEngine, matches_filters
+from html_parsing import DETAIL_PAGE, SEARCH_RESULTS, make_soup
+from scraper import parse_details, parse_listing
+from bench_filters import make_rows, make_searches
+from synthetic import HashingModel, clustered_embeddings, corpus_entries, detail_page, make_listing, search_page
+
+BENCHMARKS = ("parse", "filters", "evaluate", "end_to_end")
+
+
+def _summary(durations):
+    """
+    Summarizes per-call durations (seconds).
+    """
+    ordered = sorted(durations)
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "total_s": round(total, 4),
+        "ops_per_s": round(len(ordered) / total, 1) if total else None,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+    }
+
+
+def _time_each(func, inputs):
+    durations = []
+    for value in inputs:
+        start = time.perf_counter()
+        func(value)
+        durations.append(time.perf_counter() - start)
+    return _summary(durations)
+
+
+def bench_parse(args, rng):
+    listings = [make_listing(rng, n) for n in range(args.rows)]
+    html = search_page(listings)
+    start = time.perf_counter()
+    rows = make_soup(html, SEARCH_RESULTS).select(".cl-static-search-result")
+    soup_s = time.perf_counter() - start
+    assert len(rows) == len(listings)
+
+    pages = [detail_page(rng, n) for n in range(args.details)]
+    return {
+        "search_page_soup_s": round(soup_s, 4),
+        "parse_listing": _time_each(parse_listing, rows),
+        "parse_details": _time_each(lambda page: parse_details(make_soup(page, DETAIL_PAGE)), pages),
+    }
+
+
+def bench_filters(args, rng):
+    searches = make_searches(args.searches, 20, rng)
+    rows = make_rows(args.rows, rng)
+    engine = FilterEngine(searches)
+    return {
+        "searches": len(searches),
+        "matches_filters": _time_each(lambda row: [s for s in searches if matches_filters(row, s)], rows),
+        "filter_engine": _time_each(engine.matching, rows),
+    }
+
+
+def _build_corpus(path, size):
+    store = DealStore(path)
+    for start, chunk in clustered_embeddings(size):
+        store.extend(corpus_entries(start, len(chunk)), chunk)
+    store.close()
+
+
+def bench_evaluate(args, rng, workdir):
+    deal_evaluator.SentenceTransformer = HashingModel
+    results = {}
+    for size in args.corpus:
+        storage_file = workdir / f"corpus_{size}" / "deal_data.pkl"
+        start = time.perf_counter()
+        _build_corpus(storage_file.with_suffix(".store"), size)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        evaluator = DealEvaluator(storage_file=storage_file)
+        open_s = time.perf_counter() - start
+
+        queries = [make_listing(rng, size + n) for n in range(args.queries)]
+        # Warm the model and embedding cache so the timings are search cost only
+        evaluator.find_similar_batch(queries)
+        additions = [make_listing(rng, size + args.queries + n) for n in range(args.adds)]
+        results[str(size)] = {
+            "build_s": round(build_s, 2),
+            "open_s": round(open_s, 3),
+            "ann": evaluator.ann is not None,
+            "find_similar_listings": _time_each(evaluator.find_similar_listings, queries),
+            "evaluate_deal_neighbors": _time_each(evaluator.evaluate_deal, queries),
+            "add_listing": _time_each(evaluator.add_listing, additions),
+        }
+
+        # Same store rated against the nearest price cluster instead
+        start = time.perf_counter()
+        clustered = DealEvaluator(storage_file=storage_file, rating="clusters", cluster_min_rows=0)
+        results[str(size)]["cluster_build_s"] = round(time.perf_counter() - start, 3)
+        clustered.evaluate_deals(queries)
+        results[str(size)]["evaluate_deal_clusters"] = _time_each(clustered.evaluate_deal, queries)
+        results[str(size)]["add_listing_clusters"] = _time_each(
+            clustered.add_listing, [make_listing(rng, size + args.queries + args.adds + n) for n in range(args.adds)]
+        )
+    return results
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """
+    Serves search pages at /search/<category>, detail pages at /item/<n>.html and a webhook.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path.startswith("/search/"):
+            self._send(200, self.server.search_html)
+        elif path.startswith("/item/"):
+            n = int(path.rsplit("/", 1)[-1].split(".")[0])
+            self._send(200, detail_page(random.Random(n), n).encode())
+        else:
+            self._send(404)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.messages += 1
+        self._send(204)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _RedirectAdapter(HTTPAdapter):
+    """
+    Sends requests for Craigslist hosts to the stand-in server instead.
+    """
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base = urlsplit(base_url)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = urlunsplit((self.base.scheme, self.base.netloc, parts.path, parts.query, ""))
+        return super().send(request, **kwargs)
+
+
+def bench_end_to_end(args, rng, workdir):
+    from main import Scanner
+
+    deal_evaluator.SentenceTransformer = HashingModel
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    listings = [make_listing(rng, n, base_url=base_url) for n in range(args.e2e_rows)]
+    for n, listing in enumerate(listings):
+        listing["link"] = f"{base_url}/item/{n}.html"
+    server.search_html = search_page(listings).encode()
+    server.messages = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    run_dir = workdir / "end_to_end"
+    config = {
+        "fetch": {"concurrency": 8, "rate_limits": {"default": {"rate": 10_000, "burst": 100}}},
+        "state": {"path": str(run_dir / "state.sqlite")},
+        "detail_cache": {"path": str(run_dir / "detail_cache.sqlite")},
+        "notify": {"outbox": str(run_dir / "outbox.sqlite"), "flush_interval": 0.1},
+        "searches": [
+            {"name": f"search {i}", "query": query, "location": "ames", "category": "sya", "max_price": 1500,
+             "keywords": {"include": [query], "exclude": ["broken"]}}
+            for i, query in enumerate(["monitor", "laptop", "ipad", "ssd", "gaming"][:args.e2e_searches])
+        ],
+    }
+    scanner = Scanner(config, f"{base_url}/webhook", evaluator=DealEvaluator(storage_file=run_dir / "deal_data.pkl"))
+    scanner.client.session.mount("https://", _RedirectAdapter(base_url))
+
+    start = time.perf_counter()
+    cold = scanner.run()
+    cold_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warm = scanner.run()
+    warm_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scanner.close()
+    drain_s = time.perf_counter() - start
+    server.shutdown()
+    return {
+        "rows_per_search": len(listings),
+        "searches": len(config["searches"]),
+        "cold_run_s": round(cold_s, 3),
+        "cold_matches": sum(cold.values()),
+        "warm_run_s": round(warm_s, 3),
+        "warm_matches": sum(warm.values()),
+        "notify_drain_s": round(drain_s, 3),
+        "webhook_messages": server.messages,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma-separated subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--corpus", default="10000", help="comma-separated corpus sizes, e.g. 10000,100000,1000000")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--details", type=int, default=300)
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--adds", type=int, default=200)
+    parser.add_argument("--e2e-rows", type=int, default=120)
+    parser.add_argument("--e2e-searches", type=int, default=5)
+    parser.add_argument("--output", help="also write the JSON here")
+    args = parser.parse_args()
+    args.corpus = [int(size) for size in args.corpus.split(",") if size]
+    only = [name for name in args.only.split(",") if name]
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    # Per-listing INFO logs would dominate the timings
+    logging.disable(logging.INFO)
+    rng = random.Random(0)
+    results = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for name in only:
+            start = time.perf_counter()
+            if name == "parse":
+                result = bench_parse(args, rng)
+            elif name == "filters":
+                result = bench_filters(args, rng)
+            elif name == "evaluate":
+                result = bench_evaluate(args, rng, workdir)
+            else:
+                result = bench_end_to_end(args, rng, workdir)
+            result["elapsed_s"] = round(time.perf_counter() - start, 2)
+            results["benchmarks"][name] = result
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
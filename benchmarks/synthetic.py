@@ -0,0 +1,127 @@
+"""
+Synthetic inputs for the benchmarks: Craigslist-like search and detail pages that
+match the selectors in scraper.py, listings, and embedding corpora.
+"""
+import random
+import zlib
+import numpy as np
+
+WORDS = (
+    "gaming monitor 27 144hz 4k ipad pro air macbook dell hp lenovo thinkpad laptop desktop "
+    "rtx 3080 3070 ryzen intel ssd 1tb broken cracked parts repair new sealed used mint "
+    "keyboard mouse webcam speakers router printer tablet charger dock hub cable"
+).split()
+LOCATIONS = ["Ames", "Boone", "Nevada", "Ankeny", "Des Moines", "Marshalltown"]
+CONDITIONS = ["new", "like new", "excellent", "good", "fair", "salvage"]
+DIM = 384
+
+_PAGE_HEAD = """<!DOCTYPE html>
+<html><head><title>craigslist</title>
+<script>window.cl = {"searchState": "<li class='cl-static-search-result'>"};</script>
+<link rel="stylesheet" href="/static/www.css"></head>
+<body><header class="global-header"><a href="/">craigslist</a><nav>post account favorites</nav></header>
+"""
+_PAGE_FOOT = """<footer><ul><li>help</li><li>safety</li><li>privacy</li><li>terms</li></ul></footer>
+</body></html>"""
+
+
+def make_title(rng):
+    return " ".join(rng.choices(WORDS, k=rng.randint(3, 9)))
+
+
+def make_listing(rng, n, base_url="https://ames.craigslist.org"):
+    return {
+        "title": make_title(rng),
+        "price": rng.randint(5, 2000),
+        "link": f"{base_url}/sys/d/item-{n}/{7700000000 + n}.html",
+        "location": rng.choice(LOCATIONS),
+    }
+
+
+def search_page(listings):
+    """
+    A search results page with one .cl-static-search-result row per listing.
+    """
+    rows = []
+    for listing in listings:
+        rows.append(
+            f'<li class="cl-static-search-result" title="{listing["title"]}">'
+            f'<a href="{listing["link"]}"><div class="title">{listing["title"]}</div>'
+            f'<div class="details"><div class="price">${listing["price"]:,}</div>'
+            f'<div class="location">{listing["location"]}</div></div></a></li>'
+        )
+    return (
+        _PAGE_HEAD
+        + '<div class="cl-search-toolbar">sort: newest</div><ol class="cl-static-search-results">'
+        + "\n".join(rows)
+        + "</ol>"
+        + _PAGE_FOOT
+    )
+
+
+def detail_page(rng, n, paragraphs=4, attributes=6, images=8):
+    """
+    A listing detail page with #postingbody, .attrgroup spans and #thumbs links.
+    """
+    body = "<br>\n".join(" ".join(rng.choices(WORDS, k=rng.randint(10, 30))) for _ in range(paragraphs))
+    attrs = "".join(
+        f"<span>{name}: {value}</span>"
+        for name, value in [("condition", rng.choice(CONDITIONS))]
+        + [(f"attribute {i}", rng.choice(WORDS)) for i in range(attributes - 1)]
+    )
+    thumbs = "".join(f'<a href="https://images.craigslist.org/{n}_{i}_600x450.jpg"><img></a>' for i in range(images))
+    return (
+        _PAGE_HEAD
+        + f'<section class="body"><h1 class="postingtitle">listing {n}</h1>'
+        + f'<div class="mapAndAttrs"><div class="mapbox">map</div><div class="attrgroup">{attrs}</div></div>'
+        + f'<section id="postingbody"><div class="print-information print-qrcode-container">'
+        + f'<p class="print-qrcode-label">QR Code Link to This Post</p></div>{body}</section>'
+        + f'<div id="thumbs">{thumbs}</div></section>'
+        + _PAGE_FOOT
+    )
+
+
+class HashingModel:
+    """
+    Stand-in for SentenceTransformer: hashes words into a fixed-size bag-of-words vector,
+    so the evaluator can be benchmarked without downloading a model.
+    """
+
+    def __init__(self, *args, dim=DIM, **kwargs):
+        self.dim = dim
+
+    def encode(self, text, **kwargs):
+        texts = [text] if isinstance(text, str) else list(text)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, t in enumerate(texts):
+            for word in t.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        return vectors[0] if isinstance(text, str) else vectors
+
+
+def clustered_embeddings(count, dim=DIM, clusters=256, noise=0.35, seed=0):
+    """
+    Unit vectors scattered around random cluster centres, roughly like embeddings of
+    listings that fall into product groups. Yields (start, chunk) pieces to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    chunk_size = 50_000
+    for start in range(0, count, chunk_size):
+        n = min(chunk_size, count - start)
+        chunk = centres[rng.integers(0, clusters, n)] + noise * rng.standard_normal((n, dim)).astype(np.float32) / np.sqrt(dim)
+        chunk /= np.linalg.norm(chunk, axis=1, keepdims=True)
+        yield start, chunk
+
+
+def corpus_entries(start, count, seed=0):
+    """
+    Store entries (as DealEvaluator writes them) for rows start..start+count.
+    """
+    rng = random.Random(seed + start)
+    entries = []
+    for n in range(start, start + count):
+        listing = make_listing(rng, n)
+        entries.append({"link": listing["link"], "title": listing["title"], "price": listing["price"], "details": listing})
+    return entries
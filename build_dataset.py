@@ -1,13 +1,54 @@
-import time
 import os
 import yaml
-from scraper import fetch_listings, parse_listing, fetch_details, parse_details
+from scraper import HEADERS, fetch_listings, fetch_search_html, save_empty_response, parse_listing, fetch_parsed_details_many
+from fetcher import AsyncFetcher
+from http_client import HttpClient
+from http_cache import DetailCache
+from html_parsing import set_backend
+from parse_pool import ParsePool
+from crawler import crawl, crawl_key, PAGE_SIZE
+from state import SeenStore
 from deal_evaluator import DealEvaluator
 from logger import get_logger
+import metrics
 
 logger = get_logger("dataset_builder")
 
-def build_dataset():
+def _parse_rows(rows):
+    items = []
+    for row in rows:
+        try:
+            items.append(parse_listing(row))
+        except Exception as e:
+            logger.error(f"Error processing item: {e}")
+    return items
+
+def _iter_new_items(items, existing_links, fetcher, chunk_size=32, cache=None, pool=None):
+    """
+    Takes parsed listings that are not in the database yet, deep-fetches them chunk_size
+    at a time through the fetcher (and detail cache, if any) and yields each item.
+    With a ParsePool, detail pages are parsed in worker processes.
+    """
+    new_items = []
+    for item in items:
+        if item['link'] in existing_links:
+            # logger.debug(f"Skipping existing item: {item['title']}")
+            continue
+        existing_links.add(item['link'])
+        new_items.append(item)
+
+    for start in range(0, len(new_items), chunk_size):
+        chunk = new_items[start:start + chunk_size]
+        logger.info(f"Processing {start + 1}-{start + len(chunk)}/{len(new_items)} new items")
+        
+        # Deep fetch for description and attributes
+        # Failed fetches come back as {}; adding what we have is better than nothing
+        details = fetch_parsed_details_many([item['link'] for item in chunk], fetcher, cache=cache, pool=pool)
+        for item, item_details in zip(chunk, details):
+            item.update(item_details)
+            yield item
+
+def build_dataset(batch_size=256):
     # Load config for location
     config_path = "inputs.yaml"
     if not os.path.exists(config_path):
@@ -44,67 +85,85 @@ def build_dataset():
     # syp: computer parts
     categories = ["sya", "ela", "vga", "syp"]
     
-    evaluator = DealEvaluator()
+    if config.get('parser'):
+        set_backend(config['parser'])
+    metrics.configure(config.get('metrics'))
+
+    evaluator = DealEvaluator.from_config(config.get('evaluator'))
+    # Per-host rate limits keep the crawl polite without fixed sleeps
+    client = HttpClient.from_config(config.get('http'), headers=HEADERS, fetch_config=config.get('fetch'))
+    fetcher = AsyncFetcher.from_config(config.get('fetch'), client=client)
+    # Unchanged detail pages are answered from disk on re-runs
+    cache = DetailCache.from_config(config.get('detail_cache'))
+    # Optionally parse pages in worker processes instead of on this thread
+    dataset_config = config.get('dataset', {})
+    pool = ParsePool.from_config(dataset_config)
+    # Per-category high-water marks live next to the scanner's seen state
+    state_config = config.get('state', {})
+    marks = SeenStore(state_config.get('path'))
+    crawl_config = config.get('crawl', {})
+    sort = crawl_config.get('sort', 'date')
+    page_size = crawl_config.get('page_size', PAGE_SIZE)
     
     # Cache existing links to avoid unnecessary processing
-    existing_links = {d['link'] for d in evaluator.data}
+    existing_links = set(evaluator.data.links())
     logger.info(f"Loaded {len(existing_links)} existing items from database.")
 
-    for category in categories:
-        logger.info(f"--- Fetching listings for category: {category} ---")
-        try:
-            # Empty query to get all items in the category
-            rows = fetch_listings(
-                location=location,
-                category=category,
-                query="", 
-                lat=lat,
-                lon=lon,
-                search_distance=search_distance
-            )
-        except Exception as e:
-            logger.error(f"Failed to fetch listings for {category}: {e}")
-            continue
-            
-        logger.info(f"Found {len(rows)} items in {category}")
-        
-        new_items_count = 0
-        for i, row in enumerate(rows):
-            try:
-                item = parse_listing(row)
-                
-                if item['link'] in existing_links:
-                    # logger.debug(f"Skipping existing item: {item['title']}")
-                    continue
+    # Worker processes are shut down even when the crawl raises
+    try:
+        for category in categories:
+            logger.info(f"--- Fetching listings for category: {category} ---")
+            search = dict(location=location, category=category, query="", lat=lat, lon=lon, search_distance=search_distance)
+            key = crawl_key({**search, 'sort': sort}, namespace="dataset")
 
-                logger.info(f"Processing {i+1}/{len(rows)}: {item['title']}")
-                
-                # Deep fetch for description and attributes
-                try:
-                    soup = fetch_details(item['link'])
-                    details = parse_details(soup)
-                    item.update(details)
-                except Exception as e:
-                    logger.warning(f"Failed to fetch details for {item['link']}: {e}")
-                    # We can still add it without details if we want, but details are better for embeddings
-                    # Let's skip if details failed, or maybe add what we have?
-                    # Adding what we have is better than nothing.
-                
-                evaluator.add_listing(item)
-                existing_links.add(item['link'])
-                new_items_count += 1
-                
-                # Sleep to be polite to Craigslist servers
-                time.sleep(2)
-                
+            def fetch_page(offset):
+                # Empty query to get all items in the category
+                if pool is not None:
+                    html = fetch_search_html(**search, fetcher=fetcher, offset=offset, sort=sort)
+                    page = pool.parse_search(html)
+                    if not page and offset == 0:
+                        save_empty_response(html, location, category, "")
+                    return page
+                return _parse_rows(fetch_listings(**search, fetcher=fetcher, offset=offset, sort=sort))
+
+            try:
+                # The first build backfills max_pages deep; later builds stop at the previous newest posting
+                items, newest = crawl(
+                    fetch_page,
+                    high_water=marks.high_water(key),
+                    max_pages=dataset_config.get('max_pages', 5),
+                    page_size=page_size,
+                    link=lambda item: item['link'],
+                )
             except Exception as e:
-                logger.error(f"Error processing item: {e}")
+                logger.error(f"Failed to fetch listings for {category}: {e}")
                 continue
+            
+            logger.info(f"Found {len(items)} items in {category}")
+        
+            # Items are yielded as they are deep-fetched and embedded in batches
+            new_items = _iter_new_items(
+                items, existing_links, fetcher, chunk_size=dataset_config.get('chunk_size', 32), cache=cache, pool=pool
+            )
+            new_items_count = evaluator.add_listings(new_items, batch_size=batch_size)
         
-        logger.info(f"Added {new_items_count} new items from {category}")
-        # Sleep between categories
-        time.sleep(5)
+            logger.info(f"Added {new_items_count} new items from {category}")
+            # The mark only moves past rows that are stored, or the next build would never crawl them again
+            unstored = sum(1 for item in items if item['link'] not in evaluator.data)
+            if unstored:
+                logger.warning(f"{unstored} items from {category} were not stored; keeping its high-water mark")
+            elif newest is not None:
+                marks.set_high_water(key, newest)
+    finally:
+        if pool is not None:
+            pool.close()
 
+    client.log_stats()
+    marks.close()
+    if cache is not None:
+        cache.log_stats()
+        cache.close()
+    metrics.write()
     logger.info("Dataset build complete.")
 
 if __name__ == "__main__":
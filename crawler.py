@@ -0,0 +1,73 @@
+import re
+from urllib.parse import urlencode
+from logger import get_logger
+
+logger = get_logger("crawler")
+
+# Results per page of a Craigslist search
+PAGE_SIZE = 120
+
+_POSTING_ID = re.compile(r"/(\d+)\.html")
+
+
+def posting_id(link):
+    """
+    The numeric posting id in a listing URL (.../7712345678.html), or None.
+    Ids grow over time, so a larger id is a newer posting.
+    """
+    match = _POSTING_ID.search(link or "")
+    return int(match.group(1)) if match else None
+
+
+def row_link(row):
+    anchor = row.find("a")
+    return anchor.get("href") if anchor else None
+
+
+def crawl_key(params, namespace="search"):
+    """
+    Identifies a listings request in the high-water mark table.
+    """
+    query = urlencode(sorted((name, value) for name, value in params.items() if value not in (None, "")))
+    return f"{namespace}:{query}"
+
+
+def crawl(fetch_page, high_water=None, max_pages=1, page_size=PAGE_SIZE, link=row_link):
+    """
+    Walks result pages newest-first and stops once it reaches already-seen territory.
+
+    fetch_page(offset) returns one page of results; link(result) extracts its URL.
+    Every result on a fetched page is kept (the seen check still handles them), but
+    no further page is requested once a page holds a posting at or below high_water,
+    runs short, or max_pages is reached. With no high_water yet (first run or a
+    backfill) the walk goes up to max_pages deep.
+
+    Returns (results, newest_id): the de-duplicated results and the highest posting
+    id among them (or the old high_water if none were newer).
+    """
+    results = []
+    links = set()
+    newest = high_water
+    pages = 0
+    for page in range(max_pages):
+        page_results = fetch_page(page * page_size)
+        pages += 1
+        reached = False
+        for result in page_results:
+            url = link(result)
+            # A new posting can push a row onto the next page between requests
+            if url in links:
+                continue
+            links.add(url)
+            results.append(result)
+            pid = posting_id(url)
+            if pid is None:
+                continue
+            if newest is None or pid > newest:
+                newest = pid
+            if high_water is not None and pid <= high_water:
+                reached = True
+        if reached or len(page_results) < page_size:
+            break
+    logger.info(f"Crawled {pages} pages, {len(results)} results, newest posting {newest}")
+    return results, newest
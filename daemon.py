@@ -0,0 +1,162 @@
+import os
+import random
+import signal
+import threading
+import time
+from logger import get_logger
+from main import Scanner, find_config, load_config, load_webhook_url
+
+logger = get_logger("daemon")
+
+DEFAULT_INTERVAL = 900
+DEFAULT_JITTER = 0.1
+DEFAULT_RELOAD_CHECK = 5
+
+# Sections read once at startup; changing them needs a restart
+_STARTUP_SECTIONS = ("state", "http", "fetch", "detail_cache", "notify", "evaluator")
+
+
+class SearchSchedule:
+    """
+    Next run time of each search, keyed by search name.
+
+    A search runs every `interval` seconds (its own `interval` key, or the daemon
+    default), randomly stretched or shrunk by up to `jitter` of the interval so
+    searches don't all hit Craigslist at the same moment.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER, rng=None):
+        self.interval = interval
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+        self.next_run = {}
+
+    def interval_for(self, search):
+        return search.get("interval", self.interval)
+
+    def update(self, searches, now):
+        """
+        Follows a (re)loaded search list: new searches are due now, removed ones are dropped.
+        """
+        names = {search["name"] for search in searches}
+        for name in list(self.next_run):
+            if name not in names:
+                del self.next_run[name]
+        for name in names:
+            self.next_run.setdefault(name, now)
+
+    def due(self, searches, now):
+        return [search for search in searches if self.next_run.get(search["name"], now) <= now]
+
+    def reschedule(self, searches, now):
+        for search in searches:
+            interval = self.interval_for(search)
+            spread = interval * self.jitter
+            self.next_run[search["name"]] = now + interval + self.rng.uniform(-spread, spread)
+
+    def next_due(self):
+        return min(self.next_run.values(), default=None)
+
+
+class Daemon:
+    """
+    Keeps one Scanner (and so one loaded model, seen store and connection pool)
+    alive and runs each search on its own schedule. inputs.yaml is re-read when
+    its modification time changes; a config that fails to load is ignored and the
+    previous one kept.
+    """
+
+    def __init__(self, config_path, scanner, clock=time.monotonic):
+        self.config_path = config_path
+        self.scanner = scanner
+        self.clock = clock
+        self._mtime = os.path.getmtime(config_path)
+        self._apply(scanner.config)
+
+    def _apply(self, config):
+        daemon_config = config.get("daemon", {})
+        if not hasattr(self, "schedule"):
+            self.schedule = SearchSchedule(
+                daemon_config.get("interval", DEFAULT_INTERVAL), daemon_config.get("jitter", DEFAULT_JITTER)
+            )
+        else:
+            self.schedule.interval = daemon_config.get("interval", DEFAULT_INTERVAL)
+            self.schedule.jitter = daemon_config.get("jitter", DEFAULT_JITTER)
+        self.reload_check = daemon_config.get("reload_check", DEFAULT_RELOAD_CHECK)
+        self.schedule.update(config["searches"], self.clock())
+
+    def reload_if_changed(self):
+        """
+        Reloads the config if the file changed since the last check. Returns True if it was applied.
+        """
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        try:
+            config = load_config(self.config_path)
+        except Exception as e:
+            logger.error(f"Ignoring invalid {self.config_path}: {e}")
+            return False
+
+        old = self.scanner.config
+        changed = [section for section in _STARTUP_SECTIONS if config.get(section) != old.get(section)]
+        if changed:
+            logger.warning(f"Changes to {', '.join(changed)} take effect after a restart")
+        self.scanner.configure(config)
+        self._apply(config)
+        logger.info(f"Reloaded {self.config_path}: {len(config['searches'])} searches")
+        return True
+
+    def poll(self):
+        """
+        Runs every search that is due, in one pipeline run so they can share fetches.
+        """
+        due = self.schedule.due(self.scanner.config["searches"], self.clock())
+        if not due:
+            return {}
+        started = time.perf_counter()
+        matches_found = self.scanner.run(due)
+        self.schedule.reschedule(due, self.clock())
+        logger.info(
+            f"Polled {len(due)} searches in {time.perf_counter() - started:.2f}s, "
+            f"{sum(matches_found.values())} new matches"
+        )
+        return matches_found
+
+    def run(self, stop=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.reload_if_changed()
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Poll failed")
+            next_due = self.schedule.next_due()
+            wait = self.reload_check if next_due is None else max(0.0, next_due - self.clock())
+            stop.wait(min(wait, self.reload_check))
+
+
+def main():
+    config_path = find_config()
+    scanner = Scanner(load_config(config_path), load_webhook_url())
+    daemon = Daemon(config_path, scanner)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    print(f"🕒 Watching {len(scanner.config['searches'])} searches (Ctrl+C to stop)")
+    try:
+        daemon.run(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scanner.log_stats()
+        scanner.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,185 @@
+import json
 import os
 from pathlib import Path
 import numpy as np
-import joblib
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from deal_store import DealStore, migrate_pickle, normalize_rows, _json_default
+from embedding_cache import EmbeddingCache
+from ann_index import IVFIndex
+from price_clusters import PriceClusters
+from quantization import DTYPES
+from encoders import encoder_id, create_encoder
 from logger import get_logger
+import metrics
 
 logger = get_logger("deal_evaluator")
 
+# Imported on first encode: sentence_transformers pulls in torch, which takes seconds
+# and hundreds of MB that runs without any matching listing never need
+SentenceTransformer = None
+
+# Upper bound on the number of similarity scores computed at once in batched search
+SIMILARITY_CHUNK_ELEMENTS = 16_000_000
+
+# The only model stores were built with before the encoder was recorded in them
+LEGACY_MODEL = 'all-MiniLM-L6-v2'
+
+# "neighbors" rates against the mean of the top-5 similar listings;
+# "clusters" rates against the median of the nearest price cluster
+RATING_MODES = ("neighbors", "clusters")
+
+
+def _normalize(vector):
+    """
+    Returns a float32 copy of the vector scaled to unit length.
+    """
+    return normalize_rows(np.asarray(vector).ravel())[0]
+
+
+def _rating_for_ratio(ratio):
+    """
+    Maps price / reference price to a rating label.
+    """
+    if ratio < 0.7:
+        return "Incredible Deal"
+    if ratio < 0.85:
+        return "Great Deal"
+    if ratio < 1.0:
+        return "Good Deal"
+    if ratio < 1.15:
+        return "Fair Price"
+    if ratio < 1.3:
+        return "Slightly Overpriced"
+    return "Overpriced"
+
+
+def _sentence_transformer_class():
+    global SentenceTransformer
+    if SentenceTransformer is None:
+        from sentence_transformers import SentenceTransformer as cls
+        SentenceTransformer = cls
+    return SentenceTransformer
+
 class DealEvaluator:
-    def __init__(self, model_name='all-MiniLM-L6-v2', storage_file='data/deal_data.pkl'):
+    def __init__(self, model_name='all-MiniLM-L6-v2', storage_file='data/deal_data.pkl', cache_size=100_000,
+                 ann_threshold=50_000, ann_probe=8, rating='neighbors', n_clusters=256, cluster_min_rows=2000,
+                 embedding_dtype='float32', rescore=50, encoder='sentence-transformers', encoder_options=None):
         self.storage_file = Path(storage_file)
         self.storage_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        logger.info(f"Loading SentenceTransformer model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        # Listings live in an append-only store next to the legacy pickle path
+        self.store_path = self.storage_file.with_suffix('.store')
+        self.model_name = model_name
+        # sentence-transformers, onnx or hashing; the resulting encoder id is recorded with the stored vectors
+        self.encoder = encoder
+        self.encoder_options = encoder_options or {}
+        self.encoder_id = encoder_id(encoder, model_name, self.encoder_options)
+        if embedding_dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding dtype {embedding_dtype!r}, expected one of {', '.join(DTYPES)}")
+        # With float16/int8 candidates are scored on a compact copy and the best `rescore` per query exactly
+        self.embedding_dtype = embedding_dtype
+        self.rescore = rescore
+        # Loaded by the first encode that misses the embedding cache
+        self._model = None
         self.data = self._load_data()
+        self._bind_encoder()
+        # Reposts and repeated queries reuse embeddings instead of re-running the model
+        self.embedding_cache = EmbeddingCache(
+            self.storage_file.with_suffix('.cache.sqlite'), self.encoder_id, max_entries=cache_size
+        )
+        # Approximate search kicks in once the store reaches ann_threshold rows (None disables it)
+        self.ann_threshold = ann_threshold
+        self.ann_probe = ann_probe
+        self.ann_path = self.store_path / 'ivf'
+        self.ann = self._load_ann()
+        if rating not in RATING_MODES:
+            raise ValueError(f"Unknown rating mode {rating!r}, expected one of {', '.join(RATING_MODES)}")
+        # Cluster rating starts once the store holds cluster_min_rows listings; until then it falls back to neighbours
+        self.rating = rating
+        self.n_clusters = n_clusters
+        self.cluster_min_rows = cluster_min_rows
+        self.clusters_path = self.store_path / 'clusters'
+        self.clusters = self._load_clusters() if rating == 'clusters' else None
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds an evaluator from the `evaluator` section of inputs.yaml (all keys optional).
+        """
+        return cls(**(config or {}))
+
+    @property
+    def model(self):
+        if self._model is None:
+            if self.encoder == 'sentence-transformers':
+                logger.info(f"Loading SentenceTransformer model: {self.model_name}")
+                self._model = _sentence_transformer_class()(self.model_name)
+            else:
+                logger.info(f"Loading {self.encoder} encoder: {self.encoder_id}")
+                self._model = create_encoder(self.encoder, self.encoder_options)
+        return self._model
+
+    def _bind_encoder(self):
+        """
+        Records the encoder in a new store, or refuses to mix its vectors with another encoder's.
+        """
+        stored = self.data.encoder
+        if stored is None and len(self.data):
+            # Stores from before encoders were recorded were all built with LEGACY_MODEL
+            stored = encoder_id('sentence-transformers', LEGACY_MODEL)
+        if stored is not None and stored != self.encoder_id:
+            raise ValueError(
+                f"{self.store_path} holds vectors from encoder {stored}, not {self.encoder_id}; "
+                f"use a separate storage_file per encoder"
+            )
+        if self.data.encoder is None:
+            self.data.set_encoder(self.encoder_id)
 
     def _load_data(self):
-        if self.storage_file.exists():
+        if not self.store_path.exists() and self.storage_file.exists():
+            # migrate_pickle only moves a finished store into place, so raising here
+            # leaves no store behind and the next run retries instead of starting empty
             try:
-                data = joblib.load(self.storage_file)
-                logger.info(f"Loaded {len(data)} listings from {self.storage_file}")
-                return data
+                migrate_pickle(self.storage_file, self.store_path)
             except Exception as e:
-                logger.error(f"Failed to load deal data: {e}")
-                return []
-        return []
+                logger.error(f"Failed to migrate deal data from {self.storage_file}: {e}")
+                raise
 
-    def _save_data(self):
-        try:
-            joblib.dump(self.data, self.storage_file)
-            logger.debug(f"Saved {len(self.data)} listings to {self.storage_file}")
-        except Exception as e:
-            logger.error(f"Failed to save deal data: {e}")
+        store = DealStore(self.store_path, compact_dtype=self.embedding_dtype)
+        logger.info(f"Loaded {len(store)} listings from {self.store_path}")
+        return store
+
+    def _load_ann(self):
+        if self.ann_threshold is None:
+            return None
+        if IVFIndex.exists(self.ann_path):
+            index = IVFIndex(self.ann_path, n_probe=self.ann_probe)
+            if index.count > len(self.data):
+                # The store was truncated after a crash; the index no longer lines up
+                logger.warning("ANN index is ahead of the store, rebuilding")
+                index.close()
+                return IVFIndex.build(self.ann_path, self.data.embeddings, n_probe=self.ann_probe)
+            # Catch up on rows appended without the index
+            index.add(self.data.embeddings[index.count:])
+            return index
+        if len(self.data) >= self.ann_threshold:
+            return IVFIndex.build(self.ann_path, self.data.embeddings, n_probe=self.ann_probe)
+        return None
+
+    def _load_clusters(self):
+        if PriceClusters.exists(self.clusters_path):
+            clusters = PriceClusters(self.clusters_path)
+            if clusters.count > len(self.data):
+                logger.warning("Price clusters are ahead of the store, rebuilding")
+                clusters.close()
+                return self._build_clusters()
+            # Catch up on rows appended while cluster rating was off
+            clusters.add(self.data.embeddings[clusters.count:], self.data.prices[clusters.count:])
+            return clusters
+        if len(self.data) >= self.cluster_min_rows:
+            return self._build_clusters()
+        return None
+
+    def _build_clusters(self):
+        return PriceClusters.build(self.clusters_path, self.data.embeddings, self.data.prices, n_clusters=self.n_clusters)
 
     def _get_text_representation(self, listing):
         # Combine title, description, and attributes
@@ -46,82 +192,334 @@ class DealEvaluator:
         text = f"{title} {description} {attributes}".strip()
         return text
 
+    def _encode(self, texts):
+        """
+        Returns normalized embeddings for texts, running the model only on cache misses.
+        """
+        vectors = self.embedding_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        metrics.inc("evaluator_texts_total", len(texts) - len(missing), source="cache")
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            metrics.inc("evaluator_texts_total", len(missing), source="model")
+            with metrics.timer("evaluator_encode_seconds"):
+                encoded = self.model.encode(missing_texts, batch_size=len(missing_texts))
+            self.embedding_cache.put_many(missing_texts, encoded)
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+        logger.debug(f"Encoded {len(missing)} of {len(texts)} texts; cache {self.embedding_cache.stats()}")
+        return normalize_rows(np.vstack(vectors))
+
     def add_listing(self, listing):
         """
         Adds a listing to the database. Computes embedding and saves.
         """
-        link = listing.get('link')
-        if not link:
+        if not listing.get('link'):
             logger.warning("Listing has no link, skipping add.")
             return
 
-        # Check if already exists to avoid duplicates (by link)
-        # We might want to update if it exists, but for now just skip
-        for item in self.data:
-            if item['link'] == link:
-                return
+        if self.add_listings([listing]):
+            logger.info(f"Added listing to evaluator: {listing.get('title')}")
 
-        text = self._get_text_representation(listing)
-        embedding = self.model.encode(text)
-        
+    def add_listings(self, listings, batch_size=256):
+        """
+        Adds many listings, encoding them batch_size at a time and writing each batch
+        to storage in one append. Accepts any iterable, including a generator that is
+        still crawling. Returns the number of listings added.
+        """
+        added = 0
+        batch = []
+        pending = set()
+
+        for listing in listings:
+            link = listing.get('link')
+            if not link:
+                logger.warning("Listing has no link, skipping add.")
+                continue
+
+            # Check if already exists to avoid duplicates (by link)
+            # We might want to update if it exists, but for now just skip
+            if link in self.data or link in pending:
+                continue
+
+            batch.append(listing)
+            pending.add(link)
+            if len(batch) >= batch_size:
+                added += self._commit_or_skip(batch)
+                batch = []
+                pending = set()
+
+        if batch:
+            added += self._commit_or_skip(batch)
+        return added
+
+    def _commit_or_skip(self, listings):
+        """
+        Encodes and stores a batch, logging and skipping listings that cannot be turned
+        into text, serialized or encoded on their own. Failures that are not about one
+        listing (loading the model, writing the store) propagate.
+        """
+        prepared = []
+        for listing in listings:
+            try:
+                prepared.append((self._get_text_representation(listing), self._entry(listing)))
+            except Exception as e:
+                logger.error(f"Skipping listing {listing['link']}: {e}")
+        if not prepared:
+            return 0
+        texts = [text for text, _ in prepared]
+        entries = [entry for _, entry in prepared]
+
+        try:
+            embeddings = self._encode(texts)
+        except Exception as e:
+            # Without a loaded model the error is about the encoder, not any listing
+            if self._model is None:
+                raise
+            logger.error(f"Failed to encode a batch of {len(texts)} listings, retrying one at a time: {e}")
+            embeddings, entries = self._encode_each(texts, entries, e)
+
+        with metrics.timer("evaluator_store_seconds"):
+            self._store_batch(entries, embeddings)
+        metrics.inc("evaluator_listings_added_total", len(entries))
+        return len(entries)
+
+    def _encode_each(self, texts, entries, error):
+        """
+        Encodes texts one at a time, dropping the ones that fail. If every one fails,
+        the batch error was not caused by a single listing and is raised.
+        """
+        vectors = []
+        kept = []
+        for text, entry in zip(texts, entries):
+            try:
+                vectors.append(self._encode([text]))
+                kept.append(entry)
+            except Exception as e:
+                logger.error(f"Skipping listing {entry['link']}: {e}")
+        if not kept:
+            raise error
+        return np.vstack(vectors), kept
+
+    def _entry(self, listing):
+        """
+        The store entry for a listing. Raises if the listing cannot be serialized.
+        """
         entry = {
-            'link': link,
+            'link': listing['link'],
             'title': listing.get('title'),
             'price': listing.get('price'),
-            'embedding': embedding,
             # Store minimal details to save space, or full if needed
-            'details': {k: v for k, v in listing.items() if k not in ['embedding']} 
+            'details': {k: v for k, v in listing.items() if k not in ['embedding']}
         }
-        self.data.append(entry)
-        self._save_data()
-        logger.info(f"Added listing to evaluator: {listing.get('title')}")
+        json.dumps(entry, default=_json_default)
+        return entry
+
+    def _store_batch(self, entries, embeddings):
+        self.data.extend(entries, embeddings)
+        # The rows are committed now; an index that fails to follow is rebuilt from the
+        # store instead of being left a batch behind it
+        try:
+            self._index_batch(entries, embeddings)
+        except Exception as e:
+            logger.error(f"Failed to index a batch of {len(entries)} listings, rebuilding from the store: {e}")
+            self._rebuild_indexes()
+        logger.debug(f"Committed batch of {len(entries)} listings to {self.store_path}")
+
+    def _index_batch(self, entries, embeddings):
+        if self.ann is not None:
+            self.ann.add(embeddings)
+        elif self.ann_threshold is not None and len(self.data) >= self.ann_threshold:
+            self.ann = IVFIndex.build(self.ann_path, self.data.embeddings, n_probe=self.ann_probe)
+        if self.clusters is not None:
+            self.clusters.add(embeddings, [entry['price'] for entry in entries])
+        elif self.rating == 'clusters' and len(self.data) >= self.cluster_min_rows:
+            self.clusters = self._build_clusters()
+
+    def _rebuild_indexes(self):
+        if self.ann is not None:
+            self.ann.close()
+            self.ann = None
+        if self.ann_threshold is not None and len(self.data) >= self.ann_threshold:
+            self.ann = IVFIndex.build(self.ann_path, self.data.embeddings, n_probe=self.ann_probe)
+        if self.clusters is not None:
+            self.clusters.close()
+            self.clusters = None
+        if self.rating == 'clusters' and len(self.data) >= self.cluster_min_rows:
+            self.clusters = self._build_clusters()
 
     def find_similar_listings(self, listing, top_k=5, threshold=0.4):
         """
         Finds similar listings in the database.
         """
-        if not self.data:
+        return self.find_similar_batch([listing], top_k=top_k, threshold=threshold)[0]
+
+    def find_similar_batch(self, listings, top_k=5, threshold=0.4):
+        """
+        Finds similar listings for many queries at once. All queries are encoded together
+        and scored against the corpus with one matrix-matrix product per chunk.
+        Returns one result list per listing, each as find_similar_listings would return it.
+        """
+        return [
+            [(score, self.data[row]) for score, row in matches]
+            for matches in self._similar_rows(listings, top_k, threshold)
+        ]
+
+    def _similar_rows(self, listings, top_k=5, threshold=0.4):
+        """
+        find_similar_batch, returning (score, store row) pairs so callers that only need
+        a row's columns never read its full record.
+        """
+        listings = list(listings)
+        if not len(self.data):
+            return [[] for _ in listings]
+        if not listings:
             return []
 
-        text = self._get_text_representation(listing)
-        query_embedding = self.model.encode(text).reshape(1, -1)
-        
-        # Stack embeddings from stored data
-        stored_embeddings = np.vstack([d['embedding'] for d in self.data])
-        
-        # Calculate cosine similarity
-        similarities = cosine_similarity(query_embedding, stored_embeddings)[0]
-        
-        # Create a list of (similarity, item)
+        texts = [self._get_text_representation(listing) for listing in listings]
+        queries = self._encode(texts)
+
+        with metrics.timer("evaluator_search_seconds", index="ann" if self.ann is not None else "exact"):
+            return self._search(listings, queries, top_k, threshold)
+
+    def _search(self, listings, queries, top_k, threshold):
+        stored_embeddings = self.data.embeddings
+        # Bound the (queries x corpus) score matrix so large runs don't spike memory
+        chunk = max(1, SIMILARITY_CHUNK_ELEMENTS // len(stored_embeddings))
+
+        compact = self.data.compact
+
         results = []
-        for idx, score in enumerate(similarities):
-            if score >= threshold:
-                results.append((score, self.data[idx]))
-        
-        # Sort by score desc
-        results.sort(key=lambda x: x[0], reverse=True)
-        
-        # Filter out the item itself if it's already in DB (by link)
-        results = [r for r in results if r[1]['link'] != listing.get('link')]
-        
-        return results[:top_k]
+        if self.ann is not None:
+            # Only rows in the probed inverted lists are scored
+            probed = self.ann.search(queries, stored_embeddings if compact is None else compact)
+            for listing, query, (rows, similarities) in zip(listings, queries, probed):
+                if compact is not None:
+                    rows, similarities = self._rescore(query, rows, similarities, top_k)
+                results.append(self._top_matches(similarities, listing.get('link'), top_k, threshold, rows))
+            return results
+
+        for start in range(0, len(listings), chunk):
+            if compact is None:
+                similarities = queries[start:start + chunk] @ stored_embeddings.T
+            else:
+                similarities = compact.scores(queries[start:start + chunk])
+            for listing, query, row in zip(listings[start:start + chunk], queries[start:start + chunk], similarities):
+                rows = None
+                if compact is not None:
+                    rows, row = self._rescore(query, np.arange(len(row)), row, top_k)
+                results.append(self._top_matches(row, listing.get('link'), top_k, threshold, rows))
+        return results
+
+    def _rescore(self, query, rows, approximate, top_k):
+        """
+        Keeps the rows with the best approximate scores (at least top_k plus the query's
+        own row) and scores them exactly against the float32 embeddings.
+        """
+        keep = max(self.rescore, top_k + 1)
+        if len(rows) > keep:
+            rows = np.sort(rows[np.argpartition(-approximate, keep - 1)[:keep]])
+        return rows, self.data.embeddings[rows] @ query
+
+    def _top_matches(self, similarities, link, top_k, threshold, rows=None):
+        """
+        Returns up to top_k (score, row) pairs with score >= threshold, best first,
+        excluding the row stored under the query's own link. similarities[i] is the
+        score of store row rows[i], or of row i when rows is None.
+        """
+        if rows is None:
+            rows = np.arange(len(similarities))
+        candidates = np.flatnonzero(similarities >= threshold)
+
+        own_row = self.data.row_for(link)
+        if own_row is not None:
+            candidates = candidates[rows[candidates] != own_row]
+
+        if len(candidates) > top_k:
+            best = np.argpartition(-similarities[candidates], top_k - 1)[:top_k]
+            candidates = candidates[best]
+
+        order = np.argsort(-similarities[candidates], kind='stable')
+        return [(similarities[idx], int(rows[idx])) for idx in candidates[order]]
 
     def evaluate_deal(self, listing):
         """
         Evaluates if the listing is a good deal based on similar items.
         Returns (rating, stats_dict).
         """
-        price = listing.get('price')
-        if price is None:
-            return "Unknown Price", None
+        return self.evaluate_deals([listing])[0]
 
-        similar_items = self.find_similar_listings(listing)
-        
-        if not similar_items:
+    def evaluate_deals(self, listings):
+        """
+        Evaluates many listings in one batch. Returns a list of (rating, stats_dict),
+        one per listing, each matching what evaluate_deal returns for it.
+        """
+        listings = list(listings)
+        results = [("Unknown Price", None)] * len(listings)
+
+        priced = [i for i, listing in enumerate(listings) if listing.get('price') is not None]
+        if self.clusters is not None:
+            for i, stats in zip(priced, self._cluster_stats([listings[i] for i in priced])):
+                results[i] = self._rate_cluster(listings[i]['price'], stats)
+            return results
+
+        similar = self._similar_rows([listings[i] for i in priced])
+        for i, similar_items in zip(priced, similar):
+            results[i] = self._rate(listings[i]['price'], similar_items)
+        return results
+
+    def _cluster_stats(self, listings):
+        """
+        Price statistics of the nearest cluster for each listing (see PriceClusters.stats).
+        """
+        if not listings:
+            return []
+        queries = self._encode([self._get_text_representation(listing) for listing in listings])
+        with metrics.timer("evaluator_search_seconds", index="clusters"):
+            results = []
+            for listing, query in zip(listings, queries):
+                # A listing already in the store is not rated against its own price
+                row = self.data.row_for(listing.get('link'))
+                exclude = None
+                if row is not None and row < self.clusters.count:
+                    exclude = (self.clusters.cluster_of(row), self.data.price(row))
+                results.append(self.clusters.stats(query, exclude=exclude))
+            return results
+
+    def _rate_cluster(self, price, stats):
+        """
+        Rates a price against the median of its cluster.
+        """
+        if stats is None:
+            return "No Data", None
+        if not stats['count']:
+            return "No Price Data", None
+
+        median = stats['median']
+        if median == 0:
+            return "Free?", {'current_price': price, 'average_price': 0}
+
+        return _rating_for_ratio(price / median), {
+            'current_price': price,
+            'average_price': round(stats['mean'], 2),
+            'median_price': round(median, 2),
+            'percentiles': {25: round(stats['p25'], 2), 75: round(stats['p75'], 2)},
+            'price_difference': round(price - median, 2),
+            'sample_size': stats['count'],
+            'clusters': stats['clusters'],
+            'similarity': round(stats['similarity'], 2),
+        }
+
+    def _rate(self, price, similar_rows):
+        """
+        Rates a price against the prices of its similar items, read from the store's columns.
+        """
+        if not similar_rows:
             return "No Data", None
 
         # Extract prices from similar items
-        prices = [item['details'].get('price') for score, item in similar_items if item['details'].get('price') is not None]
+        prices = [self.data.price(row) for score, row in similar_rows]
+        prices = [p for p in prices if p is not None]
         
         if not prices:
             return "No Price Data", None
@@ -132,21 +530,8 @@ class DealEvaluator:
         if avg_price == 0:
             return "Free?", {'current_price': price, 'average_price': 0}
 
-        ratio = price / avg_price
-        
-        if ratio < 0.7:
-            rating = "Incredible Deal"
-        elif ratio < 0.85:
-            rating = "Great Deal"
-        elif ratio < 1.0:
-            rating = "Good Deal"
-        elif ratio < 1.15:
-            rating = "Fair Price"
-        elif ratio < 1.3:
-            rating = "Slightly Overpriced"
-        else:
-            rating = "Overpriced"
-            
+        rating = _rating_for_ratio(price / avg_price)
+
         return rating, {
             'current_price': price,
             'average_price': round(avg_price, 2),
@@ -154,11 +539,11 @@ class DealEvaluator:
             'sample_size': len(prices),
             'similar_listings': [
                 {
-                    'title': item['title'],
-                    'price': item['details'].get('price'),
+                    'title': self.data.title(row),
+                    'price': self.data.price(row),
                     'similarity': round(score, 2),
-                    'link': item['link']
+                    'link': self.data.link(row)
                 }
-                for score, item in similar_items
+                for score, row in similar_rows
             ]
         }
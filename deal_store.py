@@ -0,0 +1,570 @@
+import json
+import shutil
+import sys
+from pathlib import Path
+import numpy as np
+from logger import get_logger
+from quantization import CompactEmbeddings
+
+logger = get_logger("deal_store")
+
+RECORDS_FILE = "records.jsonl"
+INDEX_FILE = "records.idx"
+LINKS_FILE = "links.txt"
+EMBEDDINGS_FILE = "embeddings.f32"
+META_FILE = "meta.json"
+PRICES_FILE = "prices.f64"
+FLAGS_FILE = "flags.u8"
+TITLE_IDS_FILE = "title_ids.i32"
+TITLES_FILE = "titles.bin"
+TITLES_INDEX_FILE = "titles.idx"
+LAYOUT = "columnar-1"
+
+# Legacy records read at a time while building their columns
+BACKFILL_BATCH = 10_000
+
+# Row flags
+HAS_TITLE = 1
+HAS_PRICE = 2
+INT_PRICE = 4
+# Blob key listing the details fields that repeat a column value
+SHARED_KEY = "_shared"
+
+# Initial number of rows reserved in the embedding file; doubles when full.
+INITIAL_CAPACITY = 1024
+
+
+def normalize_rows(vectors):
+    """
+    Returns a float32 copy of a 2-D array with every row scaled to unit length.
+    Zero rows are left as zeros so they score 0 against everything.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _read_fixed(file_path, dtype, width=1):
+    """
+    Reads a file of fixed-width rows, first truncating a partial row a crash left at its end.
+    """
+    dtype = np.dtype(dtype)
+    if not file_path.exists():
+        return np.zeros(0, dtype=dtype)
+    row_bytes = dtype.itemsize * width
+    size = file_path.stat().st_size
+    if size % row_bytes:
+        logger.warning(f"Truncating a partial row from {file_path}")
+        with open(file_path, "r+b") as f:
+            f.truncate(size - size % row_bytes)
+    return np.fromfile(file_path, dtype=dtype)
+
+
+def _json_default(value):
+    # Deal stats and similarity scores carry numpy scalars
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class DealStore:
+    """
+    Append-only on-disk listing store, laid out in columns.
+
+    A store is a directory holding:
+      records.idx    - uint64 (record_end, link_end) byte offsets per row; the commit log
+      links.txt      - one link per line, used to build the dedupe index lazily
+      prices.f64     - float64 price per row (NaN when absent)
+      flags.u8       - which of title/price a row has, and whether the price is an int
+      title_ids.i32  - per row index into the interned title table (-1 when absent)
+      titles.bin     - each distinct title once, with uint64 end offsets in titles.idx
+      records.jsonl  - everything else (description, attributes, images...) as one JSON
+                       blob per row, only read when a row is materialized
+      embeddings.f32 - normalized float32 rows, preallocated and memory-mapped
+      meta.json      - embedding dimension, layout and the encoder that produced the vectors
+      embeddings.i8 / embeddings.f16 (+ scales.f32)
+                     - optional reduced-precision copy of the embeddings for
+                       candidate scoring (see quantization.CompactEmbeddings)
+
+    Scoring only touches the embeddings and the fixed-width columns, so resident
+    memory grows with the number of rows, not with the length of their text. A row's
+    details that merely repeat its link, title or price are not stored twice.
+
+    A row only exists once its offsets are in records.idx, so a crash mid-append
+    leaves trailing bytes (in any file, records.idx included) that are truncated on
+    the next open. Rows written before the columnar layout keep their full JSON
+    records; their columns are backfilled once on open.
+    """
+
+    def __init__(self, path, compact_dtype=None):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        meta_file = self.path / META_FILE
+        self._meta = json.loads(meta_file.read_text()) if meta_file.exists() else {}
+        self.dim = self._meta.get("dim")
+
+        index_file = self.path / INDEX_FILE
+        offsets = _read_fixed(index_file, np.uint64, width=2).reshape(-1, 2)
+        self._count = len(offsets)
+        capacity = max(INITIAL_CAPACITY, self._count)
+        self._offsets = np.zeros((capacity, 2), dtype=np.uint64)
+        self._offsets[:self._count] = offsets
+
+        self._recover()
+
+        self._records = open(self.path / RECORDS_FILE, "ab+")
+        self._links = open(self.path / LINKS_FILE, "ab+")
+        self._index = open(index_file, "ab")
+
+        self._matrix = None
+        if self.dim is not None:
+            self._map_embeddings()
+
+        # float32 needs no copy: the embeddings are already stored that way
+        self.compact_dtype = None if compact_dtype in (None, "float32") else compact_dtype
+        self.compact = None
+        if self.compact_dtype and self.dim is not None:
+            self.compact = CompactEmbeddings(self.path, self.compact_dtype, self.dim)
+            self.compact.sync(self.embeddings)
+
+        self._link_index = None
+        if self._meta.get("layout") != LAYOUT:
+            self._backfill_columns()
+        self._load_columns(capacity)
+
+    def _recover(self):
+        """
+        Truncates record and link bytes written after the last committed row.
+        """
+        record_end, link_end = self._offsets[self._count - 1] if self._count else (0, 0)
+        for name, end in ((RECORDS_FILE, record_end), (LINKS_FILE, link_end)):
+            file_path = self.path / name
+            if file_path.exists() and file_path.stat().st_size > end:
+                logger.warning(f"Truncating uncommitted bytes from {file_path}")
+                with open(file_path, "r+b") as f:
+                    f.truncate(int(end))
+
+    def _backfill_columns(self):
+        """
+        Builds the column files for rows stored as full JSON records (one pass, on first open).
+        """
+        for name in (PRICES_FILE, FLAGS_FILE, TITLE_IDS_FILE, TITLES_FILE, TITLES_INDEX_FILE):
+            (self.path / name).unlink(missing_ok=True)
+        self._load_columns(max(INITIAL_CAPACITY, self._count), backfill=True)
+        if self._count:
+            logger.info(f"Building columns for {self._count} rows in {self.path}")
+            with open(self.path / RECORDS_FILE, "rb") as f:
+                for start in range(0, self._count, BACKFILL_BATCH):
+                    rows = min(BACKFILL_BATCH, self._count - start)
+                    self._fill_columns(start, [json.loads(f.readline()) for _ in range(rows)])
+                    self._append_columns(start, start + rows)
+        self._meta.update({"layout": LAYOUT, "legacy_rows": self._count})
+        (self.path / META_FILE).write_text(json.dumps(self._meta))
+        self._close_columns()
+
+    def _load_columns(self, capacity, backfill=False):
+        count = 0 if backfill else self._count
+        self._legacy_rows = 0 if backfill else self._meta.get("legacy_rows", 0)
+        columns = {}
+        for name, dtype in ((PRICES_FILE, np.float64), (FLAGS_FILE, np.uint8), (TITLE_IDS_FILE, np.int32)):
+            file_path = self.path / name
+            values = _read_fixed(file_path, dtype)
+            if len(values) > count:
+                # Appended before a crash, never committed
+                with open(file_path, "r+b") as f:
+                    f.truncate(count * values.itemsize)
+            column = np.zeros(capacity, dtype=dtype)
+            column[:count] = values[:count]
+            columns[name] = column
+        self._prices = columns[PRICES_FILE]
+        self._flags = columns[FLAGS_FILE]
+        self._title_ids = columns[TITLE_IDS_FILE]
+
+        titles_index = self.path / TITLES_INDEX_FILE
+        self._title_ends = _read_fixed(titles_index, np.uint64)
+        titles_end = int(self._title_ends[-1]) if len(self._title_ends) else 0
+        titles_file = self.path / TITLES_FILE
+        if titles_file.exists() and titles_file.stat().st_size > titles_end:
+            with open(titles_file, "r+b") as f:
+                f.truncate(titles_end)
+
+        self._column_files = {
+            name: open(self.path / name, "ab")
+            for name in (PRICES_FILE, FLAGS_FILE, TITLE_IDS_FILE, TITLES_INDEX_FILE)
+        }
+        self._titles = open(titles_file, "ab+")
+        # Built on the first append (see _intern_title)
+        self._title_lookup = None
+
+    def _close_columns(self):
+        for f in self._column_files.values():
+            f.close()
+        self._titles.close()
+
+    def _map_embeddings(self, capacity=None):
+        embeddings_file = self.path / EMBEDDINGS_FILE
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+
+        current = embeddings_file.stat().st_size // row_bytes if embeddings_file.exists() else 0
+        capacity = max(capacity or 0, current, INITIAL_CAPACITY)
+        if capacity > current:
+            with open(embeddings_file, "ab") as f:
+                f.truncate(capacity * row_bytes)
+
+        self._matrix = np.memmap(embeddings_file, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _reserve(self, rows):
+        """
+        Makes room for `rows` more rows in the embedding map, offset buffer and columns.
+        """
+        needed = self._count + rows
+        if needed > self._matrix.shape[0]:
+            capacity = self._matrix.shape[0]
+            while capacity < needed:
+                capacity *= 2
+            self._matrix.flush()
+            self._matrix = None
+            self._map_embeddings(capacity)
+
+        if needed > self._offsets.shape[0]:
+            capacity = self._offsets.shape[0]
+            while capacity < needed:
+                capacity *= 2
+            grown = np.zeros((capacity, 2), dtype=np.uint64)
+            grown[:self._count] = self._offsets[:self._count]
+            self._offsets = grown
+            self._prices = _grow(self._prices, capacity, self._count)
+            self._flags = _grow(self._flags, capacity, self._count)
+            self._title_ids = _grow(self._title_ids, capacity, self._count)
+
+    def __len__(self):
+        return self._count
+
+    def _check_row(self, row):
+        if row < 0:
+            row += self._count
+        if not 0 <= row < self._count:
+            raise IndexError("store row out of range")
+        return row
+
+    def __getitem__(self, row):
+        row = self._check_row(row)
+        start = int(self._offsets[row - 1, 0]) if row else 0
+        end = int(self._offsets[row, 0])
+        self._records.seek(start)
+        record = json.loads(self._records.read(end - start))
+        if row < self._legacy_rows:
+            return record
+
+        shared = record.pop(SHARED_KEY, ())
+        entry = {"link": self.link(row)}
+        flags = self._flags[row]
+        if flags & HAS_TITLE:
+            entry["title"] = self.title(row)
+        if flags & HAS_PRICE:
+            entry["price"] = self.price(row)
+        entry.update(record)
+        for key in shared:
+            entry["details"][key] = entry[key]
+        return entry
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield self[row]
+
+    def link(self, row):
+        row = self._check_row(row)
+        start = int(self._offsets[row - 1, 1]) if row else 0
+        end = int(self._offsets[row, 1])
+        self._links.seek(start)
+        return self._links.read(end - start).decode("utf-8")[:-1]
+
+    def title(self, row):
+        """
+        The row's title, or None.
+        """
+        row = self._check_row(row)
+        title_id = int(self._title_ids[row])
+        if title_id < 0:
+            return None
+        return self._read_title(title_id)
+
+    def _read_title(self, title_id):
+        start = int(self._title_ends[title_id - 1]) if title_id else 0
+        self._titles.seek(start)
+        return self._titles.read(int(self._title_ends[title_id]) - start).decode("utf-8")
+
+    def price(self, row):
+        """
+        The row's price (int when it was stored as one), or None.
+        """
+        row = self._check_row(row)
+        if not self._flags[row] & HAS_PRICE or np.isnan(self._prices[row]):
+            return None
+        value = float(self._prices[row])
+        return int(value) if self._flags[row] & INT_PRICE else value
+
+    @property
+    def prices(self):
+        """
+        float64 price per row, NaN where a row has none. Row i matches self[i].
+        """
+        return self._prices[:self._count]
+
+    def links(self):
+        """
+        Returns the stored links in row order.
+        """
+        end = int(self._offsets[self._count - 1, 1]) if self._count else 0
+        with open(self.path / LINKS_FILE, "rb") as f:
+            raw = f.read(end)
+        return raw.decode("utf-8").splitlines()
+
+    def row_for(self, link):
+        """
+        Returns the row stored under a link, or None.
+        """
+        if self._link_index is None:
+            self._link_index = {}
+            for row, stored in enumerate(self.links()):
+                # Keep the first row for a link if duplicates slipped in
+                self._link_index.setdefault(stored, row)
+        return self._link_index.get(link)
+
+    def __contains__(self, link):
+        return self.row_for(link) is not None
+
+    @property
+    def encoder(self):
+        """
+        Identifier of the encoder that produced the stored vectors (see encoders.encoder_id), or None.
+        """
+        return self._meta.get("encoder")
+
+    def set_encoder(self, name):
+        self._meta["encoder"] = name
+        (self.path / META_FILE).write_text(json.dumps(self._meta))
+
+    @property
+    def embeddings(self):
+        """
+        Memory-mapped (len(store), dim) matrix of normalized embeddings. Row i matches self[i].
+        """
+        if self._matrix is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._matrix[:self._count]
+
+    def _intern_title(self, title):
+        """
+        Returns the id of a title in the title table, appending it if it is new.
+        Only hashes are kept in memory; a hit is confirmed against the stored text.
+        """
+        if self._title_lookup is None:
+            self._titles.seek(0)
+            raw = self._titles.read(int(self._title_ends[-1]) if len(self._title_ends) else 0)
+            starts = np.concatenate(([0], self._title_ends[:-1])).astype(np.int64)
+            self._title_lookup = {}
+            for i, (begin, end) in enumerate(zip(starts.tolist(), self._title_ends.tolist())):
+                self._title_lookup.setdefault(hash(raw[begin:end].decode("utf-8")), i)
+        key = hash(title)
+        title_id = self._title_lookup.get(key)
+        if title_id is not None and self._read_title(title_id) == title:
+            return title_id
+
+        raw = title.encode("utf-8")
+        end = (int(self._title_ends[-1]) if len(self._title_ends) else 0) + len(raw)
+        self._titles.write(raw)
+        self._titles.flush()
+        self._title_ends = np.append(self._title_ends, np.uint64(end))
+        self._column_files[TITLES_INDEX_FILE].write(self._title_ends[-1:].tobytes())
+        self._column_files[TITLES_INDEX_FILE].flush()
+        title_id = len(self._title_ends) - 1
+        self._title_lookup.setdefault(key, title_id)
+        return title_id
+
+    def _fill_columns(self, start, entries):
+        """
+        Fills the in-memory column values for rows start..start+len(entries).
+        Returns each entry's blob: the fields that did not go into a column.
+        """
+        blobs = []
+        for row, entry in enumerate(entries, start):
+            blob = {key: value for key, value in entry.items() if key not in ("link", "title", "price")}
+            flags = 0
+            title = entry.get("title")
+            if isinstance(title, str):
+                flags |= HAS_TITLE
+                self._title_ids[row] = self._intern_title(title)
+            else:
+                self._title_ids[row] = -1
+                if "title" in entry:
+                    blob["title"] = title
+            price = entry.get("price")
+            if "price" in entry and (price is None or isinstance(price, (int, float, np.number))):
+                flags |= HAS_PRICE
+                self._prices[row] = np.nan if price is None else float(price)
+                if isinstance(price, (int, np.integer)) and not isinstance(price, bool):
+                    flags |= INT_PRICE
+            else:
+                self._prices[row] = np.nan
+                if "price" in entry:
+                    blob["price"] = price
+            if "\n" in entry["link"]:
+                # links.txt is line-based; keep the exact link in the blob
+                blob["link"] = entry["link"]
+            self._flags[row] = flags
+
+            details = blob.get("details")
+            if isinstance(details, dict):
+                shared = [
+                    key for key in ("link", "title", "price")
+                    if key in details and key in entry and _same(details[key], entry[key])
+                ]
+                if shared:
+                    blob["details"] = {key: value for key, value in details.items() if key not in shared}
+                    blob[SHARED_KEY] = shared
+            blobs.append(blob)
+        return blobs
+
+    def _append_columns(self, start, end):
+        self._column_files[PRICES_FILE].write(self._prices[start:end].tobytes())
+        self._column_files[FLAGS_FILE].write(self._flags[start:end].tobytes())
+        self._column_files[TITLE_IDS_FILE].write(self._title_ids[start:end].tobytes())
+        for name in (PRICES_FILE, FLAGS_FILE, TITLE_IDS_FILE):
+            self._column_files[name].flush()
+
+    def extend(self, entries, vectors):
+        """
+        Appends entries with their normalized embeddings, one write per file.
+        Each entry must be a JSON-serializable dict with a 'link'.
+        """
+        entries = list(entries)
+        if not entries:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(entries), -1)
+
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._meta["dim"] = self.dim
+            (self.path / META_FILE).write_text(json.dumps(self._meta))
+            self._map_embeddings()
+            if self.compact_dtype:
+                self.compact = CompactEmbeddings(self.path, self.compact_dtype, self.dim)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}")
+
+        self._reserve(len(entries))
+
+        # Everything that can fail on a bad entry (serialization) runs before the first
+        # append, so a rejected batch leaves no rows in the embedding copy or the columns
+        start = self._count
+        blobs = self._fill_columns(start, entries)
+        record_end, link_end = self._offsets[start - 1] if start else (0, 0)
+        record_end, link_end = int(record_end), int(link_end)
+        record_chunks = []
+        link_chunks = []
+        for row, (entry, blob) in enumerate(zip(entries, blobs), start):
+            record = (json.dumps(blob, default=_json_default) + "\n").encode("utf-8")
+            link = (entry["link"].replace("\n", " ") + "\n").encode("utf-8")
+            record_chunks.append(record)
+            link_chunks.append(link)
+            record_end += len(record)
+            link_end += len(link)
+            self._offsets[row] = (record_end, link_end)
+
+        self._matrix[start:start + len(entries)] = vectors
+        self._matrix.flush()
+        if self.compact is not None:
+            self.compact.extend(vectors)
+        self._append_columns(start, start + len(entries))
+        self._records.write(b"".join(record_chunks))
+        self._records.flush()
+        self._links.write(b"".join(link_chunks))
+        self._links.flush()
+        # Committing the offsets is what makes the new rows visible on reopen
+        self._index.write(self._offsets[start:start + len(entries)].tobytes())
+        self._index.flush()
+
+        if self._link_index is not None:
+            for row, entry in enumerate(entries, start):
+                self._link_index.setdefault(entry["link"], row)
+        self._count += len(entries)
+
+    def close(self):
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._records.close()
+        self._links.close()
+        self._index.close()
+        self._close_columns()
+
+
+def _grow(column, capacity, count):
+    grown = np.zeros(capacity, dtype=column.dtype)
+    grown[:count] = column[:count]
+    return grown
+
+
+def _same(a, b):
+    # Details written by the evaluator repeat the top-level values exactly (including type)
+    return type(a) is type(b) and a == b
+
+
+def migrate_pickle(pickle_path, store_path, batch_size=10000):
+    """
+    One-shot conversion of a legacy joblib deal_data.pkl into a DealStore.
+    The store is built in a temporary directory and renamed into place when complete.
+    """
+    import joblib
+
+    pickle_path = Path(pickle_path)
+    store_path = Path(store_path)
+    if store_path.exists():
+        raise FileExistsError(f"{store_path} already exists")
+
+    data = joblib.load(pickle_path)
+    logger.info(f"Migrating {len(data)} listings from {pickle_path} to {store_path}")
+
+    tmp_path = store_path.with_name(store_path.name + ".tmp")
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+
+    store = DealStore(tmp_path)
+    seen = set()
+    entries = []
+    vectors = []
+    try:
+        for item in data:
+            if item['link'] in seen:
+                continue
+            seen.add(item['link'])
+            entries.append({k: v for k, v in item.items() if k != 'embedding'})
+            vectors.append(item['embedding'])
+            if len(entries) >= batch_size:
+                store.extend(entries, normalize_rows(vectors))
+                entries, vectors = [], []
+        if entries:
+            store.extend(entries, normalize_rows(vectors))
+    except Exception:
+        store.close()
+        shutil.rmtree(tmp_path)
+        raise
+    count = len(store)
+    store.close()
+
+    tmp_path.rename(store_path)
+    logger.info(f"Migrated {count} listings to {store_path}")
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python deal_store.py <deal_data.pkl> <store_dir>")
+        sys.exit(1)
+    migrate_pickle(sys.argv[1], sys.argv[2])
@@ -0,0 +1,125 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
+from logger import get_logger
+
+logger = get_logger("embedding_cache")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    Canonical form of listing text used for cache keys, so reposts that only
+    differ in case or whitespace share an entry.
+    """
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def cache_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, size-bounded embedding cache stored in SQLite.
+    Entries are keyed by a hash of the model name and normalized text and
+    evicted least-recently-used first once max_entries is exceeded.
+    """
+
+    def __init__(self, path, model_name, max_entries=100_000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+        # Monotonic use counter; ordering by it gives LRU order
+        self._clock = self._conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, texts):
+        """
+        Returns a list with the cached vector for each text, or None on a miss.
+        """
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                self._clock += 1
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(self._clock, key) for key in found],
+                )
+                self._conn.commit()
+
+        results = []
+        for key in keys:
+            vector = found.get(key)
+            if vector is None:
+                self.misses += 1
+                results.append(None)
+            else:
+                self.hits += 1
+                results.append(np.frombuffer(vector, dtype=np.float32))
+        return results
+
+    def put_many(self, texts, vectors):
+        """
+        Stores vectors for texts and evicts the least recently used entries over the size cap.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._clock += 1
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [
+                    (cache_key(self.model_name, text), np.asarray(vector, dtype=np.float32).tobytes(), self._clock)
+                    for text, vector in zip(texts, vectors)
+                ],
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                evicted = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (evicted,),
+                )
+                logger.debug(f"Evicted {evicted} embeddings from {self.path}")
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
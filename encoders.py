@@ -0,0 +1,145 @@
+import hashlib
+import math
+import re
+import zlib
+from collections import Counter
+from pathlib import Path
+import numpy as np
+from logger import get_logger
+
+logger = get_logger("encoders")
+
+# sentence-transformers itself is created in deal_evaluator, which keeps its lazy import
+BACKENDS = ("sentence-transformers", "onnx", "hashing")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def encoder_id(backend, model_name, options=None):
+    """
+    Identifies the vector space an encoder produces. It is recorded in the deal store
+    and keys the embedding cache, so vectors from different encoders never mix.
+    """
+    options = options or {}
+    if backend == "sentence-transformers":
+        # Stores and caches written before backends existed are keyed by the model name alone
+        return model_name
+    if backend == "onnx":
+        # Re-exporting or re-quantizing a model keeps its file name but changes its vectors
+        model_path = Path(options.get("model_path", ""))
+        return f"onnx:{model_path.parent.name}/{model_path.name}@{_file_digest(model_path)}"
+    if backend == "hashing":
+        return f"hashing-{options.get('dim', HashingEncoder.DEFAULT_DIM)}"
+    raise ValueError(f"Unknown encoder backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    """
+    Short sha256 of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def create_encoder(backend, options=None):
+    """
+    Builds an onnx or hashing encoder from the evaluator's encoder_options.
+    """
+    options = options or {}
+    if backend == "onnx":
+        return ONNXEncoder(**options)
+    if backend == "hashing":
+        return HashingEncoder(**options)
+    raise ValueError(f"Unknown encoder backend {backend!r}")
+
+
+class HashingEncoder:
+    """
+    Zero-download encoder: word unigrams, word bigrams and in-word character
+    trigrams are hashed (with a hashed sign) into a fixed-size vector with
+    sublinear term frequencies. It needs no model, fitting or network, runs on
+    plain numpy and produces the same vector for the same text on any machine.
+    It captures shared wording, not meaning: "laptop" and "notebook" are unrelated.
+    """
+    DEFAULT_DIM = 512
+
+    def __init__(self, dim=DEFAULT_DIM, char_weight=0.5):
+        self.dim = dim
+        self.char_weight = char_weight
+
+    def _features(self, text):
+        words = _TOKEN.findall(text.lower())
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        grams = Counter()
+        for word in words:
+            padded = f"<{word}>"
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features, grams
+
+    def _add(self, vector, features, weight):
+        for feature, count in features.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * weight * (1.0 + math.log(count))
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words, grams = self._features(text)
+            self._add(vectors[row], words, 1.0)
+            self._add(vectors[row], grams, self.char_weight)
+        return vectors[0] if single else vectors
+
+
+class ONNXEncoder:
+    """
+    Runs a sentence-transformers model exported to ONNX (optionally quantized)
+    through onnxruntime on the CPU, with mean pooling over the token embeddings.
+    Needs the `onnxruntime` and `tokenizers` packages but not torch.
+    """
+
+    def __init__(self, model_path, tokenizer_path=None, max_length=256, threads=None):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The onnx encoder needs `pip install onnxruntime tokenizers`") from e
+
+        model_path = Path(model_path)
+        tokenizer_path = Path(tokenizer_path) if tokenizer_path else model_path.parent / "tokenizer.json"
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), session_options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        logger.info(f"Loaded ONNX model {model_path}")
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        batch_size = max(1, min(batch_size or 32, 64))
+        chunks = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self._inputs:
+                feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            tokens = self.session.run(None, {name: value for name, value in feeds.items() if name in self._inputs})[0]
+            weights = mask[..., None].astype(np.float32)
+            chunks.append((tokens * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9))
+        vectors = np.vstack(chunks).astype(np.float32) if chunks else np.zeros((0, 0), dtype=np.float32)
+        return vectors[0] if single else vectors
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+from http_client import HttpClient
+from logger import get_logger
+
+logger = get_logger("fetcher")
+
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 2
+DEFAULT_CONCURRENCY = 4
+
+
+class TokenBucket:
+    """
+    Token bucket that refills `rate` tokens per second up to `burst`.
+
+    Callers reserve a token up front and are told how long to wait for it, so the
+    same bucket can pace both blocking (time.sleep) and asyncio callers.
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns the number of seconds to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class AsyncFetcher:
+    """
+    Fetches pages with bounded concurrency and a token-bucket rate limit per host.
+
+    rate_limits maps a host name (or "default") to {"rate": requests/sec, "burst": n}.
+    Blocking calls via get() share the same per-host budget as fetch_many().
+    Requests go through the given HttpClient so they share its connection pools.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, rate_limits=None, client=None):
+        self.concurrency = concurrency
+        self.rate_limits = rate_limits or {}
+        self.client = client or HttpClient(pool_maxsize=concurrency)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, client=None):
+        """
+        Builds a fetcher from the `fetch` section of inputs.yaml.
+        """
+        config = config or {}
+        return cls(
+            concurrency=config.get("concurrency", DEFAULT_CONCURRENCY),
+            rate_limits=config.get("rate_limits"),
+            client=client,
+        )
+
+    def bucket_for(self, url):
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            if host not in self._buckets:
+                limits = self.rate_limits.get(host) or self.rate_limits.get("default") or {}
+                self._buckets[host] = TokenBucket(
+                    limits.get("rate", DEFAULT_RATE), limits.get("burst", DEFAULT_BURST)
+                )
+            return self._buckets[host]
+
+    def _request(self, url, headers=None):
+        if headers:
+            return self.client.get(url, headers=headers)
+        return self.client.get(url)
+
+    def get(self, url, headers=None):
+        """
+        Blocking GET that waits for the host's rate limit. headers are sent on top of the client's.
+        """
+        self.bucket_for(url).acquire()
+        return self._request(url, headers)
+
+    async def fetch(self, url, semaphore, headers=None):
+        async with semaphore:
+            await self.bucket_for(url).acquire_async()
+            return await asyncio.to_thread(self._request, url, headers)
+
+    async def gather(self, urls, headers=None):
+        """
+        Fetches all urls concurrently. Returns responses in order; failures are returned as exceptions.
+        headers, if given, holds one dict of extra request headers per url.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        headers = headers or [None] * len(urls)
+        return await asyncio.gather(
+            *(self.fetch(url, semaphore, extra) for url, extra in zip(urls, headers)), return_exceptions=True
+        )
+
+    def fetch_many(self, urls, headers=None):
+        """
+        Blocking wrapper around gather() for callers outside an event loop.
+        """
+        urls = list(urls)
+        if not urls:
+            return []
+        start = time.perf_counter()
+        responses = asyncio.run(self.gather(urls, headers))
+        logger.debug(f"Fetched {len(urls)} urls in {time.perf_counter() - start:.2f}s")
+        return responses
@@ -1,3 +1,6 @@
+import re
+
+
 def matches_filters(item, rules):
     if rules.get("max_price") and item["price"]:
         if item["price"] > rules["max_price"]:
@@ -14,3 +17,139 @@ def matches_filters(item, rules):
             return False
 
     return True
+
+
+def _lookahead_pattern(keywords):
+    # Longest alternatives first, so at each position the regex reports the longest
+    # keyword starting there; shorter ones starting there are its prefixes.
+    alternatives = "|".join(re.escape(word) for word in sorted(keywords, key=len, reverse=True))
+    return re.compile(f"(?=({alternatives}))")
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+class CompiledSearch:
+    """
+    A search's filter rules, normalized once at config load. Keywords are turned
+    into bitmasks over the engine's keyword table.
+    FilterEngine.matching applies the same rules as matches_filters.
+    """
+
+    def __init__(self, rules, bits):
+        keywords = rules.get("keywords") or {}
+        self.name = rules.get("name")
+        self.max_price = rules.get("max_price")
+        self.include_mask = _mask(keywords.get("include", []), bits)
+        self.exclude_mask = _mask(keywords.get("exclude", []), bits)
+        # Whole-word matching ("27" does not match "270")
+        self.word_boundary = bool(keywords.get("word_boundary", False))
+        # Also look for keywords in the description once it has been deep-fetched
+        self.match_description = bool(keywords.get("match_description", False))
+
+
+def _keywords(rules):
+    keywords = rules.get("keywords") or {}
+    return [word.lower() for word in keywords.get("include", []) + keywords.get("exclude", []) if word]
+
+
+def _mask(words, bits):
+    mask = 0
+    for word in words:
+        if word:
+            mask |= bits[word.lower()]
+    return mask
+
+
+class KeywordHits:
+    """
+    Bitmasks of the engine keywords found in one item's text: as substrings, and as whole words.
+    """
+
+    def __init__(self, substrings, words, has_description):
+        self.substrings = substrings
+        self.words = words
+        self.has_description = has_description
+
+
+class FilterEngine:
+    """
+    Evaluates many searches against an item with one regex pass over its text.
+
+    All include/exclude keywords of all searches are compiled into one lookahead
+    alternation. Each match yields the longest keyword starting at that position; the
+    other keywords starting there are exactly its keyword prefixes, whose bits are
+    precomputed, so every occurrence of every keyword is found in one scan. Searches
+    are then checked with integer mask operations.
+    """
+
+    def __init__(self, searches):
+        keywords = sorted({word for rules in searches for word in _keywords(rules)})
+        bits = {word: 1 << index for index, word in enumerate(keywords)}
+        self.searches = [CompiledSearch(rules, bits) for rules in searches]
+
+        self._pattern = _lookahead_pattern(keywords) if keywords else None
+        # For each keyword, the bits of all keywords that are its prefixes (itself included)
+        self._prefix_mask = {word: _mask([other for other in keywords if word.startswith(other)], bits) for word in keywords}
+        self._prefixes = {word: [(other, bits[other]) for other in keywords if word.startswith(other)] for word in keywords}
+        self._needs_words = any(search.word_boundary for search in self.searches)
+        self._uses_description = any(search.match_description for search in self.searches)
+
+    def hits(self, item, with_description=False):
+        """
+        Scans the item's title, and its description when asked, once.
+        """
+        text = item["title"].lower()
+        if with_description and item.get("description"):
+            text = f"{text}\n{item['description'].lower()}"
+
+        substrings = 0
+        words = 0
+        if self._pattern is not None:
+            for match in self._pattern.finditer(text):
+                longest = match.group(1)
+                substrings |= self._prefix_mask[longest]
+                if not self._needs_words:
+                    continue
+                start = match.start()
+                if start and _is_word_char(text[start - 1]):
+                    continue
+                for word, bit in self._prefixes[longest]:
+                    end = start + len(word)
+                    if end == len(text) or not _is_word_char(text[end]):
+                        words |= bit
+        return KeywordHits(substrings, words, with_description)
+
+    def matching(self, item, indices=None, defer_description=True):
+        """
+        Returns the indices of the searches (optionally limited to `indices`) that match the item.
+        With defer_description, match_description searches skip their include check until the
+        description is known; without it, an item that has no description is checked by its title.
+        """
+        searches = self.searches if indices is None else [self.searches[index] for index in indices]
+        indices = range(len(self.searches)) if indices is None else indices
+        price = item["price"]
+        title_hits = self.hits(item)
+        full_hits = None
+        if self._uses_description and "description" in item:
+            full_hits = self.hits(item, with_description=True)
+
+        matched = []
+        for index, search in zip(indices, searches):
+            if search.max_price and price and price > search.max_price:
+                continue
+            hits = full_hits if (full_hits is not None and search.match_description) else title_hits
+            found = hits.words if search.word_boundary else hits.substrings
+            if found & search.exclude_mask:
+                continue
+            # Include words may only appear in the description, which isn't known until the
+            # detail page is fetched, so defer them until then
+            if search.match_description and defer_description and not hits.has_description:
+                matched.append(index)
+            elif found & search.include_mask == search.include_mask:
+                matched.append(index)
+        return matched
+
+    def matches(self, item, index, defer_description=True):
+        return bool(self.matching(item, [index], defer_description))
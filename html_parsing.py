@@ -0,0 +1,84 @@
+from bs4 import BeautifulSoup
+from logger import get_logger
+
+try:
+    from bs4.filter import ElementFilter
+except ImportError:  # beautifulsoup4 < 4.13 has no tree-creation hooks
+    ElementFilter = None
+
+try:
+    import lxml  # noqa: F401
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+logger = get_logger("html_parsing")
+
+BACKENDS = ("lxml", "html.parser")
+
+# lxml's C tree builder is several times faster than the pure-Python html.parser
+_backend = "lxml" if HAS_LXML else "html.parser"
+
+
+def set_backend(name):
+    """
+    Selects the tree builder used by make_soup ("lxml" or "html.parser").
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {name}")
+    if name == "lxml" and not HAS_LXML:
+        logger.warning("lxml is not installed, keeping html.parser")
+        return
+    _backend = name
+
+
+def get_backend():
+    return _backend
+
+
+if ElementFilter is not None:
+    class SubtreeFilter(ElementFilter):
+        """
+        Parse-time filter that only builds the subtrees rooted at elements with one
+        of the given ids or classes. Everything else in the page is discarded as it
+        is parsed, so no Tag objects are allocated for it.
+        """
+
+        def __init__(self, ids=(), classes=()):
+            super().__init__()
+            self.ids = frozenset(ids)
+            self.classes = frozenset(classes)
+
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            if not attrs:
+                return False
+            if attrs.get("id") in self.ids:
+                return True
+            classes = attrs.get("class") or ()
+            if isinstance(classes, str):
+                classes = classes.split()
+            return not self.classes.isdisjoint(classes)
+
+        def allow_string_creation(self, string):
+            # Only text inside a kept subtree is needed
+            return False
+else:
+    SubtreeFilter = None
+
+
+def _subtrees(ids=(), classes=()):
+    return SubtreeFilter(ids, classes) if SubtreeFilter is not None else None
+
+
+# What scraper.parse_listing and scraper.parse_details read from each page
+SEARCH_RESULTS = _subtrees(classes=["cl-static-search-result"])
+DETAIL_PAGE = _subtrees(ids=["postingbody", "thumbs"], classes=["attrgroup"])
+
+
+def make_soup(html, only=None):
+    """
+    Parses html with the selected backend. `only` restricts the tree to the
+    subtrees a page type needs (SEARCH_RESULTS or DETAIL_PAGE).
+    """
+    return BeautifulSoup(html, _backend, parse_only=only)
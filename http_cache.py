@@ -0,0 +1,195 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from logger import get_logger
+import metrics
+
+logger = get_logger("http_cache")
+
+DEFAULT_MAX_BYTES = 50_000_000
+# Least recently used pages looked at per eviction query
+EVICT_BATCH = 64
+
+
+class CacheEntry:
+    def __init__(self, url, etag, last_modified, body_hash, body_size, details):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.body_size = body_size
+        self.details = details
+
+
+class DetailCache:
+    """
+    Disk-backed cache of listing detail pages, stored as their parse_details output.
+
+    Each entry keeps the page's ETag/Last-Modified validators so the next fetch can be
+    a conditional request, plus a hash of the body so an unchanged page returned in
+    full is not parsed again. Entries are evicted least-recently-used first once the
+    stored details exceed max_bytes; the running total is kept in memory, so a store
+    only touches the rows it evicts. Empty details (a page that failed to parse or had
+    nothing to extract) are not cached, so the page is parsed again next time.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.not_modified = 0
+        self.unchanged = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body_hash TEXT NOT NULL, "
+            "body_size INTEGER NOT NULL, details TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages(last_used)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a cache from the `detail_cache` section of inputs.yaml, or returns None if it is absent.
+        """
+        if not config:
+            return None
+        return cls(config.get("path", "data/detail_cache.sqlite"), max_bytes=config.get("max_bytes", DEFAULT_MAX_BYTES))
+
+    def lookup(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, etag, last_modified, body_hash, body_size, details FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(*row[:5], json.loads(row[5]))
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def _touch(self, url):
+        with self._lock:
+            self._conn.execute("UPDATE pages SET last_used = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def resolve(self, url, res, entry, parse):
+        """
+        Turns a response to a (possibly conditional) request into details.
+        parse(res) is only called when the page actually changed.
+        """
+        details = self.reuse(url, res, entry)
+        if details is None:
+            details = parse(res)
+            self.record(url, res, details)
+        return details
+
+    def reuse(self, url, res, entry):
+        """
+        Returns the cached details if the response shows the page is unchanged,
+        otherwise None (the page needs parsing, then record()).
+        """
+        if res.status_code == 304 and entry is not None:
+            self.not_modified += 1
+            self.bytes_saved += entry.body_size
+            metrics.inc("detail_cache_results_total", result="not_modified")
+            metrics.inc("detail_cache_bytes_saved_total", entry.body_size)
+            self._touch(url)
+            return entry.details
+
+        res.raise_for_status()
+        body_hash = hashlib.sha256(res.content).hexdigest()
+        if entry is not None and entry.body_hash == body_hash:
+            # Same page served in full (no validators honoured); skip the parse
+            self.unchanged += 1
+            metrics.inc("detail_cache_results_total", result="unchanged")
+            self._touch(url)
+            return entry.details
+
+        self.misses += 1
+        metrics.inc("detail_cache_results_total", result="miss")
+        return None
+
+    def record(self, url, res, details):
+        """
+        Stores freshly parsed details with the response's validators.
+        """
+        if not details:
+            return
+        body_hash = hashlib.sha256(res.content).hexdigest()
+        self.store(url, res.headers.get("ETag"), res.headers.get("Last-Modified"), body_hash, len(res.content), details)
+
+    def store(self, url, etag, last_modified, body_hash, body_size, details):
+        payload = json.dumps(details)
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+            self._total += len(payload) - (row[0] if row else 0)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, body_hash, body_size, details, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, body_hash, body_size, payload, len(payload), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        evicted = 0
+        while self._total > self.max_bytes:
+            # Oldest first through the last_used index, a batch at a time
+            rows = self._conn.execute(
+                "SELECT url, size FROM pages ORDER BY last_used LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                self._total = 0
+                break
+            victims = []
+            for url, size in rows:
+                if self._total <= self.max_bytes:
+                    break
+                victims.append((url,))
+                self._total -= size
+            self._conn.executemany("DELETE FROM pages WHERE url = ?", victims)
+            evicted += len(victims)
+        if evicted:
+            logger.debug(f"Evicted {evicted} pages from {self.path}")
+
+    def stats(self):
+        requests = self.not_modified + self.unchanged + self.misses
+        hits = self.not_modified + self.unchanged
+        return {
+            "requests": requests,
+            "not_modified": self.not_modified,
+            "unchanged": self.unchanged,
+            "misses": self.misses,
+            "hit_ratio": round(hits / requests, 3) if requests else 0.0,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Detail cache: {stats['requests']} pages, hit ratio {stats['hit_ratio']} "
+            f"({stats['not_modified']} not modified, {stats['unchanged']} unchanged), "
+            f"{stats['bytes_saved']} bytes saved"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
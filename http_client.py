@@ -0,0 +1,83 @@
+import requests
+from requests.adapters import HTTPAdapter
+from logger import get_logger
+
+logger = get_logger("http_client")
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_TIMEOUT = 10
+
+
+class HttpClient:
+    """
+    Shared requests.Session with keep-alive connection pools and compression.
+
+    One client is created per run and passed to the scraper, the fetcher and the
+    notifier so connections (and their TLS handshakes) are reused across calls.
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 timeout=DEFAULT_TIMEOUT, headers=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        self.session.headers.update(headers or {})
+
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    @classmethod
+    def from_config(cls, config, headers=None, fetch_config=None):
+        """
+        Builds a client from the `http` section of inputs.yaml. The timeout used to be
+        set as `fetch.timeout`; that key still applies when `http.timeout` is unset.
+        """
+        config = config or {}
+        timeout = config.get("timeout")
+        if timeout is None and (fetch_config or {}).get("timeout") is not None:
+            logger.warning("fetch.timeout is deprecated, set http.timeout instead")
+            timeout = fetch_config["timeout"]
+        return cls(
+            pool_connections=config.get("pool_connections", DEFAULT_POOL_CONNECTIONS),
+            pool_maxsize=config.get("pool_maxsize", DEFAULT_POOL_MAXSIZE),
+            timeout=DEFAULT_TIMEOUT if timeout is None else timeout,
+            headers=headers,
+        )
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def stats(self):
+        """
+        Returns {host: {"requests": n, "connections": n}} from the live connection pools.
+        Requests far above connections means handshakes are being amortized.
+        """
+        stats = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.host}:{pool.port}" if pool.port else pool.host
+            entry = stats.setdefault(host, {"requests": 0, "connections": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+        return stats
+
+    def log_stats(self):
+        for host, entry in self.stats().items():
+            reused = entry["requests"] - entry["connections"]
+            logger.info(
+                f"{host}: {entry['requests']} requests over {entry['connections']} connections "
+                f"({max(reused, 0)} reused)"
+            )
+
+    def close(self):
+        self.session.close()
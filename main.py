@@ -1,129 +1,301 @@
 import os
-import time
+import threading
 import yaml
 from dotenv import load_dotenv
 
-from scraper import fetch_listings, parse_listing, fetch_details, parse_details
-from filters import matches_filters
-from notifier import notify_discord
-from state import load_seen, save_seen
+from scraper import HEADERS, fetch_listings, parse_listing, fetch_parsed_details
+from crawler import crawl, crawl_key, PAGE_SIZE
+from fetcher import AsyncFetcher
+from planner import plan_searches
+from pipeline import Pipeline, Stage
+from http_client import HttpClient
+from http_cache import DetailCache
+from html_parsing import set_backend
+from filters import FilterEngine
+from notifier import DiscordDispatcher
+from state import SeenStore
 from deal_evaluator import DealEvaluator
+import metrics
+
 
 # --------------------------------------------------
 # Load environment variables
 # --------------------------------------------------
-load_dotenv()
+def load_webhook_url():
+    load_dotenv()
+    webhook_url = os.getenv("DISCORD_WEBHOOK_URL")
+    if not webhook_url:
+        raise RuntimeError("DISCORD_WEBHOOK_URL not found in .env")
+    return webhook_url
 
-WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
-if not WEBHOOK_URL:
-    raise RuntimeError("DISCORD_WEBHOOK_URL not found in .env")
 
 # --------------------------------------------------
-# Load seen listings (deduplication)
+# Load search configuration
 # --------------------------------------------------
-seen = load_seen()
+def find_config(config_path="inputs.yaml"):
+    if not os.path.exists(config_path):
+        print("⚠️ inputs.yaml not found, using inputs.example.yaml")
+        config_path = "inputs.example.yaml"
+    return config_path
 
-# Initialize Deal Evaluator
-# --------------------------------------------------
-evaluator = DealEvaluator()
 
-# --------------------------------------------------
-# --------------------------------------------------
-# Load search configuration
-# --------------------------------------------------
-config_path = "inputs.yaml"
-if not os.path.exists(config_path):
-    print("⚠️ inputs.yaml not found, using inputs.example.yaml")
-    config_path = "inputs.example.yaml"
+def load_config(config_path):
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
 
-with open(config_path, "r") as f:
-    config = yaml.safe_load(f)
+    if "searches" not in config:
+        raise RuntimeError("inputs.yaml must contain a 'searches' list")
+    return config
 
-if "searches" not in config:
-    raise RuntimeError("inputs.yaml must contain a 'searches' list")
 
-# --------------------------------------------------
-# Main scraping loop
-# --------------------------------------------------
-for search in config["searches"]:
-    print(f"\n🔍 Searching: {search['name']}")
-
-    try:
-        rows = fetch_listings(
-            location=search["location"],
-            category=search["category"],
-            query=search["query"],
-            lat=search.get("lat"),
-            lon=search.get("lon"),
-            search_distance=search.get("search_distance")
-        )
-    except Exception as e:
-        print(f"❌ Failed to fetch listings: {e}")
-        continue
+class Scanner:
+    """
+    Runs searches through the fetch -> parse/filter -> dedupe -> details -> evaluate -> notify pipeline.
+
+    Everything that is expensive to set up (the evaluator and its model, seen state,
+    connection pools, the detail cache) is created at most once, so a long-running process can
+    call run() repeatedly. configure() swaps in a new config for the parts that can be
+    reloaded on the fly: searches, keyword rules, parser backend and pipeline sizes.
+    """
 
-    matches_found = 0
+    def __init__(self, config, webhook_url, evaluator=None):
+        self.webhook_url = webhook_url
 
-    for row in rows:
+        # The Deal Evaluator is created by the first batch that needs it, so runs where
+        # nothing matches never open the listings store
+        self._evaluator = evaluator
+
+        # --------------------------------------------------
+        # Load seen listings (deduplication)
+        # --------------------------------------------------
+        # SQLite-backed; imports a legacy state.json on first use and upserts in batches during the run
+        state_config = config.get("state", {})
+        self.seen = SeenStore(state_config.get("path"), batch_size=state_config.get("batch_size", 100))
+        if state_config.get("ttl_days"):
+            self.seen.expire(state_config["ttl_days"])
+
+        # One pooled client for Craigslist and Discord; per-host rate limits replace fixed sleeps
+        self.client = HttpClient.from_config(config.get("http"), headers=HEADERS, fetch_config=config.get("fetch"))
+        self.fetcher = AsyncFetcher.from_config(config.get("fetch"), client=self.client)
+        # Re-evaluated listings (e.g. after a price change) revalidate their detail page instead of re-downloading it
+        self.detail_cache = DetailCache.from_config(config.get("detail_cache"))
+        # Alerts are batched and delivered in the background, so a burst of matches never stalls the scrape
+        self.notifier = DiscordDispatcher.from_config(webhook_url, config.get("notify"), client=self.client)
+
+        self.configure(config)
+
+    @property
+    def evaluator(self):
+        if self._evaluator is None:
+            self._evaluator = DealEvaluator.from_config(self.config.get("evaluator"))
+        return self._evaluator
+
+    def configure(self, config):
+        self.config = config
+        metrics.configure(config.get("metrics"))
+        if config.get("parser"):
+            set_backend(config["parser"])
+
+        # Keyword rules of every search are compiled once; each row is scanned once for all of them
+        self.filter_engine = FilterEngine(config["searches"])
+        self.search_index = {id(search): index for index, search in enumerate(config["searches"])}
+
+    # --------------------------------------------------
+    # Pipeline stages
+    # --------------------------------------------------
+    def fetch_stage(self, plan):
+        print(f"\n🔍 Searching: {', '.join(search['name'] for search, _ in plan.searches)}")
+        crawl_config = self.config.get("crawl", {})
+        sort = crawl_config.get("sort", "date")
+        key = crawl_key({**plan.params, "sort": sort})
         try:
-            item = parse_listing(row)
-        except Exception:
-            continue
+            # Newest first, stopping at the first page that reaches last run's newest posting
+            rows, newest = crawl(
+                lambda offset: fetch_listings(**plan.params, fetcher=self.fetcher, offset=offset, sort=sort),
+                high_water=self.seen.high_water(key),
+                max_pages=crawl_config.get("max_pages", 1),
+                page_size=crawl_config.get("page_size", PAGE_SIZE),
+            )
+        except Exception as e:
+            print(f"❌ Failed to fetch listings: {e}")
+            return []
+        if newest is not None:
+            # Recorded once the run has processed these rows
+            with self._marks_lock:
+                self._marks[key] = newest
+        return [(plan, rows)]
+
+    def parse_stage(self, page):
+        plan, rows = page
+        items = []
+        for row in rows:
+            try:
+                items.append(parse_listing(row))
+            except Exception:
+                continue
+
+        # Look up the whole page's seen state in one query
+        self.seen.prefetch([item["link"] for item in items])
+
+        outputs = []
+        for item in items:
+            # Apply filters for every search served by this fetch at once
+            candidates = [search for search, extra_terms in plan.searches if plan.rows_for([item], extra_terms)]
+            matched = set(self.filter_engine.matching(item, [self.search_index[id(search)] for search in candidates]))
+
+            # One copy per listing with every search it matched, in order; the detail stage
+            # picks the first that still matches once the description is known
+            searches = [search for search in candidates if self.search_index[id(search)] in matched]
+            if searches:
+                outputs.append((searches, dict(item)))
+        return outputs
+
+    def dedupe_stage(self, work):
+        searches, item = work
+        seen = self.seen
 
         # Check if seen and price changed
         is_seen = item["link"] in seen
         price_changed = False
         old_price = None
-        
+
         if is_seen:
             old_price = seen[item["link"]]
             # If price has changed, we treat it as a candidate for update
             if old_price != item["price"]:
                 price_changed = True
                 print(f"  -> Price change detected for {item['title']}: {old_price} -> {item['price']}")
-        
+
         # Skip if seen and price hasn't changed
         if is_seen and not price_changed:
-            continue
+            seen.touch(item["link"])
+            return []
+        return [(searches, item, old_price if price_changed else None)]
 
-        # Apply filters
-        if matches_filters(item, search):
-            # Update seen with new price
-            seen[item["link"]] = item["price"]
+    def details_stage(self, match):
+        searches, item, old_price = match
+        # Deep fetch for more details
+        print(f"  -> Deep fetching: {item['title']}")
+        try:
+            item.update(fetch_parsed_details(item["link"], fetcher=self.fetcher, cache=self.detail_cache))
+        except Exception as e:
+            print(f"⚠️ Failed to fetch details: {e}")
 
-            # Deep fetch for more details
-            print(f"  -> Deep fetching: {item['title']}")
-            try:
-                soup = fetch_details(item["link"])
-                details = parse_details(soup)
-                item.update(details)
-                
+        # Searches that match descriptions get their full keyword check now; without a
+        # description (failed fetch, no posting body) the include words must be in the title
+        search = next(
+            (search for search in searches
+             if self.filter_engine.matches(item, self.search_index[id(search)], defer_description=False)),
+            None,
+        )
+        if search is None:
+            # Not recorded as seen, so a listing no search wants is checked again next run
+            return []
+
+        # Seen is only updated once a search really matches. Another fetch may have
+        # claimed the same listing at this price first in this run.
+        with self._seen_lock:
+            if item["link"] in self.seen and self.seen[item["link"]] == item["price"]:
+                return []
+            self.seen[item["link"]] = item["price"]
+        return [(search, item, old_price)]
 
-                # Evaluate deal and add to database
-                rating, stats = evaluator.evaluate_deal(item)
+    def evaluate_stage(self, batch):
+        # Evaluate whatever matches have arrived in one batch, then add them to the database
+        items = [item for _, item, _ in batch]
+        try:
+            for item, (rating, stats) in zip(items, self.evaluator.evaluate_deals(items)):
                 item["deal_rating"] = rating
                 item["deal_stats"] = stats
-                
-                # Add to database for future comparisons
-                evaluator.add_listing(item)
 
-                # Add price change info to item for notification
-                if price_changed and old_price is not None:
-                    item["old_price"] = old_price
-                    
-                time.sleep(1) # Be nice to the server
-            except Exception as e:
-                print(f"⚠️ Failed to fetch details: {e}")
+            # Add to database for future comparisons
+            self.evaluator.add_listings(items)
+        except Exception as e:
+            print(f"⚠️ Failed to evaluate deals: {e}")
+        return batch
 
-            notify_discord(WEBHOOK_URL, item, search["name"])
-            matches_found += 1
+    def notify_stage(self, match):
+        search, item, old_price = match
+        # Add price change info to item for notification
+        if old_price is not None:
+            item["old_price"] = old_price
+        self.notifier.enqueue(item, search["name"])
+        return [search["name"]]
 
-    print(f"✅ {matches_found} new matches")
+    def build_pipeline(self):
+        # Each stage runs on its own workers with bounded queues between them, so detail
+        # downloads, deal evaluation and notifications overlap instead of running in turn.
+        pipeline_config = self.config.get("pipeline", {})
+        queue_size = pipeline_config.get("queue_size", 64)
+        return Pipeline([
+            Stage("fetch", self.fetch_stage, workers=pipeline_config.get("fetch_workers", 2), queue_size=queue_size),
+            Stage("parse", self.parse_stage, workers=pipeline_config.get("parse_workers", 1), queue_size=queue_size),
+            # Dedupe drops listings already seen at their price; details records the ones that match
+            Stage("dedupe", self.dedupe_stage, workers=1, queue_size=queue_size),
+            Stage("details", self.details_stage, workers=pipeline_config.get("detail_workers", self.fetcher.concurrency),
+                  queue_size=queue_size),
+            # A single evaluator worker keeps the model and store single-threaded
+            Stage("evaluate", self.evaluate_stage, workers=1, queue_size=queue_size,
+                  batch_size=pipeline_config.get("eval_batch_size", 32)),
+            Stage("notify", self.notify_stage, workers=1, queue_size=queue_size),
+        ])
 
-    # Respect Craigslist (do NOT hammer)
-    time.sleep(5)
+    def run(self, searches=None):
+        """
+        Runs the given searches (default: all configured) once.
+        Returns {search name: number of new matches}.
+        """
+        searches = self.config["searches"] if searches is None else searches
+        matches_found = {search["name"]: 0 for search in searches}
+
+        self._marks = {}
+        self._marks_lock = threading.Lock()
+        self._seen_lock = threading.Lock()
+
+        # Searches that issue the same listings request share one fetch
+        with metrics.timer("run_seconds"):
+            for name in self.build_pipeline().run(plan_searches(searches, **self.config.get("plan", {}))):
+                matches_found[name] += 1
+        # Series are cumulative across runs (see metrics.Registry); runs_total gives the denominator
+        metrics.inc("runs_total")
+        for name, count in matches_found.items():
+            metrics.inc("matches_total", count, search=name)
+
+        # Persist seen listings so nothing is lost between runs
+        self.seen.clear_cache()
+        for key, newest in self._marks.items():
+            self.seen.set_high_water(key, newest)
+        metrics.write()
+        return matches_found
+
+    def log_stats(self):
+        self.client.log_stats()
+        if self.detail_cache is not None:
+            self.detail_cache.log_stats()
+
+    def close(self):
+        self.notifier.close()
+        self.seen.close()
+        if self.detail_cache is not None:
+            self.detail_cache.close()
+        self.client.close()
+        # Include what the notifier delivered while draining
+        metrics.write()
+
+
+def main():
+    webhook_url = load_webhook_url()
+    scanner = Scanner(load_config(find_config()), webhook_url)
+
+    # --------------------------------------------------
+    # Main scraping loop
+    # --------------------------------------------------
+    for name, count in scanner.run().items():
+        print(f"✅ {name}: {count} new matches")
+
+    scanner.log_stats()
+    scanner.close()
 
-# --------------------------------------------------
-# Persist seen listings
-# --------------------------------------------------
-save_seen(seen)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+# Latency buckets in seconds, from sub-millisecond parsing up to slow page loads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Samples kept per histogram for the quantiles in the JSON summary
+RESERVOIR_SIZE = 4096
+
+_enabled = False
+_paths = {}
+
+
+class Histogram:
+    """
+    Bucketed observations for Prometheus plus a fixed-size random sample for quantiles.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = []
+        self._rng = random.Random(0)
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(value)
+        else:
+            slot = self._rng.randrange(self.count)
+            if slot < RESERVOIR_SIZE:
+                self.samples[slot] = value
+
+    def quantile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 6)
+
+
+class Registry:
+    """
+    Counters and histograms keyed by metric name and label values. They are cumulative
+    from process start (or the last reset), like Prometheus counters: a daemon running
+    many scans keeps adding to the same series rather than starting each run at zero.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def prometheus_text(self):
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        typed = set()
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Counters and histogram statistics (count, mean, p50/p95/p99, max) as a dict.
+        """
+        with self._lock:
+            counters = {f"{name}{_format_labels(labels)}": value for (name, labels), value in sorted(self.counters.items())}
+            histograms = {}
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                histograms[f"{name}{_format_labels(labels)}"] = {
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "mean": round(histogram.sum / histogram.count, 6) if histogram.count else None,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "max": round(histogram.max, 6),
+                }
+        return {"counters": counters, "histograms": histograms}
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+registry = Registry()
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe(self.name, time.perf_counter() - self.started, self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+# --------------------------------------------------
+# Recording API; every call is a single flag check when metrics are disabled
+# --------------------------------------------------
+def inc(name, value=1, **labels):
+    if _enabled:
+        registry.inc(name, value, tuple(sorted(labels.items())))
+
+
+def observe(name, value, **labels):
+    if _enabled:
+        registry.observe(name, value, tuple(sorted(labels.items())))
+
+
+def timer(name, **labels):
+    """
+    Context manager that records the duration of its block in the histogram `name`.
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name, tuple(sorted(labels.items())))
+
+
+def enabled():
+    return _enabled
+
+
+def enable(prometheus_path=None, json_path=None):
+    global _enabled
+    _enabled = True
+    _paths["prometheus"] = prometheus_path
+    _paths["json"] = json_path
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def configure(config):
+    """
+    Applies the `metrics` section of inputs.yaml. Metrics stay disabled unless enabled: true.
+    """
+    config = config or {}
+    if config.get("enabled"):
+        enable(config.get("prometheus", "metrics/metrics.prom"), config.get("json", "metrics/summary.json"))
+    else:
+        disable()
+
+
+def _write_atomic(path, text):
+    # Scrapers reading the textfile never see a half-written file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def write():
+    """
+    Writes the Prometheus text file and JSON summary to the configured paths. Both hold
+    everything recorded since the registry started; the summary says when that was.
+    """
+    if not _enabled:
+        return
+    if _paths.get("prometheus"):
+        _write_atomic(_paths["prometheus"], registry.prometheus_text())
+    if _paths.get("json"):
+        summary = {"since": registry.started, **registry.summary()}
+        _write_atomic(_paths["json"], json.dumps(summary, indent=2) + "\n")
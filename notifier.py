@@ -1,7 +1,24 @@
-import requests
 import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import requests
+from http_client import HttpClient, DEFAULT_TIMEOUT
+from logger import get_logger
+import metrics
+
+logger = get_logger("notifier")
 
-def notify_discord(webhook_url, item, search_name):
+USERNAME = "Craigslist Bot"
+# Discord accepts at most 10 embeds and 6000 characters of embed text per message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_MESSAGE_CHARS = 6000
+
+def build_embed(item, search_name):
+    """
+    Builds the Discord embed for a matched listing.
+    """
     embed = {
         "title": item["title"][:256],
         "url": item["link"],
@@ -25,15 +42,6 @@ def notify_discord(webhook_url, item, search_name):
         ]
     }
 
-    if "old_price" in item:
-        embed["title"] = f"📉 PRICE DROP: {embed['title']}"
-        embed["color"] = 0xff9900 # Orange for updates
-        embed["fields"].insert(1, {
-            "name": "Old Price",
-            "value": f"${item['old_price']}" if item['old_price'] else "N/A",
-            "inline": True
-        })
-
     if "old_price" in item:
         embed["title"] = f"📉 PRICE DROP: {embed['title']}"
         embed["color"] = 0xff9900 # Orange for updates
@@ -54,7 +62,9 @@ def notify_discord(webhook_url, item, search_name):
         elif "Overpriced" in rating: emoji = "💸"
         
         value_text = f"{emoji} **{rating}**"
-        if stats and stats.get('average_price'):
+        if stats and stats.get('median_price'):
+            value_text += f"\nMedian: ${stats['median_price']} (n={stats['sample_size']})"
+        elif stats and stats.get('average_price'):
             value_text += f"\nAvg: ${stats['average_price']} (n={stats['sample_size']})"
             
         embed["fields"].append({
@@ -83,10 +93,289 @@ def notify_discord(webhook_url, item, search_name):
     if item.get("images") and len(item["images"]) > 0:
         embed["image"] = {"url": item["images"][0]}
 
+    return embed
+
+def notify_discord(webhook_url, item, search_name, client=None):
     payload = {
-        "username": "Craigslist Bot",
-        "embeds": [embed]
+        "username": USERNAME,
+        "embeds": [build_embed(item, search_name)]
     }
 
-    res = requests.post(webhook_url, json=payload, timeout=10)
+    # A shared client keeps the webhook connection alive between notifications
+    with metrics.timer("notifier_webhook_seconds"):
+        if client is not None:
+            res = client.post(webhook_url, json=payload)
+        else:
+            res = requests.post(webhook_url, json=payload, timeout=DEFAULT_TIMEOUT)
+    metrics.inc("notifier_messages_total", status=res.status_code)
     res.raise_for_status()
+
+def _embed_chars(embed):
+    """
+    Characters of an embed that count towards Discord's per-message limit.
+    """
+    total = len(embed.get("title", "")) + len(embed.get("description", ""))
+    for field in embed.get("fields", []):
+        total += len(field["name"]) + len(field["value"])
+    return total
+
+def _retry_after(res):
+    """
+    Seconds Discord asked us to wait after a 429, from the JSON body or the Retry-After header.
+    """
+    try:
+        return float(res.json()["retry_after"])
+    except Exception:
+        pass
+    try:
+        return float(res.headers.get("Retry-After", 1))
+    except ValueError:
+        return 1.0
+
+
+class DiscordDispatcher:
+    """
+    Queues alerts and delivers them to a Discord webhook from a background thread.
+
+    Queued alerts are sent every flush_interval seconds, up to 10 embeds per message,
+    so a burst of matches goes out in as few messages as possible. Alerts are written
+    to a SQLite outbox when queued and only deleted once Discord accepts them, so
+    anything undelivered at shutdown is sent on the next start. A 429 waits the
+    retry_after Discord returns, an exhausted X-RateLimit-Remaining bucket waits for
+    X-RateLimit-Reset-After, and network errors or 5xx responses back off exponentially.
+    A 400 or 413 (a payload Discord will never accept) is retried one embed at a time
+    and only the embeds Discord rejects are dropped. Other 4xx responses, such as a
+    revoked webhook, keep the alerts queued and retry every backoff_cap seconds; after
+    max_retries refusals the message is dropped and logged so the queue moves on.
+    """
+
+    def __init__(self, webhook_url, client=None, outbox_path="data/outbox.sqlite", flush_interval=1.0,
+                 max_retries=5, backoff_base=1.0, backoff_cap=60.0):
+        self.webhook_url = webhook_url
+        self.client = client or HttpClient()
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.messages_sent = 0
+        self.embeds_sent = 0
+        self.embeds_dropped = 0
+        self.retries = 0
+        self._blocked_until = 0.0
+        # Webhook refusals (401/403/404) per outbox row at the head of a message
+        self._refusals = {}
+
+        self.outbox_path = Path(outbox_path)
+        self.outbox_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.outbox_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, embed TEXT NOT NULL, queued REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._abort = threading.Event()
+        pending = self.pending()
+        if pending:
+            logger.info(f"Resuming delivery of {pending} undelivered alerts from {self.outbox_path}")
+            self._wake.set()
+        self._thread = threading.Thread(target=self._run, name="discord-dispatcher", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, webhook_url, config, client=None):
+        """
+        Builds a dispatcher from the `notify` section of inputs.yaml.
+        """
+        config = config or {}
+        return cls(
+            webhook_url,
+            client=client,
+            outbox_path=config.get("outbox", "data/outbox.sqlite"),
+            flush_interval=config.get("flush_interval", 1.0),
+            max_retries=config.get("max_retries", 5),
+        )
+
+    def enqueue(self, item, search_name):
+        """
+        Queues an alert for the listing. Returns immediately; delivery happens in the background.
+        """
+        embed = build_embed(item, search_name)
+        with self._lock:
+            self._conn.execute("INSERT INTO outbox (embed, queued) VALUES (?, ?)", (json.dumps(embed), time.time()))
+            self._conn.commit()
+        metrics.inc("notifier_alerts_queued_total")
+
+    def pending(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def _next_batch(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, embed FROM outbox ORDER BY id LIMIT ?", (MAX_EMBEDS_PER_MESSAGE,)
+            ).fetchall()
+        batch = []
+        chars = 0
+        for row_id, embed in rows:
+            embed = json.loads(embed)
+            size = _embed_chars(embed)
+            if batch and chars + size > MAX_MESSAGE_CHARS:
+                break
+            batch.append((row_id, embed))
+            chars += size
+        return batch
+
+    def _delete(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id in ids])
+            self._conn.commit()
+
+    def _wait(self, seconds):
+        # Returns early when close() runs out of time
+        if seconds > 0:
+            self._abort.wait(seconds)
+
+    def _note_rate_limit(self, res):
+        if res.headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                reset_after = float(res.headers.get("X-RateLimit-Reset-After", 1))
+            except ValueError:
+                reset_after = 1.0
+            self._blocked_until = time.monotonic() + reset_after
+
+    def _send(self, batch):
+        """
+        Posts one message, retrying as Discord allows. Returns False if it should be retried later.
+        """
+        payload = {"username": USERNAME, "embeds": [embed for _, embed in batch]}
+        failures = 0
+        while not self._abort.is_set():
+            self._wait(self._blocked_until - time.monotonic())
+            try:
+                with metrics.timer("notifier_webhook_seconds"):
+                    res = self.client.post(self.webhook_url, json=payload)
+            except Exception as e:
+                res = None
+                error = str(e)
+                metrics.inc("notifier_messages_total", status="error")
+            else:
+                metrics.inc("notifier_messages_total", status=res.status_code)
+                self._note_rate_limit(res)
+                if res.status_code == 429:
+                    self.retries += 1
+                    delay = _retry_after(res)
+                    logger.warning(f"Discord rate limited, retrying in {delay:.2f}s")
+                    self._wait(delay)
+                    continue
+                if res.ok:
+                    self._refusals.pop(batch[0][0], None)
+                    self._delete([row_id for row_id, _ in batch])
+                    self.messages_sent += 1
+                    self.embeds_sent += len(batch)
+                    metrics.inc("notifier_alerts_sent_total", len(batch))
+                    return True
+                if res.status_code in (400, 413):
+                    # Discord rejected the payload itself; find the embeds it rejects
+                    if len(batch) > 1:
+                        logger.warning(f"Discord rejected a message of {len(batch)} alerts ({res.status_code}), sending them one by one")
+                        return self._send_each(batch)
+                    self._drop(batch, f"rejected with {res.status_code}: {res.text[:200]}")
+                    return True
+                if res.status_code < 500:
+                    # A revoked or mistyped webhook: keep the alerts for a while in case it is fixed
+                    refusals = self._refusals.get(batch[0][0], 0) + 1
+                    if refusals > self.max_retries:
+                        self._refusals.pop(batch[0][0], None)
+                        self._drop(batch, f"webhook refused {refusals} times, last with {res.status_code}")
+                        return True
+                    self._refusals[batch[0][0]] = refusals
+                    logger.error(
+                        f"Discord refused the webhook ({res.status_code}): {res.text[:200]}. "
+                        f"Check DISCORD_WEBHOOK_URL; {self.pending()} alerts stay queued, "
+                        f"retrying in {self.backoff_cap:.0f}s ({refusals}/{self.max_retries})"
+                    )
+                    self._blocked_until = time.monotonic() + self.backoff_cap
+                    return False
+                error = f"HTTP {res.status_code}"
+
+            failures += 1
+            if failures > self.max_retries:
+                logger.error(f"Giving up on Discord for now after {failures} failures: {error}")
+                return False
+            self.retries += 1
+            self._wait(min(self.backoff_cap, self.backoff_base * 2 ** (failures - 1)))
+        return False
+
+    def _send_each(self, batch):
+        """
+        Sends each alert of a rejected message on its own, so only the bad ones are dropped.
+        """
+        for row in batch:
+            if not self._send([row]):
+                return False
+        return True
+
+    def _drop(self, batch, reason):
+        titles = ", ".join(embed.get("title", "") for _, embed in batch)
+        logger.error(f"Dropping {len(batch)} alerts ({reason}): {titles}")
+        self._delete([row_id for row_id, _ in batch])
+        self.embeds_dropped += len(batch)
+        metrics.inc("notifier_alerts_dropped_total", len(batch))
+
+    def flush(self):
+        """
+        Sends queued alerts until the outbox is empty or delivery keeps failing.
+        """
+        while not self._abort.is_set():
+            batch = self._next_batch()
+            if not batch or not self._send(batch):
+                return
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Discord dispatcher failed")
+            if self._closing.is_set():
+                return
+
+    def stats(self):
+        return {
+            "messages_sent": self.messages_sent,
+            "embeds_sent": self.embeds_sent,
+            "embeds_dropped": self.embeds_dropped,
+            "retries": self.retries,
+            "pending": self.pending(),
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Discord: {stats['embeds_sent']} alerts in {stats['messages_sent']} messages, "
+            f"{stats['retries']} retries, {stats['embeds_dropped']} dropped, {stats['pending']} pending"
+        )
+
+    def close(self, timeout=30):
+        """
+        Delivers what is queued, waiting at most timeout seconds, and logs delivery
+        stats. Anything left stays in the outbox for the next start.
+        """
+        self._closing.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            self._abort.set()
+            self._thread.join()
+        self.log_stats()
+        pending = self.pending()
+        if pending:
+            logger.warning(f"{pending} alerts left in {self.outbox_path} for the next run")
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import html_parsing
+from html_parsing import make_soup, SEARCH_RESULTS, DETAIL_PAGE
+from scraper import parse_listing, parse_details
+from logger import get_logger
+
+logger = get_logger("parse_pool")
+
+DEFAULT_CHUNK_SIZE = 16
+
+
+def _init_worker(backend):
+    # Workers parse with the same tree builder as the parent
+    html_parsing.set_backend(backend)
+
+
+def parse_search_page(html):
+    """
+    Parses every row of a search results page into a listing dict, skipping rows that fail.
+    """
+    items = []
+    for row in make_soup(html, SEARCH_RESULTS).select(".cl-static-search-result"):
+        try:
+            items.append(parse_listing(row))
+        except Exception:
+            continue
+    return items
+
+
+def parse_detail_pages(pages):
+    """
+    parse_details for a chunk of raw detail pages. A page that fails to parse yields {}.
+    """
+    results = []
+    for html in pages:
+        try:
+            results.append(parse_details(make_soup(html, DETAIL_PAGE)))
+        except Exception as e:
+            logger.warning(f"Failed to parse detail page: {e}")
+            results.append({})
+    return results
+
+
+class ParsePool:
+    """
+    Parses raw HTML in worker processes so BeautifulSoup's work spreads across cores.
+
+    Only HTML strings go to the workers and only the compact listing/details dicts
+    come back; soups never cross the process boundary. Detail pages are sent
+    chunk_size at a time to amortize the IPC cost. With workers=0 everything is
+    parsed inline, which is the single-process baseline.
+    """
+
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = max(1, chunk_size)
+        self._executor = None
+        if self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(html_parsing.get_backend(),)
+            )
+            logger.info(f"Parsing with {self.workers} worker processes, {self.chunk_size} pages per task")
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds a pool from the `dataset` section of inputs.yaml, or returns None when
+        parse_workers is absent, so callers keep parsing in-process.
+        """
+        config = config or {}
+        if config.get("parse_workers") is None:
+            return None
+        return cls(workers=config["parse_workers"], chunk_size=config.get("parse_chunk_size", DEFAULT_CHUNK_SIZE))
+
+    def parse_search(self, html):
+        if self._executor is None:
+            return parse_search_page(html)
+        return self._executor.submit(parse_search_page, html).result()
+
+    def parse_details_many(self, pages):
+        """
+        Returns one details dict per page, in order.
+        """
+        pages = list(pages)
+        chunks = [pages[start:start + self.chunk_size] for start in range(0, len(pages), self.chunk_size)]
+        if self._executor is None:
+            parsed = map(parse_detail_pages, chunks)
+        else:
+            parsed = self._executor.map(parse_detail_pages, chunks)
+        return [details for chunk in parsed for details in chunk]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,151 @@
+import queue
+import threading
+import time
+from logger import get_logger
+import metrics
+
+logger = get_logger("pipeline")
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    func takes one input and returns an iterable of outputs (zero, one or many), or
+    None to drop the input. With batch_size set, func instead takes a list of up to
+    batch_size inputs (whatever has arrived within batch_wait seconds) and returns
+    an iterable of outputs for the whole batch.
+
+    Each stage runs `workers` threads reading from a bounded queue of `queue_size`,
+    so a slow stage blocks the ones feeding it instead of buffering without limit.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=64, batch_size=None, batch_wait=0.2):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """
+    Runs a chain of Stages on worker threads connected by bounded queues.
+    Network-bound and CPU-bound stages overlap: while one stage waits on a
+    download, the next can be encoding or notifying.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    def run(self, inputs):
+        """
+        Feeds inputs into the first stage and blocks until every stage has drained.
+        Returns the outputs of the last stage.
+        """
+        results = []
+        threads = []
+        remaining = {stage.name: stage.workers for stage in self.stages}
+
+        for index, stage in enumerate(self.stages):
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stage, downstream, remaining, results),
+                    name=f"{stage.name}-{n}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        start = time.perf_counter()
+        first = self.stages[0]
+        for item in inputs:
+            first.queue.put(item)
+        for _ in range(first.workers):
+            first.queue.put(_DONE)
+
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.perf_counter() - start
+        for stage in self.stages:
+            logger.info(
+                f"Stage {stage.name}: {stage.processed} processed, {stage.failed} failed, "
+                f"{stage.busy_seconds:.2f}s busy over {elapsed:.2f}s"
+            )
+        return results
+
+    def _next_batch(self, stage):
+        """
+        Returns (batch, done): up to batch_size items, waiting at most batch_wait for more.
+        """
+        item = stage.queue.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + stage.batch_wait
+        while len(batch) < stage.batch_size:
+            try:
+                item = stage.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _work(self, stage, downstream, remaining, results):
+        done = False
+        while not done:
+            if stage.batch_size:
+                batch, done = self._next_batch(stage)
+                if not batch:
+                    continue
+                work = batch
+            else:
+                work = stage.queue.get()
+                if work is _DONE:
+                    break
+
+            started = time.perf_counter()
+            count = len(work) if stage.batch_size else 1
+            try:
+                outputs = list(stage.func(work) or ())
+            except Exception:
+                logger.exception(f"Stage {stage.name} failed")
+                outputs = []
+                with stage._lock:
+                    stage.failed += count
+                metrics.inc("pipeline_items_total", count, stage=stage.name, result="failed")
+            else:
+                with stage._lock:
+                    stage.processed += count
+                metrics.inc("pipeline_items_total", count, stage=stage.name, result="processed")
+            elapsed = time.perf_counter() - started
+            with stage._lock:
+                stage.busy_seconds += elapsed
+            metrics.observe("pipeline_stage_seconds", elapsed, stage=stage.name)
+
+            for output in outputs:
+                if downstream is not None:
+                    downstream.queue.put(output)
+                else:
+                    results.append(output)
+
+        # The last worker of a stage to finish tells the next stage's workers to stop
+        with stage._lock:
+            remaining[stage.name] -= 1
+            last = remaining[stage.name] == 0
+        if last and downstream is not None:
+            for _ in range(downstream.workers):
+                downstream.queue.put(_DONE)
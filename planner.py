@@ -0,0 +1,97 @@
+from logger import get_logger
+
+logger = get_logger("planner")
+
+
+def query_terms(query):
+    """
+    Lowercased, de-duplicated words of a search query.
+    """
+    return frozenset((query or "").lower().split())
+
+
+def has_operators(query):
+    """
+    Whether a query uses Craigslist search operators: -exclusions, | alternatives,
+    "quoted phrases", (grouping) or * wildcards.
+    """
+    query = query or ""
+    return any(char in query for char in '|"()*') or any(word.startswith("-") for word in query.split())
+
+
+def fetch_key(search):
+    """
+    Identifies the listings request a search issues. Searches with equal keys fetch the same page.
+    Geo parameters only count when all three are set, mirroring fetch_listings.
+    """
+    lat, lon, distance = search.get("lat"), search.get("lon"), search.get("search_distance")
+    if not (lat and lon and distance):
+        lat = lon = distance = None
+    return (search["location"], search["category"], lat, lon, distance, query_terms(search["query"]))
+
+
+class FetchPlan:
+    """
+    One listings request and the searches whose rows come from it.
+
+    Each entry in `searches` is (search, extra_terms): rows are fanned out to the search
+    after keeping only titles that contain every word in extra_terms (empty when the
+    search issued exactly this query).
+    """
+
+    def __init__(self, search):
+        self.params = {
+            "location": search["location"],
+            "category": search["category"],
+            "query": search["query"],
+            "lat": search.get("lat"),
+            "lon": search.get("lon"),
+            "search_distance": search.get("search_distance"),
+        }
+        self.key = fetch_key(search)
+        self.searches = []
+
+    def rows_for(self, items, extra_terms):
+        if not extra_terms:
+            return items
+        return [item for item in items if all(term in item["title"] for term in extra_terms)]
+
+
+def plan_searches(searches, subsume_queries=False):
+    """
+    Groups searches so each distinct listings request is issued once.
+
+    Searches that share location, category, geo filter and query words share a fetch.
+    With subsume_queries, a search whose query words are a superset of another's in the
+    same area reuses the broader fetch and filters rows by the extra words in the title.
+    That is opt-in because Craigslist also matches query words in descriptions, so the
+    title filter can drop rows the narrower request would have returned. Queries with
+    search operators are never subsumed, nor subsume others: the title filter only
+    understands plain words.
+    """
+    plans = {}
+    for search in searches:
+        key = fetch_key(search)
+        if key not in plans:
+            plans[key] = FetchPlan(search)
+        plans[key].searches.append((search, frozenset()))
+
+    if subsume_queries:
+        # Visit broad queries first so chains like "" > "monitor" > "gaming monitor" collapse
+        ordered = sorted(
+            (plan for plan in plans.values() if not has_operators(plan.params["query"])),
+            key=lambda plan: len(plan.key[5]),
+        )
+        for i, narrow in enumerate(ordered):
+            for broad in ordered[:i]:
+                if broad.key not in plans or broad.key[:5] != narrow.key[:5]:
+                    continue
+                if broad.key[5] < narrow.key[5]:
+                    extra = narrow.key[5] - broad.key[5]
+                    broad.searches.extend((search, terms | extra) for search, terms in narrow.searches)
+                    del plans[narrow.key]
+                    break
+
+    result = list(plans.values())
+    logger.info(f"Planned {len(result)} listings requests for {len(searches)} searches")
+    return result
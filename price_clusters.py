@@ -0,0 +1,218 @@
+import bisect
+import os
+import time
+from pathlib import Path
+import numpy as np
+from ann_index import train_centroids, _nearest_centroids
+from deal_store import normalize_rows
+from logger import get_logger
+
+logger = get_logger("price_clusters")
+
+CENTROIDS_FILE = "centroids.npy"
+COUNTS_FILE = "counts.npy"
+ASSIGNMENTS_FILE = "assignments.i32"
+PRICES_FILE = "prices.f32"
+# Centroids and counts are rewritten once this many rows have been added since the last save
+SAVE_EVERY = 1024
+
+
+def _save_atomic(path, array):
+    tmp = path.with_name(path.name + ".tmp.npy")
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _median(ordered):
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+class PriceClusters:
+    """
+    Mini-batch k-means over stored embeddings with running price statistics per cluster.
+
+    Every stored row is assigned to its nearest centroid when it is added, and the
+    centroid moves towards it with a per-centroid learning rate of 1/count, so the
+    clusters keep adapting without a full re-train. Each cluster keeps its prices
+    sorted, which makes the median and percentiles a lookup. Rating a listing scores
+    it against the centroids only, instead of against the whole corpus.
+
+    Lives in a directory next to the store: the centroids and their update counts,
+    plus one int32 cluster id and one float32 price (NaN when unknown) per store row,
+    appended in row order. Rows are appended before the centroids move, and the
+    centroids and counts are only rewritten every SAVE_EVERY rows and on close, so a
+    crash loses some centroid updates but never counts a row twice on reopen.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.centroids = np.load(self.path / CENTROIDS_FILE)
+        self.counts = np.load(self.path / COUNTS_FILE)
+
+        assignments_file = self.path / ASSIGNMENTS_FILE
+        prices_file = self.path / PRICES_FILE
+        assignments = np.fromfile(assignments_file, dtype=np.int32) if assignments_file.exists() else np.zeros(0, dtype=np.int32)
+        prices = np.fromfile(prices_file, dtype=np.float32) if prices_file.exists() else np.zeros(0, dtype=np.float32)
+        # A crash between the two appends leaves one file a batch ahead
+        self.count = min(len(assignments), len(prices))
+        if len(assignments) != len(prices):
+            logger.warning("Cluster assignments and prices disagree, truncating to the shorter")
+            for name, values in ((ASSIGNMENTS_FILE, assignments), (PRICES_FILE, prices)):
+                with open(self.path / name, "r+b") as f:
+                    f.truncate(self.count * values.itemsize)
+        self._assignments = open(assignments_file, "ab")
+        self._prices = open(prices_file, "ab")
+
+        self.prices = [[] for _ in range(len(self.centroids))]
+        assignments, prices = assignments[:self.count], prices[:self.count]
+        self._rows = [assignments]
+        priced = ~np.isnan(prices)
+        for k, price in zip(assignments[priced].tolist(), prices[priced].tolist()):
+            self.prices[k].append(price)
+        for values in self.prices:
+            values.sort()
+        self.sums = np.array([sum(values) for values in self.prices], dtype=np.float64)
+        self._unsaved = 0
+
+    @classmethod
+    def exists(cls, path):
+        return (Path(path) / CENTROIDS_FILE).exists()
+
+    @classmethod
+    def build(cls, path, embeddings, prices, n_clusters=256, iterations=10):
+        """
+        Seeds the centroids with k-means over the existing embeddings and assigns every row.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in (ASSIGNMENTS_FILE, PRICES_FILE):
+            (path / name).unlink(missing_ok=True)
+
+        start = time.perf_counter()
+        centroids = train_centroids(embeddings, n_clusters, iterations=iterations)
+        _save_atomic(path / CENTROIDS_FILE, centroids)
+        _save_atomic(path / COUNTS_FILE, np.zeros(len(centroids), dtype=np.int64))
+        clusters = cls(path)
+        clusters.add(embeddings, prices, learn=False)
+        clusters.save()
+        logger.info(
+            f"Built {len(centroids)} price clusters over {len(embeddings)} rows "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return clusters
+
+    def add(self, vectors, prices, learn=True):
+        """
+        Assigns new rows (appended after the current count) to their nearest clusters,
+        adds their prices to the cluster statistics and, with learn, moves the centroids
+        towards them. A price of None leaves the statistics alone.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        prices = np.array([np.nan if price is None else price for price in prices], dtype=np.float32)
+        assignments = _nearest_centroids(vectors, self.centroids)
+
+        self._rows.append(assignments)
+        self._assignments.write(assignments.tobytes())
+        self._assignments.flush()
+        self._prices.write(prices.tobytes())
+        self._prices.flush()
+        self.count += len(vectors)
+
+        if learn:
+            for k, vector, price in zip(assignments.tolist(), vectors, prices.tolist()):
+                self.counts[k] += 1
+                rate = 1.0 / self.counts[k]
+                self.centroids[k] = (1.0 - rate) * self.centroids[k] + rate * vector
+                if not np.isnan(price):
+                    bisect.insort(self.prices[k], price)
+                    self.sums[k] += price
+            touched = np.unique(assignments)
+            self.centroids[touched] = normalize_rows(self.centroids[touched])
+        else:
+            # Bulk assignment (initial build): no per-row centroid updates
+            self.counts += np.bincount(assignments, minlength=len(self.centroids))
+            priced = ~np.isnan(prices)
+            touched = set()
+            for k, price in zip(assignments[priced].tolist(), prices[priced].tolist()):
+                self.prices[k].append(price)
+                self.sums[k] += price
+                touched.add(k)
+            for k in touched:
+                self.prices[k].sort()
+
+        self._unsaved += len(vectors)
+        if self._unsaved >= SAVE_EVERY:
+            self.save()
+
+    def save(self):
+        """
+        Writes the centroids and counts if rows were added since the last save.
+        """
+        if not self._unsaved:
+            return
+        _save_atomic(self.path / CENTROIDS_FILE, self.centroids)
+        _save_atomic(self.path / COUNTS_FILE, self.counts)
+        self._unsaved = 0
+
+    def cluster_of(self, row):
+        """
+        The cluster a store row was assigned to.
+        """
+        if len(self._rows) > 1:
+            self._rows = [np.concatenate(self._rows)]
+        return int(self._rows[0][row])
+
+    def stats(self, query, threshold=0.4, min_samples=5, max_clusters=3, exclude=None):
+        """
+        Price statistics for the cluster nearest to a normalized query vector, or None
+        when no centroid scores at least threshold. Clusters with fewer than
+        min_samples prices are pooled with the next nearest ones (up to max_clusters).
+        exclude=(cluster, price) leaves one stored price out, e.g. the listing's own.
+        """
+        scores = self.centroids @ query
+        nearest = np.argsort(-scores)[:max_clusters]
+        if scores[nearest[0]] < threshold:
+            return None
+
+        used = []
+        for k in nearest.tolist():
+            if used and scores[k] < threshold:
+                break
+            used.append(k)
+            if sum(len(self.prices[cluster]) for cluster in used) >= min_samples:
+                break
+        # Pooling only happens for sparse clusters, so the merge stays small
+        ordered = self.prices[used[0]] if len(used) == 1 else sorted(p for cluster in used for p in self.prices[cluster])
+        total = float(self.sums[used].sum())
+        if exclude is not None and exclude[0] in used and exclude[1] is not None:
+            # Prices are kept as float32
+            price = float(np.float32(exclude[1]))
+            position = bisect.bisect_left(ordered, price)
+            if position < len(ordered) and ordered[position] == price:
+                ordered = ordered[:position] + ordered[position + 1:]
+                total -= price
+        if not ordered:
+            return {"clusters": used, "similarity": float(scores[used[0]]), "count": 0}
+        return {
+            "clusters": used,
+            "similarity": float(scores[used[0]]),
+            "count": len(ordered),
+            "median": _median(ordered),
+            "mean": total / len(ordered),
+            "p25": _percentile(ordered, 0.25),
+            "p75": _percentile(ordered, 0.75),
+        }
+
+    def close(self):
+        self.save()
+        self._assignments.close()
+        self._prices.close()
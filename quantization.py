@@ -0,0 +1,199 @@
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from logger import get_logger
+
+logger = get_logger("quantization")
+
+DTYPES = ("float32", "float16", "int8")
+SCALES_FILE = "scales.f32"
+INITIAL_CAPACITY = 1024
+# Compact rows widened to float32 at a time while scoring
+SCORE_BLOCK = 16384
+
+
+def quantize_int8(vectors):
+    """
+    Symmetric per-vector int8 quantization: each row is scaled so its largest
+    component maps to +-127. Returns (codes, scales); codes * scales approximates vectors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class CompactEmbeddings:
+    """
+    A reduced-precision copy of a store's embeddings, used to score candidates
+    cheaply before the best ones are rescored against the exact float32 rows.
+
+    int8 keeps one float32 scale per row (4x smaller than float32); float16 halves
+    the size. The copy is derived from the store: rows missing after a crash or a
+    dtype change are re-quantized from the float32 embeddings on open.
+    """
+
+    def __init__(self, path, dtype, dim):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported compact dtype {dtype!r}, expected float16 or int8")
+        self.path = Path(path)
+        self.dtype = dtype
+        self.dim = dim
+        self._codes_file = self.path / f"embeddings.{'i8' if dtype == 'int8' else 'f16'}"
+        codes_dtype = np.int8 if dtype == "int8" else np.float16
+
+        codes = np.fromfile(self._codes_file, dtype=codes_dtype) if self._codes_file.exists() else np.zeros(0, codes_dtype)
+        self.count = len(codes) // dim
+        scales = np.zeros(0, dtype=np.float32)
+        if dtype == "int8":
+            scales_file = self.path / SCALES_FILE
+            scales = np.fromfile(scales_file, dtype=np.float32) if scales_file.exists() else scales
+            self.count = min(self.count, len(scales))
+
+        capacity = max(INITIAL_CAPACITY, self.count)
+        self._codes = np.zeros((capacity, dim), dtype=codes_dtype)
+        self._codes[:self.count] = codes[:self.count * dim].reshape(-1, dim)
+        self._scales = np.ones(capacity, dtype=np.float32)
+        self._scales[:self.count] = scales[:self.count]
+        self._truncate(self.count)
+
+    def _truncate(self, count):
+        """
+        Drops rows at and after count from memory and disk.
+        """
+        self.count = count
+        files = [(self._codes_file, self._codes.itemsize * self.dim)]
+        if self.dtype == "int8":
+            files.append((self.path / SCALES_FILE, 4))
+        for file_path, row_bytes in files:
+            if file_path.exists() and file_path.stat().st_size > count * row_bytes:
+                with open(file_path, "r+b") as f:
+                    f.truncate(count * row_bytes)
+
+    def sync(self, embeddings, batch_size=65536):
+        """
+        Brings the copy in line with the store's float32 embeddings.
+        """
+        if self.count > len(embeddings):
+            logger.warning(f"Compact embeddings are ahead of the store, truncating to {len(embeddings)} rows")
+            self._truncate(len(embeddings))
+        if self.count < len(embeddings):
+            logger.info(f"Quantizing {len(embeddings) - self.count} rows to {self.dtype}")
+            for start in range(self.count, len(embeddings), batch_size):
+                self.extend(embeddings[start:start + batch_size])
+
+    def extend(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if not len(vectors):
+            return
+        needed = self.count + len(vectors)
+        if needed > len(self._codes):
+            capacity = len(self._codes)
+            while capacity < needed:
+                capacity *= 2
+            codes = np.zeros((capacity, self.dim), dtype=self._codes.dtype)
+            codes[:self.count] = self._codes[:self.count]
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:self.count] = self._scales[:self.count]
+            self._codes, self._scales = codes, scales
+
+        if self.dtype == "int8":
+            codes, scales = quantize_int8(vectors)
+            self._scales[self.count:needed] = scales
+            with open(self.path / SCALES_FILE, "ab") as f:
+                f.write(scales.tobytes())
+        else:
+            codes = vectors.astype(np.float16)
+        self._codes[self.count:needed] = codes
+        with open(self._codes_file, "ab") as f:
+            f.write(codes.tobytes())
+        self.count = needed
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self.count * (self.dim * self._codes.itemsize + (4 if self.dtype == "int8" else 0))
+
+    def __getitem__(self, rows):
+        """
+        Dequantized float32 rows, so the copy can stand in for the embedding matrix.
+        """
+        rows = np.asarray(rows)
+        vectors = self._codes[:self.count][rows].astype(np.float32)
+        if self.dtype == "int8":
+            vectors *= self._scales[:self.count][rows][..., None]
+        return vectors
+
+    def scores(self, queries):
+        """
+        Approximate (len(queries), count) similarity matrix, widening SCORE_BLOCK rows at a time.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        scores = np.empty((len(queries), self.count), dtype=np.float32)
+        for start in range(0, self.count, SCORE_BLOCK):
+            stop = min(start + SCORE_BLOCK, self.count)
+            block = queries @ self._codes[start:stop].astype(np.float32).T
+            if self.dtype == "int8":
+                block *= self._scales[start:stop]
+            scores[:, start:stop] = block
+        return scores
+
+
+def agreement_report(exact, quantized, listings, top_k=5, threshold=0.4):
+    """
+    Compares an evaluator over compact embeddings with a float32 one over the same
+    listings: recall@k of the similar listings, how often the deal rating matches,
+    search latency and embedding memory.
+    """
+    listings = list(listings)
+    start = time.perf_counter()
+    expected = exact._similar_rows(listings, top_k, threshold)
+    exact_ms = (time.perf_counter() - start) * 1000 / max(1, len(listings))
+    start = time.perf_counter()
+    found = quantized._similar_rows(listings, top_k, threshold)
+    quantized_ms = (time.perf_counter() - start) * 1000 / max(1, len(listings))
+
+    recalls = []
+    for a, e in zip(found, expected):
+        if e:
+            # A found row tied with the k-th exact match is as good as the one it displaced
+            kth = min(score for score, _ in e) - 1e-6
+            hits = {row for _, row in e} | {row for score, row in a if score >= kth}
+            recalls.append(min(len(e), len(hits & {row for _, row in a})) / len(e))
+
+    priced = [listing for listing in listings if listing.get('price') is not None]
+    ratings = [a[0] == e[0] for a, e in zip(quantized.evaluate_deals(priced), exact.evaluate_deals(priced))]
+    return {
+        "dtype": quantized.data.compact.dtype,
+        "rows": len(exact.data),
+        "queries": len(listings),
+        "top_k": top_k,
+        "recall": round(float(np.mean(recalls)), 4) if recalls else None,
+        "rating_agreement": round(float(np.mean(ratings)), 4) if ratings else None,
+        "exact_ms": round(exact_ms, 3),
+        "quantized_ms": round(quantized_ms, 3),
+        "float32_bytes": int(exact.data.embeddings.nbytes),
+        "compact_bytes": int(quantized.data.compact.nbytes),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    from deal_evaluator import DealEvaluator
+
+    if len(sys.argv) not in (2, 3, 4):
+        print("Usage: python quantization.py <deal_data.pkl> [int8|float16] [queries]")
+        sys.exit(1)
+    storage_file = sys.argv[1]
+    dtype = sys.argv[2] if len(sys.argv) > 2 else "int8"
+    n_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    exact = DealEvaluator(storage_file=storage_file)
+    quantized = DealEvaluator(storage_file=storage_file, embedding_dtype=dtype)
+    # Stored listings serve as queries; each one's own row is excluded from its matches
+    rows = np.random.default_rng(0).choice(len(exact.data), min(n_queries, len(exact.data)), replace=False)
+    listings = [exact.data[int(row)].get('details') or exact.data[int(row)] for row in rows]
+    print(json.dumps(agreement_report(exact, quantized, listings), indent=2))
@@ -1,7 +1,8 @@
 import requests
-from bs4 import BeautifulSoup
+from html_parsing import make_soup, SEARCH_RESULTS, DETAIL_PAGE
 from urllib.parse import urlencode
 from logger import get_logger
+import metrics
 
 logger = get_logger("scraper")
 
@@ -9,8 +10,29 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; personal-scraper/1.0)"
 }
 
-def fetch_listings(location, category, query, lat=None, lon=None, search_distance=None):
+def _get(url, fetcher=None, client=None, headers=None, page="details"):
+    # A fetcher applies the per-host rate limit; a client reuses pooled connections
+    with metrics.timer("scraper_request_seconds", page=page):
+        if fetcher is not None:
+            res = fetcher.get(url, headers=headers)
+        elif client is not None:
+            res = client.get(url, headers=headers)
+        else:
+            res = requests.get(url, headers={**HEADERS, **(headers or {})}, timeout=10)
+    metrics.inc("scraper_responses_total", page=page, status=res.status_code)
+    return res
+
+def fetch_search_html(location, category, query, lat=None, lon=None, search_distance=None, fetcher=None, client=None,
+                      offset=0, sort=None):
+    """
+    Downloads a search results page and returns its HTML.
+    offset skips that many results (for later pages); sort="date" lists newest first.
+    """
     params = {"query": query}
+    if sort:
+        params["sort"] = sort
+    if offset:
+        params["s"] = offset
     
     if lat and lon and search_distance:
         params.update({
@@ -24,8 +46,9 @@ def fetch_listings(location, category, query, lat=None, lon=None, search_distanc
     logger.info(f"Fetching URL: {url}")
 
     try:
-        res = requests.get(url, headers=HEADERS, timeout=10)
+        res = _get(url, fetcher, client, page="search")
     except Exception as e:
+        metrics.inc("scraper_errors_total", page="search")
         logger.exception("Request failed")
         raise
 
@@ -41,17 +64,31 @@ def fetch_listings(location, category, query, lat=None, lon=None, search_distanc
     if "captcha" in res.text.lower():
         logger.error("CAPTCHA detected in response")
 
-    soup = BeautifulSoup(res.text, "html.parser")
-    rows = soup.select(".cl-static-search-result")
+    return res.text
+
+def save_empty_response(html, location, category, query):
+    # Save raw HTML if parsing fails
+    html_path = f"logs/empty_response_{location}_{category}_{query}.html"
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    logger.error(f"No results parsed — HTML saved to {html_path}")
+
+def fetch_listings(location, category, query, lat=None, lon=None, search_distance=None, fetcher=None, client=None,
+                   offset=0, sort=None):
+    html = fetch_search_html(
+        location, category, query, lat, lon, search_distance, fetcher=fetcher, client=client, offset=offset, sort=sort
+    )
+
+    with metrics.timer("scraper_parse_seconds", page="search"):
+        soup = make_soup(html, SEARCH_RESULTS)
+        rows = soup.select(".cl-static-search-result")
+    metrics.inc("scraper_rows_total", len(rows))
 
     logger.info(f"Found {len(rows)} result rows")
 
-    # Save raw HTML if parsing fails
-    if len(rows) == 0:
-        html_path = f"logs/empty_response_{location}_{category}_{query}.html"
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(res.text)
-        logger.error(f"No results parsed — HTML saved to {html_path}")
+    # Running off the end of the results is expected on later pages
+    if len(rows) == 0 and not offset:
+        save_empty_response(html, location, category, query)
 
     return rows
 
@@ -87,19 +124,118 @@ def parse_listing(row):
         logger.exception("Failed to parse listing row")
         raise
 
-def fetch_details(url):
+def fetch_details(url, fetcher=None, client=None):
     """
     Fetches the detail page for a specific listing.
     """
     logger.info(f"Fetching details: {url}")
     try:
-        res = requests.get(url, headers=HEADERS, timeout=10)
-        res.raise_for_status()
-        return BeautifulSoup(res.text, "html.parser")
+        with metrics.timer("scraper_fetch_details_seconds"):
+            res = _get(url, fetcher, client)
+            res.raise_for_status()
+            with metrics.timer("scraper_parse_seconds", page="details"):
+                return make_soup(res.text, DETAIL_PAGE)
     except Exception:
+        metrics.inc("scraper_errors_total", page="details")
         logger.exception(f"Failed to fetch details for {url}")
         return None
 
+def fetch_details_many(urls, fetcher):
+    """
+    Fetches many detail pages concurrently through the fetcher's rate limits.
+    Returns one soup per url, or None where the fetch failed.
+    """
+    urls = list(urls)
+    logger.info(f"Fetching details for {len(urls)} listings")
+    soups = []
+    with metrics.timer("scraper_fetch_batch_seconds"):
+        responses = fetcher.fetch_many(urls)
+    for url, res in zip(urls, responses):
+        try:
+            if isinstance(res, Exception):
+                raise res
+            res.raise_for_status()
+            with metrics.timer("scraper_parse_seconds", page="details"):
+                soups.append(make_soup(res.text, DETAIL_PAGE))
+        except Exception as e:
+            metrics.inc("scraper_errors_total", page="details")
+            logger.error(f"Failed to fetch details for {url}: {e}")
+            soups.append(None)
+    return soups
+
+def _parse_response(res):
+    with metrics.timer("scraper_parse_seconds", page="details"):
+        return parse_details(make_soup(res.text, DETAIL_PAGE))
+
+def fetch_parsed_details(url, fetcher=None, client=None, cache=None):
+    """
+    Fetches and parses the detail page for a listing.
+    With a DetailCache, sends a conditional request and reuses the cached
+    parse_details output when the page has not changed.
+    """
+    if cache is None:
+        return parse_details(fetch_details(url, fetcher, client))
+
+    logger.info(f"Fetching details: {url}")
+    entry = cache.lookup(url)
+    try:
+        with metrics.timer("scraper_fetch_details_seconds"):
+            res = _get(url, fetcher, client, headers=cache.conditional_headers(entry))
+            return cache.resolve(url, res, entry, _parse_response)
+    except Exception:
+        metrics.inc("scraper_errors_total", page="details")
+        logger.exception(f"Failed to fetch details for {url}")
+        return {}
+
+def fetch_parsed_details_many(urls, fetcher, cache=None, pool=None):
+    """
+    fetch_parsed_details for many urls at once, fetched concurrently through the fetcher.
+    With a ParsePool, pages that need parsing are parsed in worker processes.
+    Returns one details dict per url ({} where the fetch failed).
+    """
+    urls = list(urls)
+    logger.info(f"Fetching details for {len(urls)} listings")
+    entries = [cache.lookup(url) for url in urls] if cache is not None else [None] * len(urls)
+    headers = [cache.conditional_headers(entry) for entry in entries] if cache is not None else None
+    with metrics.timer("scraper_fetch_batch_seconds"):
+        responses = fetcher.fetch_many(urls, headers)
+
+    results = [{} for _ in urls]
+    to_parse = []
+    for i, (url, entry, res) in enumerate(zip(urls, entries, responses)):
+        try:
+            if isinstance(res, Exception):
+                raise res
+            if cache is not None:
+                details = cache.reuse(url, res, entry)
+                if details is not None:
+                    results[i] = details
+                    continue
+            res.raise_for_status()
+            to_parse.append((i, res))
+        except Exception as e:
+            metrics.inc("scraper_errors_total", page="details")
+            logger.error(f"Failed to fetch details for {url}: {e}")
+
+    if pool is not None:
+        parsed = pool.parse_details_many([res.text for _, res in to_parse])
+    else:
+        parsed = [_parse_or_empty(urls[i], res) for i, res in to_parse]
+    for (i, res), details in zip(to_parse, parsed):
+        results[i] = details
+        if cache is not None:
+            cache.record(urls[i], res, details)
+    return results
+
+def _parse_or_empty(url, res):
+    # Like parse_pool.parse_detail_pages: one malformed page yields {} instead of failing the batch
+    try:
+        return _parse_response(res)
+    except Exception as e:
+        metrics.inc("scraper_errors_total", page="details")
+        logger.warning(f"Failed to parse detail page {url}: {e}")
+        return {}
+
 def parse_details(soup):
     """
     Parses the detail page to extract description, attributes, etc.
@@ -1,5 +1,12 @@
 import json
+import sqlite3
+import threading
+import time
 from pathlib import Path
+from logger import get_logger
+import metrics
+
+logger = get_logger("state")
 
 STATE_FILE = Path("state.json")
 
@@ -21,3 +28,192 @@ def load_seen():
 def save_seen(seen):
     # seen is expected to be a dict {link: price}
     STATE_FILE.write_text(json.dumps({"seen": seen}, indent=2))
+
+
+SEEN_DB = Path("state.sqlite")
+
+# Returned by SeenStore.get for links that were never seen (a seen link may have price None)
+MISSING = object()
+
+
+class SeenStore:
+    """
+    SQLite-backed seen-listing state with link, price, first_seen and last_seen.
+
+    Writes are buffered and upserted in batches of batch_size (and on flush/close), so a
+    crash loses at most one batch instead of the whole run. Reads go through a small
+    cache that prefetch() fills with one query per results page.
+    """
+
+    def __init__(self, path=None, batch_size=100):
+        self.path = Path(path or SEEN_DB)
+        self.batch_size = batch_size
+        self._cache = {}
+        self._pending = {}
+        self._touched = set()
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            "link TEXT PRIMARY KEY, price INTEGER, first_seen REAL NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS seen_last_seen ON seen(last_seen)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS marks (key TEXT PRIMARY KEY, posting_id INTEGER NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._migrate_json()
+
+    def _migrate_json(self):
+        """
+        Imports the legacy state.json once, in either its list or dict format.
+        """
+        if self._conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+            return
+        if STATE_FILE.exists():
+            legacy = load_seen()
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen (link, price, first_seen, last_seen) VALUES (?, ?, ?, ?)",
+                [(link, price, now, now) for link, price in legacy.items()],
+            )
+            logger.info(f"Migrated {len(legacy)} seen listings from {STATE_FILE} to {self.path}")
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)", (str(time.time()),))
+        self._conn.commit()
+
+    def prefetch(self, links):
+        """
+        Loads the state of a page of links with one query.
+        """
+        links = [link for link in links if link not in self._cache]
+        if not links:
+            return
+        found = {}
+        with self._lock, metrics.timer("state_prefetch_seconds"):
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(links), 500):
+                chunk = links[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT link, price FROM seen WHERE link IN ({placeholders})", chunk
+                ).fetchall())
+            for link in links:
+                self._cache.setdefault(link, found.get(link, MISSING))
+        metrics.inc("state_lookups_total", len(found), result="seen")
+        metrics.inc("state_lookups_total", len(links) - len(found), result="new")
+
+    def get(self, link, default=MISSING):
+        if link not in self._cache:
+            self.prefetch([link])
+        value = self._cache[link]
+        return default if value is MISSING else value
+
+    def __contains__(self, link):
+        return self.get(link) is not MISSING
+
+    def __getitem__(self, link):
+        value = self.get(link)
+        if value is MISSING:
+            raise KeyError(link)
+        return value
+
+    def __setitem__(self, link, price):
+        """
+        Records a new or changed price; written on the next batch flush.
+        """
+        with self._lock:
+            self._cache[link] = price
+            self._pending[link] = price
+            self._touched.discard(link)
+            full = len(self._pending) + len(self._touched) >= self.batch_size
+        if full:
+            self.flush()
+
+    def touch(self, link):
+        """
+        Marks an unchanged link as seen in this run so it isn't expired.
+        """
+        with self._lock:
+            if link not in self._pending:
+                self._touched.add(link)
+            full = len(self._pending) + len(self._touched) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+            started = time.perf_counter()
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO seen (link, price, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(link) DO UPDATE SET price = excluded.price, last_seen = excluded.last_seen",
+                [(link, price, now, now) for link, price in self._pending.items()],
+            )
+            self._conn.executemany(
+                "UPDATE seen SET last_seen = ? WHERE link = ?",
+                [(now, link) for link in self._touched],
+            )
+            self._conn.commit()
+            metrics.observe("state_flush_seconds", time.perf_counter() - started)
+            metrics.inc("state_rows_written_total", len(self._pending) + len(self._touched))
+            self._pending.clear()
+            self._touched.clear()
+
+    def high_water(self, key):
+        """
+        Newest posting id recorded for a crawl key (see crawler.crawl_key), or None.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT posting_id FROM marks WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_high_water(self, key, posting_id):
+        """
+        Raises the high-water mark for a crawl key; it never moves backwards.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO marks (key, posting_id, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET posting_id = MAX(posting_id, excluded.posting_id), updated = excluded.updated",
+                (key, posting_id, time.time()),
+            )
+            self._conn.commit()
+
+    def clear_cache(self):
+        """
+        Writes pending updates and drops cached lookups, so a long-running process
+        doesn't keep every link it has ever looked up in memory.
+        """
+        self.flush()
+        with self._lock:
+            self._cache.clear()
+
+    def expire(self, ttl_days):
+        """
+        Deletes listings not seen in the last ttl_days. Returns the number removed.
+        """
+        self.flush()
+        cutoff = time.time() - ttl_days * 86400
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM seen WHERE last_seen < ?", (cutoff,)).rowcount
+            self._conn.commit()
+            self._cache.clear()
+        if removed:
+            logger.info(f"Expired {removed} listings not seen in {ttl_days} days")
+        return removed
+
+    def __len__(self):
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -1,5 +1,60 @@
 import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+import pytest
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(PROJECT_ROOT))
+
+
+@pytest.fixture
+def local_server():
+    """
+    Starts a stand-in HTTP server on localhost. Tests register responses with
+    server.routes[path] = (status, headers, body) and read server.requests afterwards.
+    body may be a callable(handler, request_body) returning the body, or a full
+    (status, headers, body) tuple to vary the response per request.
+    """
+    routes = {}
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so connection reuse can be observed
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self, body_in=None):
+            requests_seen.append((self.command, self.path, dict(self.headers), body_in))
+            status, headers, body = routes.get(self.path.split("?")[0], (404, {}, b"not found"))
+            if callable(body):
+                body = body(self, body_in)
+                if isinstance(body, tuple):
+                    status, headers, body = body
+            if isinstance(body, str):
+                body = body.encode("utf-8")
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._respond()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self._respond(self.rfile.read(length))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.routes = routes
+    server.requests = requests_seen
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,42 @@
+import numpy as np
+from ann_index import IVFIndex, recall_report
+from deal_store import DealStore, normalize_rows
+
+
+def clustered_vectors(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return normalize_rows(centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim)))
+
+
+def test_full_probe_is_exact(tmp_path):
+    vectors = clustered_vectors(500)
+    index = IVFIndex.build(tmp_path / "ivf", vectors, n_lists=10)
+
+    rows, scores = index.search(vectors[:1], vectors, n_probe=10)[0]
+    assert np.array_equal(rows, np.arange(500))
+    assert np.allclose(scores, vectors @ vectors[0])
+
+
+def test_incremental_inserts_survive_reopen(tmp_path):
+    vectors = clustered_vectors(300)
+    index = IVFIndex.build(tmp_path / "ivf", vectors[:200], n_lists=8)
+    index.add(vectors[200:])
+    index.close()
+
+    reopened = IVFIndex(tmp_path / "ivf")
+    assert reopened.count == 300
+    rows, _ = reopened.search(vectors[250:251], vectors, n_probe=8)[0]
+    assert 250 in rows
+
+
+def test_recall_report(tmp_path):
+    store = DealStore(tmp_path / "store")
+    vectors = clustered_vectors(2000)
+    store.extend([{"link": str(i)} for i in range(len(vectors))], vectors)
+    index = IVFIndex.build(tmp_path / "ivf", store.embeddings, n_lists=16)
+
+    report = recall_report(store, index, n_queries=50, n_probe_values=(1, 4, 16))
+    recalls = [report["n_probe"][n]["recall"] for n in (1, 4, 16)]
+    assert recalls == sorted(recalls)
+    assert recalls[-1] == 1.0
@@ -0,0 +1,23 @@
+import random
+import sys
+from conftest import PROJECT_ROOT
+
+sys.path.insert(0, str(PROJECT_ROOT / "benchmarks"))
+
+from html_parsing import DETAIL_PAGE, SEARCH_RESULTS, make_soup
+from scraper import parse_details, parse_listing
+from synthetic import detail_page, make_listing, search_page
+
+
+def test_synthetic_search_page_matches_scraper_selectors():
+    rng = random.Random(0)
+    listings = [make_listing(rng, n) for n in range(20)]
+    rows = make_soup(search_page(listings), SEARCH_RESULTS).select(".cl-static-search-result")
+    assert [parse_listing(row) for row in rows] == listings
+
+
+def test_synthetic_detail_page_matches_scraper_selectors():
+    details = parse_details(make_soup(detail_page(random.Random(0), 7, attributes=6, images=8), DETAIL_PAGE))
+    assert "QR Code" not in details["description"]
+    assert len(details["attributes"]) == 6
+    assert len(details["images"]) == 8
@@ -0,0 +1,74 @@
+from crawler import crawl, crawl_key, posting_id
+from state import SeenStore
+
+
+def _pages(ids, page_size):
+    """
+    A newest-first listing of posting ids served page_size at a time; records requested offsets.
+    """
+    requested = []
+
+    def fetch_page(offset):
+        requested.append(offset)
+        return [{"link": f"https://ames.craigslist.org/sys/d/item/{pid}.html"} for pid in ids[offset:offset + page_size]]
+
+    return fetch_page, requested
+
+
+def _link(item):
+    return item["link"]
+
+
+def test_posting_id_and_key():
+    assert posting_id("https://ames.craigslist.org/sys/d/gaming-monitor/7712345678.html") == 7712345678
+    assert posting_id("https://example.com/no-id") is None
+    assert crawl_key({"query": "ipad", "lat": None, "location": "ames"}) == "search:location=ames&query=ipad"
+    assert crawl_key({"query": ""}, namespace="dataset") == "dataset:"
+
+
+def test_stops_at_the_page_that_reaches_the_high_water_mark():
+    ids = list(range(1000, 900, -1))
+    fetch_page, requested = _pages(ids, 10)
+    results, newest = crawl(fetch_page, high_water=985, max_pages=10, page_size=10, link=_link)
+    # Page two holds 985, so page three is never requested
+    assert requested == [0, 10]
+    assert len(results) == 20
+    assert newest == 1000
+
+
+def test_backfill_walks_max_pages_and_stops_on_a_short_page():
+    fetch_page, requested = _pages(list(range(1000, 975, -1)), 10)
+    results, newest = crawl(fetch_page, max_pages=10, page_size=10, link=_link)
+    assert requested == [0, 10, 20]
+    assert len(results) == 25 and newest == 1000
+
+    fetch_page, requested = _pages(list(range(1000, 900, -1)), 10)
+    results, _ = crawl(fetch_page, max_pages=2, page_size=10, link=_link)
+    assert requested == [0, 10] and len(results) == 20
+
+
+def test_rows_shifted_onto_the_next_page_are_not_repeated():
+    ids = list(range(1000, 980, -1))
+    # A new posting arrived between requests, pushing 991 onto the second page as well
+    pages = {0: ids[:10], 10: [991] + ids[10:19]}
+
+    def fetch_page(offset):
+        return [{"link": f"/item/{pid}.html"} for pid in pages[offset]]
+
+    results, _ = crawl(fetch_page, max_pages=2, page_size=10, link=_link)
+    links = [item["link"] for item in results]
+    assert len(links) == len(set(links)) == 19
+
+
+def test_high_water_marks_persist_and_never_move_back(tmp_path, monkeypatch):
+    monkeypatch.setattr("state.STATE_FILE", tmp_path / "state.json")
+    store = SeenStore(tmp_path / "state.sqlite")
+    assert store.high_water("search:query=ipad") is None
+    store.set_high_water("search:query=ipad", 7700000010)
+    store.set_high_water("search:query=ipad", 7700000005)
+    store.close()
+
+    reopened = SeenStore(tmp_path / "state.sqlite")
+    assert reopened.high_water("search:query=ipad") == 7700000010
+    assert reopened.high_water("dataset:query=") is None
+    reopened.close()
@@ -0,0 +1,81 @@
+import os
+import random
+import yaml
+from daemon import Daemon, SearchSchedule
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeScanner:
+    def __init__(self, config):
+        self.config = config
+        self.runs = []
+
+    def configure(self, config):
+        self.config = config
+
+    def run(self, searches):
+        self.runs.append(sorted(search["name"] for search in searches))
+        return {search["name"]: 0 for search in searches}
+
+
+def _write_config(path, searches, interval=100, mtime=None):
+    path.write_text(yaml.safe_dump({"daemon": {"interval": interval, "jitter": 0}, "searches": searches}))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _make_daemon(tmp_path, searches):
+    path = tmp_path / "inputs.yaml"
+    _write_config(path, searches, mtime=1000)
+    with open(path) as f:
+        scanner = FakeScanner(yaml.safe_load(f))
+    clock = FakeClock()
+    return Daemon(str(path), scanner, clock=clock), scanner, clock, path
+
+
+def test_searches_run_on_their_own_intervals(tmp_path):
+    daemon, scanner, clock, _ = _make_daemon(tmp_path, [{"name": "fast"}, {"name": "slow", "interval": 250}])
+
+    for now in (0, 50, 100, 200, 250, 300):
+        clock.now = now
+        daemon.poll()
+
+    assert scanner.runs == [["fast", "slow"], ["fast"], ["fast"], ["slow"], ["fast"]]
+
+
+def test_jitter_stays_within_bounds():
+    schedule = SearchSchedule(interval=100, jitter=0.2, rng=random.Random(1))
+    search = {"name": "a"}
+    for _ in range(50):
+        schedule.reschedule([search], 0)
+        assert 80 <= schedule.next_run["a"] <= 120
+
+
+def test_config_is_reloaded_when_file_changes(tmp_path):
+    daemon, scanner, clock, path = _make_daemon(tmp_path, [{"name": "a"}])
+    daemon.poll()
+    assert not daemon.reload_if_changed()
+
+    _write_config(path, [{"name": "a"}, {"name": "b"}], mtime=2000)
+    assert daemon.reload_if_changed()
+    assert [search["name"] for search in scanner.config["searches"]] == ["a", "b"]
+
+    # The new search is due immediately, the existing one keeps its schedule
+    daemon.poll()
+    assert scanner.runs == [["a"], ["b"]]
+
+
+def test_invalid_config_keeps_previous_one(tmp_path):
+    daemon, scanner, clock, path = _make_daemon(tmp_path, [{"name": "a"}])
+    path.write_text("not: [valid")
+    os.utime(path, (3000, 3000))
+
+    assert not daemon.reload_if_changed()
+    assert scanner.config["searches"] == [{"name": "a"}]
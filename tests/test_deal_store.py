@@ -0,0 +1,142 @@
+import joblib
+import pytest
+import numpy as np
+from deal_store import DealStore, migrate_pickle, INDEX_FILE, PRICES_FILE, RECORDS_FILE, TITLES_FILE
+
+
+def test_store_round_trip(tmp_path):
+    store = DealStore(tmp_path / "store")
+    store.extend(
+        [{"link": "a", "title": "monitor", "price": np.int64(100)}, {"link": "b", "title": "ipad", "price": None}],
+        np.eye(2, 3, dtype=np.float32),
+    )
+    store.close()
+
+    reopened = DealStore(tmp_path / "store")
+    assert len(reopened) == 2
+    assert reopened[1] == {"link": "b", "title": "ipad", "price": None}
+    assert reopened[0]["price"] == 100
+    assert reopened.row_for("b") == 1
+    assert "c" not in reopened
+    assert np.array_equal(reopened.embeddings, np.eye(2, 3, dtype=np.float32))
+
+
+def test_uncommitted_tail_is_truncated(tmp_path):
+    store = DealStore(tmp_path / "store")
+    store.extend([{"link": "a"}], np.ones((1, 3)))
+    store.close()
+
+    # Simulate a crash after the record was written but before the offsets were committed
+    with open(tmp_path / "store" / RECORDS_FILE, "ab") as f:
+        f.write(b'{"link": "partial"')
+
+    reopened = DealStore(tmp_path / "store")
+    reopened.extend([{"link": "b"}], np.ones((1, 3)))
+    assert [r["link"] for r in reopened] == ["a", "b"]
+    assert reopened.links() == ["a", "b"]
+
+
+def test_torn_index_tail_is_truncated(tmp_path):
+    store = DealStore(tmp_path / "store")
+    store.extend([{"link": "a", "title": "monitor", "price": 100}], np.ones((1, 3)))
+    store.close()
+
+    # A crash halfway through writing the next row's offsets, and its columns
+    for name in (INDEX_FILE, PRICES_FILE):
+        with open(tmp_path / "store" / name, "ab") as f:
+            f.write(b"\x01" * 11)
+
+    reopened = DealStore(tmp_path / "store")
+    assert len(reopened) == 1
+    reopened.extend([{"link": "b", "title": "ipad", "price": 200}], np.ones((1, 3)))
+    reopened.close()
+    assert [(r["link"], r["price"]) for r in DealStore(tmp_path / "store")] == [("a", 100), ("b", 200)]
+
+
+def test_rejected_batch_leaves_no_partial_rows(tmp_path):
+    store = DealStore(tmp_path / "store")
+    store.extend([{"link": "a", "title": "monitor", "price": 100}], np.ones((1, 3)))
+    with pytest.raises(TypeError):
+        store.extend([{"link": "b", "title": "ipad", "price": 1}, {"link": "c", "seller": object()}], np.ones((2, 3)))
+    store.extend([{"link": "d", "title": "laptop", "price": 400}], np.ones((1, 3)))
+    store.close()
+
+    reopened = DealStore(tmp_path / "store")
+    assert [(r["link"], r["title"], r["price"]) for r in reopened] == [("a", "monitor", 100), ("d", "laptop", 400)]
+
+
+def test_migrate_legacy_pickle(tmp_path):
+    legacy = [
+        {"link": "a", "title": "monitor", "price": 100, "embedding": np.array([3.0, 4.0]), "details": {"price": 100}},
+        {"link": "a", "title": "dupe", "price": 1, "embedding": np.array([1.0, 0.0]), "details": {}},
+        {"link": "b", "title": "ipad", "price": 50, "embedding": np.array([0.0, 2.0]), "details": {"price": 50}},
+    ]
+    joblib.dump(legacy, tmp_path / "deal_data.pkl")
+
+    assert migrate_pickle(tmp_path / "deal_data.pkl", tmp_path / "deal_data.store") == 2
+
+    store = DealStore(tmp_path / "deal_data.store")
+    assert store.links() == ["a", "b"]
+    assert store[0]["details"] == {"price": 100}
+    assert np.allclose(store.embeddings, [[0.6, 0.8], [0.0, 1.0]])
+
+
+def test_columns_hold_link_title_and_price(tmp_path):
+    store = DealStore(tmp_path / "store")
+    listing = {"link": "a", "title": "monitor", "price": 100, "description": "x" * 500, "images": ["i1", "i2"]}
+    entries = [
+        {"link": "a", "title": "monitor", "price": 100, "details": listing},
+        {"link": "b", "title": "monitor", "price": 19.5, "details": {"title": "other"}},
+        {"link": "c", "price": "call"},
+    ]
+    store.extend(entries, np.ones((3, 2)))
+    store.close()
+
+    reopened = DealStore(tmp_path / "store")
+    assert [reopened[row] for row in range(3)] == entries
+    assert reopened.price(0) == 100 and isinstance(reopened.price(0), int)
+    assert reopened.price(2) is None and reopened.title(2) is None
+    assert np.isnan(reopened.prices[2]) and reopened.prices[1] == 19.5
+    assert [reopened.link(row) for row in range(3)] == ["a", "b", "c"]
+
+    # Repeated titles are interned and details do not repeat the columns
+    assert (tmp_path / "store" / TITLES_FILE).read_bytes() == b"monitor"
+    first_record = (tmp_path / "store" / RECORDS_FILE).read_text().splitlines()[0]
+    assert "monitor" not in first_record and "x" * 500 in first_record
+
+
+def test_legacy_records_get_columns_on_open(tmp_path):
+    store = DealStore(tmp_path / "store")
+    store.extend([{"link": "a", "title": "monitor", "price": 100, "details": {"price": 100}}], np.ones((1, 2)))
+    store.close()
+    # Rewrite as a store from before the columnar layout: full JSON records, no column files
+    path = tmp_path / "store"
+    (path / RECORDS_FILE).write_text('{"link": "a", "title": "monitor", "price": 100, "details": {"price": 100}}\n')
+    length = (path / RECORDS_FILE).stat().st_size
+    np.array([[length, 2]], dtype=np.uint64).tofile(path / "records.idx")
+    for name in ("prices.f64", "flags.u8", "title_ids.i32", TITLES_FILE, "titles.idx"):
+        (path / name).unlink()
+    (path / "meta.json").write_text('{"dim": 2}')
+
+    upgraded = DealStore(path)
+    assert upgraded[0] == {"link": "a", "title": "monitor", "price": 100, "details": {"price": 100}}
+    assert upgraded.price(0) == 100 and upgraded.title(0) == "monitor"
+    upgraded.extend([{"link": "b", "title": "ipad", "price": 50}], np.ones((1, 2)))
+    upgraded.close()
+
+    reopened = DealStore(path)
+    assert [entry["link"] for entry in reopened] == ["a", "b"]
+    assert reopened.prices.tolist() == [100.0, 50.0]
+
+
+def test_uncommitted_column_values_are_dropped(tmp_path):
+    store = DealStore(tmp_path / "store")
+    store.extend([{"link": "a", "title": "monitor", "price": 1}], np.ones((1, 2)))
+    store.close()
+    with open(tmp_path / "store" / "prices.f64", "ab") as f:
+        f.write(np.array([99.0]).tobytes())
+
+    reopened = DealStore(tmp_path / "store")
+    reopened.extend([{"link": "b", "title": "ipad", "price": 2}], np.ones((1, 2)))
+    assert reopened.prices.tolist() == [1.0, 2.0]
+    assert reopened[1]["title"] == "ipad"
@@ -0,0 +1,29 @@
+import numpy as np
+from embedding_cache import EmbeddingCache
+
+
+def test_reposts_hit_the_cache(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", "model-a")
+    cache.put_many(["Gaming  Monitor 27\""], [np.array([1.0, 2.0])])
+
+    vectors = cache.get_many(["gaming monitor 27\"", "ipad"])
+    assert np.array_equal(vectors[0], np.array([1.0, 2.0], dtype=np.float32))
+    assert vectors[1] is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+    # A different model never shares entries
+    other = EmbeddingCache(tmp_path / "cache.sqlite", "model-b")
+    assert other.get_many(["gaming monitor 27\""]) == [None]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite", "model", max_entries=2)
+    cache.put_many(["a"], [np.zeros(2)])
+    cache.put_many(["b"], [np.zeros(2)])
+    cache.get_many(["a"])
+    cache.put_many(["c"], [np.zeros(2)])
+    cache.close()
+
+    reopened = EmbeddingCache(tmp_path / "cache.sqlite", "model", max_entries=2)
+    found = reopened.get_many(["a", "b", "c"])
+    assert [vector is not None for vector in found] == [True, False, True]
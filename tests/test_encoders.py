@@ -0,0 +1,70 @@
+import json
+import pytest
+import deal_evaluator
+from deal_evaluator import DealEvaluator
+from deal_store import normalize_rows
+from encoders import HashingEncoder, ONNXEncoder, encoder_id
+from test_evaluator_index import FakeModel
+
+
+def test_hashing_encoder_is_deterministic_and_matches_shared_wording():
+    encoder = HashingEncoder(dim=256)
+    a, b, c = normalize_rows(encoder.encode(["Gaming monitor 27in 144Hz", "27 inch gaming monitors", "ipad air 64gb"]))
+    assert encoder.encode("Gaming monitor 27in 144Hz").tolist() == encoder.encode(["Gaming monitor 27in 144Hz"])[0].tolist()
+    assert a @ b > 0.3 > a @ c
+
+
+def test_hashing_backend_needs_no_model_and_is_recorded(tmp_path, monkeypatch):
+    # A sentence-transformers load would fail the test
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", None)
+    monkeypatch.setattr(deal_evaluator, "_sentence_transformer_class", lambda: pytest.fail("loaded sentence-transformers"))
+    storage_file = tmp_path / "deal_data.pkl"
+    evaluator = DealEvaluator(storage_file=storage_file, encoder="hashing", encoder_options={"dim": 128})
+    evaluator.add_listings([
+        {"title": "gaming monitor 27 inch", "price": 200, "link": "a"},
+        {"title": "gaming monitor 27 inch 144hz", "price": 220, "link": "b"},
+        {"title": "ipad air", "price": 350, "link": "c"},
+    ])
+    rating, stats = evaluator.evaluate_deal({"title": "27 inch gaming monitor", "price": 100, "link": "d"})
+    assert rating == "Incredible Deal" and stats["sample_size"] == 2
+    assert evaluator.data.encoder == "hashing-128"
+    assert evaluator.data.embeddings.shape == (3, 128)
+    evaluator.data.close()
+
+    with pytest.raises(ValueError, match="hashing-128"):
+        DealEvaluator(storage_file=storage_file, encoder="hashing", encoder_options={"dim": 256})
+
+
+def test_stores_from_before_encoders_keep_sentence_transformers(tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", FakeModel)
+    evaluator = DealEvaluator(storage_file=tmp_path / "deal_data.pkl")
+    evaluator.add_listing({"title": "macbook", "price": 900, "link": "a"})
+    evaluator.data.close()
+    meta_file = evaluator.store_path / "meta.json"
+    meta_file.write_text(json.dumps({k: v for k, v in json.loads(meta_file.read_text()).items() if k != "encoder"}))
+
+    with pytest.raises(ValueError, match="all-MiniLM-L6-v2"):
+        DealEvaluator(storage_file=tmp_path / "deal_data.pkl", encoder="hashing")
+    # Another sentence-transformers model would silently mix vector spaces
+    with pytest.raises(ValueError, match="all-MiniLM-L6-v2"):
+        DealEvaluator(storage_file=tmp_path / "deal_data.pkl", model_name="all-mpnet-base-v2")
+    assert DealEvaluator(storage_file=tmp_path / "deal_data.pkl").data.encoder == "all-MiniLM-L6-v2"
+
+
+def test_onnx_backend_is_identified_by_model_file(tmp_path):
+    model = tmp_path / "minilm" / "model_qint8.onnx"
+    model.parent.mkdir()
+    model.write_bytes(b"weights v1")
+    first = encoder_id("onnx", None, {"model_path": str(model)})
+    assert first.startswith("onnx:minilm/model_qint8.onnx@")
+    assert encoder_id("onnx", None, {"model_path": str(model)}) == first
+    # A re-exported model under the same name is a different vector space
+    model.write_bytes(b"weights v2")
+    assert encoder_id("onnx", None, {"model_path": str(model)}) != first
+    with pytest.raises(FileNotFoundError):
+        encoder_id("onnx", None, {"model_path": str(tmp_path / "missing.onnx")})
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        with pytest.raises(ImportError, match="onnxruntime"):
+            ONNXEncoder(tmp_path / "model.onnx")
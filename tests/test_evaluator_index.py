@@ -0,0 +1,205 @@
+import zlib
+import joblib
+import numpy as np
+import pytest
+import deal_evaluator
+import deal_store
+from deal_evaluator import DealEvaluator
+
+
+class FakeModel:
+    """
+    Deterministic bag-of-words encoder so the index can be tested without downloading a model.
+    """
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+
+    def encode(self, text, **kwargs):
+        texts = [text] if isinstance(text, str) else list(text)
+        self.calls.append(len(texts))
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, t in enumerate(texts):
+            for word in t.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % 64] += 1.0
+        return vectors[0] if isinstance(text, str) else vectors
+
+
+@pytest.fixture
+def evaluator(tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", FakeModel)
+    return DealEvaluator(storage_file=tmp_path / "deal_data.pkl")
+
+
+def brute_force(evaluator, listing, top_k=5, threshold=0.4):
+    query = evaluator.model.encode(evaluator._get_text_representation(listing))
+    query = query / np.linalg.norm(query)
+    results = []
+    for item in evaluator.data:
+        stored = evaluator.model.encode(evaluator._get_text_representation(item['details']))
+        score = float(stored @ query / np.linalg.norm(stored))
+        if score >= threshold and item['link'] != listing.get('link'):
+            results.append((score, item['link']))
+    results.sort(key=lambda r: r[0], reverse=True)
+    return results[:top_k]
+
+
+def test_duplicate_links_are_skipped(evaluator):
+    evaluator.add_listing({"title": "gaming monitor", "price": 100, "link": "a"})
+    evaluator.add_listing({"title": "gaming monitor again", "price": 120, "link": "a"})
+    assert len(evaluator.data) == 1
+
+
+def test_matrix_grows_and_matches_brute_force(evaluator, monkeypatch):
+    monkeypatch.setattr(deal_store, "INITIAL_CAPACITY", 4)
+    words = ["monitor", "gaming", "144hz", "laptop", "apple", "dell", "ipad", "cracked"]
+    rng = np.random.default_rng(0)
+    for i in range(20):
+        title = " ".join(rng.choice(words, size=3))
+        evaluator.add_listing({"title": title, "price": 100 + i, "link": f"link{i}"})
+
+    assert evaluator.data.embeddings.shape[0] == 20
+
+    query = {"title": "gaming monitor 144hz", "price": 90, "link": "link3"}
+    results = evaluator.find_similar_listings(query, top_k=5, threshold=0.2)
+    expected = brute_force(evaluator, query, top_k=5, threshold=0.2)
+
+    assert [round(float(score), 5) for score, _ in results] == [round(score, 5) for score, _ in expected]
+    assert all(item['link'] != "link3" for _, item in results)
+
+
+def test_reload_rebuilds_index(evaluator, tmp_path):
+    evaluator.add_listing({"title": "macbook pro", "price": 900, "link": "a"})
+    evaluator.add_listing({"title": "macbook air", "price": 700, "link": "b"})
+    evaluator.data.close()
+
+    reloaded = DealEvaluator(storage_file=tmp_path / "deal_data.pkl")
+    assert reloaded.data.row_for("a") == 0
+    assert reloaded.data.row_for("b") == 1
+    assert len(reloaded.find_similar_listings({"title": "macbook", "link": "c"})) == 2
+
+
+def test_add_listings_encodes_in_batches(evaluator):
+    listings = ({"title": f"monitor {i}", "price": i, "link": f"link{i}"} for i in range(10))
+    duplicates = [{"title": "monitor 0", "price": 0, "link": "link0"}, {"title": "no link"}]
+
+    assert evaluator.add_listings(list(listings) + duplicates, batch_size=4) == 10
+    assert evaluator.model.calls == [4, 4, 2]
+    assert evaluator.data.links() == [f"link{i}" for i in range(10)]
+
+
+def test_failed_batch_skips_only_the_bad_listing(evaluator, monkeypatch):
+    encode = evaluator.model.encode
+
+    def fragile_encode(text, **kwargs):
+        texts = [text] if isinstance(text, str) else list(text)
+        if any("poison" in t for t in texts):
+            raise RuntimeError("encoder failed")
+        return encode(text, **kwargs)
+
+    monkeypatch.setattr(evaluator.model, "encode", fragile_encode)
+    listings = [{"title": f"monitor {i}", "price": i, "link": f"link{i}"} for i in range(6)]
+    listings[2]["title"] = "poison monitor"
+
+    listings.append({"title": "monitor 6", "price": 6, "link": "link6", "seller": object()})
+
+    assert evaluator.add_listings(listings, batch_size=4) == 5
+    assert evaluator.data.links() == ["link0", "link1", "link3", "link4", "link5"]
+
+
+def test_model_load_failure_is_raised_once(tmp_path, monkeypatch):
+    loads = []
+
+    class Unavailable:
+        def __init__(self, *args, **kwargs):
+            loads.append(args)
+            raise OSError("couldn't connect to huggingface.co")
+
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", Unavailable)
+    evaluator = DealEvaluator(storage_file=tmp_path / "deal_data.pkl")
+    listings = [{"title": f"monitor {i}", "price": i, "link": f"link{i}"} for i in range(4)]
+    with pytest.raises(OSError):
+        evaluator.add_listings(listings)
+    assert len(loads) == 1
+    assert len(evaluator.data) == 0
+
+
+def test_failed_migration_is_raised_and_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", FakeModel)
+    # A legacy row without an embedding cannot be migrated
+    joblib.dump([{"link": "a", "title": "monitor", "price": 100}], tmp_path / "deal_data.pkl")
+    with pytest.raises(KeyError):
+        DealEvaluator(storage_file=tmp_path / "deal_data.pkl")
+    assert not (tmp_path / "deal_data.store").exists()
+    assert not (tmp_path / "deal_data.store.tmp").exists()
+
+    joblib.dump([{"link": "a", "title": "monitor", "price": 100, "embedding": np.ones(64)}], tmp_path / "deal_data.pkl")
+    assert DealEvaluator(storage_file=tmp_path / "deal_data.pkl").data.links() == ["a"]
+
+
+def test_evaluate_deals_matches_evaluate_deal(evaluator, monkeypatch):
+    # Force one query per similarity chunk to exercise chunking
+    monkeypatch.setattr(deal_evaluator, "SIMILARITY_CHUNK_ELEMENTS", 4)
+    evaluator.add_listings([
+        {"title": "macbook pro m1", "price": 900, "link": "a"},
+        {"title": "macbook pro 2020", "price": 950, "link": "b"},
+        {"title": "macbook pro", "price": 850, "link": "c"},
+        {"title": "dell laptop", "price": 200, "link": "d"},
+    ])
+    queries = [
+        {"title": "macbook pro m1 2020", "price": 600, "link": "x"},
+        {"title": "dell laptop", "price": 250, "link": "d"},
+        {"title": "macbook pro", "price": None, "link": "y"},
+        {"title": "ipad", "price": 100, "link": "z"},
+    ]
+
+    assert evaluator.evaluate_deals(queries) == [evaluator.evaluate_deal(q) for q in queries]
+    assert evaluator.evaluate_deals(queries)[0][0] == "Incredible Deal"
+
+
+def test_reposts_skip_the_model(evaluator):
+    evaluator.add_listing({"title": "gaming monitor", "price": 100, "link": "a"})
+    evaluator.add_listing({"title": "Gaming  Monitor", "price": 90, "link": "b"})
+    evaluator.find_similar_listings({"title": "gaming monitor", "link": "c"})
+
+    assert evaluator.model.calls == [1]
+    assert evaluator.embedding_cache.stats()["hits"] == 2
+
+
+def test_ann_search_agrees_with_exact(tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", FakeModel)
+    words = ["monitor", "gaming", "144hz", "laptop", "apple", "dell", "ipad", "cracked", "27", "hdmi"]
+    rng = np.random.default_rng(1)
+    listings = [{"title": " ".join(rng.choice(words, size=4)), "price": i, "link": f"link{i}"} for i in range(300)]
+
+    exact = DealEvaluator(storage_file=tmp_path / "exact.pkl", ann_threshold=None)
+    exact.add_listings(listings)
+    # Probing every list makes the approximate path exhaustive
+    approx = DealEvaluator(storage_file=tmp_path / "approx.pkl", ann_threshold=100, ann_probe=1000)
+    approx.add_listings(listings, batch_size=64)
+    assert approx.ann is not None and approx.ann.count == 300
+
+    query = {"title": "gaming monitor 27 hdmi", "price": 50, "link": "link7"}
+    expected = [(round(float(s), 5), item['link']) for s, item in exact.find_similar_listings(query)]
+    found = [(round(float(s), 5), item['link']) for s, item in approx.find_similar_listings(query)]
+    assert [s for s, _ in found] == [s for s, _ in expected]
+
+
+def test_failed_index_update_is_rebuilt_from_the_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", FakeModel)
+    evaluator = DealEvaluator(storage_file=tmp_path / "deal_data.pkl", ann_threshold=4, ann_probe=1000)
+    evaluator.add_listings([{"title": f"monitor {i}", "price": i, "link": f"link{i}"} for i in range(4)])
+
+    def broken_add(vectors):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(evaluator.ann, "add", broken_add)
+    assert evaluator.add_listings([{"title": "gaming monitor", "price": 9, "link": "new"}]) == 1
+    assert evaluator.ann.count == len(evaluator.data) == 5
+    found = evaluator.find_similar_listings({"title": "gaming monitor", "link": "q"}, threshold=0.9)
+    assert [item['link'] for _, item in found] == ["new"]
+
+
+def test_model_is_loaded_on_first_cache_miss(evaluator):
+    assert evaluator._model is None
+    evaluator.add_listing({"title": "gaming monitor", "price": 100, "link": "a"})
+    assert isinstance(evaluator._model, FakeModel)
@@ -1,20 +1,32 @@
 import os
 import sys
+import shutil
 from pathlib import Path
 import pytest
 from deal_evaluator import DealEvaluator
+from quantization import agreement_report
 
 @pytest.fixture
 def evaluator():
     storage_file = Path('data/test_deal_data.pkl')
+    store_path = storage_file.with_suffix('.store')
+    cache_file = storage_file.with_suffix('.cache.sqlite')
     if storage_file.exists():
         storage_file.unlink()
+    shutil.rmtree(store_path, ignore_errors=True)
+    for path in storage_file.parent.glob(cache_file.name + "*"):
+        path.unlink()
         
     evaluator = DealEvaluator(storage_file=storage_file)
     yield evaluator
     
+    evaluator.data.close()
+    evaluator.embedding_cache.close()
     if storage_file.exists():
         storage_file.unlink()
+    shutil.rmtree(store_path, ignore_errors=True)
+    for path in storage_file.parent.glob(cache_file.name + "*"):
+        path.unlink()
 
 def test_evaluator_logic(evaluator):
     listings = [
@@ -38,3 +50,37 @@ def test_evaluator_logic(evaluator):
     assert stats['average_price'] > 800
 
 
+@pytest.mark.integration
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_quantized_storage_agrees_with_float32(evaluator, dtype):
+    # Needs the real all-MiniLM-L6-v2 model (downloaded on first use)
+    try:
+        evaluator.model
+    except Exception as e:
+        pytest.skip(f"Embedding model unavailable: {e}")
+
+    listings = [
+        {"title": "MacBook Pro 2020", "description": "13 inch, M1, 8GB RAM", "attributes": ["apple", "laptop"], "price": 900, "link": "link1"},
+        {"title": "MacBook Pro M1", "description": "2020 model, 8GB memory, 256GB SSD", "attributes": ["apple", "notebook"], "price": 950, "link": "link2"},
+        {"title": "MacBook Pro 13", "description": "M1 chip, like new", "attributes": ["apple"], "price": 850, "link": "link3"},
+        {"title": "Old Dell Laptop", "description": "Windows 10, slow", "attributes": ["dell"], "price": 200, "link": "link4"},
+        {"title": "Gaming Monitor 27", "description": "144hz, 1ms, barely used", "attributes": ["monitor"], "price": 180, "link": "link6"},
+        {"title": "iPad Air 4th gen", "description": "64GB wifi, with case", "attributes": ["apple", "tablet"], "price": 300, "link": "link7"},
+    ]
+    evaluator.add_listings(listings)
+    queries = [
+        {"title": "MacBook Pro M1 2020", "description": "Great condition 8gb", "attributes": ["apple"], "price": 600, "link": "link5"},
+        {"title": "27 inch gaming monitor", "description": "144hz", "attributes": ["monitor"], "price": 150, "link": "link8"},
+        {"title": "iPad Air", "description": "wifi 64gb", "attributes": ["tablet"], "price": 350, "link": "link9"},
+    ]
+
+    quantized = DealEvaluator(storage_file=evaluator.storage_file, embedding_dtype=dtype)
+    try:
+        report = agreement_report(evaluator, quantized, queries + listings)
+    finally:
+        quantized.data.close()
+        quantized.embedding_cache.close()
+
+    assert report["recall"] == 1.0
+    assert report["rating_agreement"] == 1.0
+    assert report["compact_bytes"] < report["float32_bytes"]
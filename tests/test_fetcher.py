@@ -0,0 +1,59 @@
+import time
+import pytest
+from fetcher import AsyncFetcher, TokenBucket
+from scraper import fetch_details_many, parse_details
+from test_deep_fetch import SAMPLE_DETAIL_HTML
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=20, burst=2)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # Two tokens are free, the remaining four arrive at 20/s
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.08)
+
+
+def test_fetch_many_overlaps_slow_requests(local_server):
+    def slow(handler, body):
+        time.sleep(0.2)
+        return SAMPLE_DETAIL_HTML
+
+    for i in range(8):
+        local_server.routes[f"/item/{i}.html"] = (200, {}, slow)
+
+    fetcher = AsyncFetcher(concurrency=8, rate_limits={"default": {"rate": 1000, "burst": 8}})
+    urls = [f"{local_server.url}/item/{i}.html" for i in range(8)]
+
+    start = time.monotonic()
+    soups = fetch_details_many(urls, fetcher)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 8 * 0.2 / 2
+    assert all(parse_details(soup)["attributes"] == ["condition: good", "make: sony"] for soup in soups)
+
+
+def test_rate_limit_is_per_host(local_server):
+    local_server.routes["/item.html"] = (200, {}, "ok")
+    fetcher = AsyncFetcher(concurrency=8, rate_limits={"default": {"rate": 10, "burst": 1}})
+
+    start = time.monotonic()
+    responses = fetcher.fetch_many([f"{local_server.url}/item.html"] * 4)
+    assert time.monotonic() - start >= 0.28
+    assert [r.status_code for r in responses] == [200] * 4
+
+    # The same server under another host name has its own bucket, still full
+    other_host = local_server.url.replace("127.0.0.1", "localhost")
+    start = time.monotonic()
+    assert fetcher.get(f"{other_host}/item.html").status_code == 200
+    assert time.monotonic() - start < 0.08
+    # while the first host's bucket is still empty
+    start = time.monotonic()
+    fetcher.get(f"{local_server.url}/item.html")
+    assert time.monotonic() - start >= 0.08
+
+
+def test_failures_come_back_as_none(local_server):
+    fetcher = AsyncFetcher(rate_limits={"default": {"rate": 1000, "burst": 4}})
+    soups = fetch_details_many([f"{local_server.url}/missing.html", "http://127.0.0.1:1/refused"], fetcher)
+    assert soups == [None, None]
@@ -1,4 +1,5 @@
-from filters import matches_filters
+import random
+from filters import matches_filters, FilterEngine
 
 def test_filter_accepts_valid_item():
     item = {
@@ -27,3 +28,48 @@ def test_filter_rejects_expensive_item():
 
     rules = {"max_price": 300}
     assert matches_filters(item, rules) is False
+
+
+def test_engine_agrees_with_matches_filters():
+    rng = random.Random(0)
+    vocabulary = ["gaming", "game", "monitor", "27", "270", "144hz", "broken", "broke", "ipad", "pro", "ipad pro"]
+    searches = [
+        {
+            "name": f"search {i}",
+            "max_price": rng.choice([None, 100, 300]),
+            "keywords": {
+                "include": rng.sample(vocabulary, rng.randint(0, 2)),
+                "exclude": rng.sample(vocabulary, rng.randint(0, 3)),
+            },
+        }
+        for i in range(30)
+    ]
+    engine = FilterEngine(searches)
+
+    for _ in range(300):
+        item = {
+            "title": " ".join(rng.choice(vocabulary + ["excellent", "a"]) for _ in range(rng.randint(1, 6))),
+            "price": rng.choice([None, 50, 250, 500]),
+            "link": "test",
+        }
+        expected = [i for i, rules in enumerate(searches) if matches_filters(item, rules)]
+        assert engine.matching(item) == expected
+
+
+def test_engine_word_boundary_and_description():
+    engine = FilterEngine([
+        {"keywords": {"include": ["27"], "word_boundary": True}},
+        {"keywords": {"include": ["27"]}},
+        {"keywords": {"include": ["144hz"], "exclude": ["broken"], "match_description": True}},
+    ])
+    row = {"title": "270 gaming monitor", "price": 100, "link": "test"}
+    assert engine.matching(row) == [1, 2]  # search 2 defers its includes until the description is known
+
+    detailed = dict(row, description="Works great, 144Hz panel")
+    assert engine.matching(detailed) == [1, 2]
+    assert engine.matching(dict(row, description="Screen is broken")) == [1]
+    assert engine.matching({"title": "27\" monitor", "price": 1, "link": "x"}) == [0, 1, 2]
+    # Once the detail fetch is done, a missing description falls back to the title
+    assert engine.matching(row, defer_description=False) == [1]
+    assert engine.matching(dict(row, title="270 monitor 144hz"), defer_description=False) == [1, 2]
+
@@ -0,0 +1,80 @@
+import pytest
+from bs4 import BeautifulSoup
+import html_parsing
+from html_parsing import make_soup, SEARCH_RESULTS, DETAIL_PAGE
+from scraper import parse_listing, parse_details
+from test_deep_fetch import SAMPLE_DETAIL_HTML
+
+SAMPLE_SEARCH_HTML = """
+<html>
+<head><title>sya - craigslist</title><script>var x = "<li class='cl-static-search-result'>";</script></head>
+<body>
+    <div class="cl-search-toolbar">filters</div>
+    <ol class="cl-static-search-results">
+        <li class="cl-static-search-result" title="27&quot; Gaming Monitor">
+            <a href="https://ames.craigslist.org/sys/d/ames-27-gaming-monitor/7712345678.html">
+                <div class="title">27" Gaming Monitor 144Hz</div>
+                <div class="details">
+                    <div class="price">$1,150</div>
+                    <div class="location">Ames</div>
+                </div>
+            </a>
+        </li>
+        <li class="cl-static-search-result" title="iPad">
+            <a href="https://ames.craigslist.org/sys/d/ames-ipad/7712345679.html">
+                <div class="title">iPad Air</div>
+                <div class="details"><div class="price">free</div></div>
+            </a>
+        </li>
+    </ol>
+    <footer>about</footer>
+</body>
+</html>
+"""
+
+# The detail fixture from test_deep_fetch, with page chrome around the parts we read
+FULL_DETAIL_HTML = SAMPLE_DETAIL_HTML.replace(
+    "<body>",
+    '<body><header class="global-header"><a href="/">craigslist</a></header>'
+    '<p class="attrgroup"><span>odometer: 1000</span></p>'
+    '<div class="mapAndAttrs"><div class="attrgroup"><span class="labl">cryptocurrency ok</span></div></div>',
+)
+
+BACKENDS = [name for name in html_parsing.BACKENDS if name != "lxml" or html_parsing.HAS_LXML]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    previous = html_parsing.get_backend()
+    html_parsing.set_backend(request.param)
+    yield request.param
+    html_parsing.set_backend(previous)
+
+
+@pytest.mark.parametrize("html", [SAMPLE_DETAIL_HTML, FULL_DETAIL_HTML])
+def test_parse_details_parity(backend, html):
+    expected = parse_details(BeautifulSoup(html, "html.parser"))
+    assert parse_details(make_soup(html, DETAIL_PAGE)) == expected
+    assert parse_details(make_soup(html)) == expected
+
+
+def test_parse_listing_parity(backend):
+    expected = [parse_listing(row) for row in BeautifulSoup(SAMPLE_SEARCH_HTML, "html.parser").select(".cl-static-search-result")]
+    rows = make_soup(SAMPLE_SEARCH_HTML, SEARCH_RESULTS).select(".cl-static-search-result")
+
+    assert [parse_listing(row) for row in rows] == expected
+    assert expected[0]["price"] == 1150
+    assert expected[1]["price"] is None
+
+
+def test_filtered_tree_only_keeps_needed_subtrees(backend):
+    soup = make_soup(FULL_DETAIL_HTML, DETAIL_PAGE)
+    if html_parsing.SubtreeFilter is None:
+        pytest.skip("beautifulsoup4 without parse-time filters builds the full tree")
+    assert soup.select_one(".global-header") is None
+    assert len(soup.select(".attrgroup")) == 3
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        html_parsing.set_backend("html5lib")
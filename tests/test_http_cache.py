@@ -0,0 +1,95 @@
+from fetcher import AsyncFetcher
+from http_cache import DetailCache
+from http_client import HttpClient
+from scraper import fetch_parsed_details, fetch_parsed_details_many
+from test_deep_fetch import SAMPLE_DETAIL_HTML
+
+
+def test_not_modified_pages_come_from_cache(local_server, tmp_path):
+    local_server.routes["/item.html"] = (200, {"ETag": '"v1"', "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"}, SAMPLE_DETAIL_HTML)
+    client = HttpClient()
+    cache = DetailCache(tmp_path / "cache.sqlite")
+    url = f"{local_server.url}/item.html"
+
+    first = fetch_parsed_details(url, client=client, cache=cache)
+    assert first["images"] == ["image1.jpg", "image2.jpg"]
+    assert "If-None-Match" not in local_server.requests[0][2]
+
+    local_server.routes["/item.html"] = (304, {"ETag": '"v1"'}, b"")
+    second = fetch_parsed_details(url, client=client, cache=cache)
+    assert second == first
+    headers = local_server.requests[1][2]
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Mon, 05 Oct 2026 10:00:00 GMT"
+
+    stats = cache.stats()
+    assert stats["not_modified"] == 1 and stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["bytes_saved"] == len(SAMPLE_DETAIL_HTML.encode())
+
+
+def test_unchanged_body_skips_parse_and_changed_body_reparses(local_server, tmp_path, monkeypatch):
+    local_server.routes["/item.html"] = (200, {}, SAMPLE_DETAIL_HTML)
+    client = HttpClient()
+    cache = DetailCache(tmp_path / "cache.sqlite")
+    url = f"{local_server.url}/item.html"
+    first = fetch_parsed_details(url, client=client, cache=cache)
+
+    import scraper
+    monkeypatch.setattr(scraper, "_parse_response", lambda res: (_ for _ in ()).throw(AssertionError("parsed")))
+    assert fetch_parsed_details(url, client=client, cache=cache) == first
+    assert cache.stats()["unchanged"] == 1
+    monkeypatch.undo()
+
+    local_server.routes["/item.html"] = (200, {}, SAMPLE_DETAIL_HTML.replace("great item", "updated item"))
+    updated = fetch_parsed_details(url, client=client, cache=cache)
+    assert "updated item" in updated["description"]
+    assert cache.lookup(url).details == updated
+
+
+def test_fetch_many_uses_cache_across_runs(local_server, tmp_path):
+    local_server.routes["/a.html"] = (200, {"ETag": '"a"'}, SAMPLE_DETAIL_HTML)
+    local_server.routes["/b.html"] = (200, {"ETag": '"b"'}, SAMPLE_DETAIL_HTML)
+    urls = [f"{local_server.url}/a.html", f"{local_server.url}/b.html"]
+    fetcher = AsyncFetcher(rate_limits={"default": {"rate": 100, "burst": 10}})
+
+    cache = DetailCache(tmp_path / "cache.sqlite")
+    first = fetch_parsed_details_many(urls, fetcher, cache=cache)
+    cache.close()
+
+    # A later run reopens the same file
+    local_server.routes["/a.html"] = (304, {}, b"")
+    local_server.routes["/b.html"] = (304, {}, b"")
+    cache = DetailCache(tmp_path / "cache.sqlite")
+    assert fetch_parsed_details_many(urls, fetcher, cache=cache) == first
+    assert cache.stats()["not_modified"] == 2
+    sent = {path: headers.get("If-None-Match") for _, path, headers, _ in local_server.requests[2:]}
+    assert sent == {"/a.html": '"a"', "/b.html": '"b"'}
+
+
+def test_lru_eviction_respects_size_cap(tmp_path):
+    details = {"description": "x" * 100}
+    cache = DetailCache(tmp_path / "cache.sqlite", max_bytes=250)
+    cache.store("a", None, None, "h", 1, details)
+    cache.store("b", None, None, "h", 1, details)
+    cache._touch("a")
+    cache.store("c", None, None, "h", 1, details)
+
+    assert cache.lookup("a") is not None
+    assert cache.lookup("b") is None
+    assert cache.lookup("c") is not None
+
+    # The running total survives a reopen and replacing a page does not count it twice
+    cache.store("c", None, None, "h2", 1, details)
+    cache.close()
+    reopened = DetailCache(tmp_path / "cache.sqlite", max_bytes=250)
+    reopened.store("d", None, None, "h", 1, details)
+    assert [url for url in "acd" if reopened.lookup(url)] == ["c", "d"]
+
+
+def test_empty_details_are_not_cached(local_server, tmp_path):
+    local_server.routes["/empty.html"] = (200, {"ETag": '"e"'}, "<html><body></body></html>")
+    url = f"{local_server.url}/empty.html"
+    cache = DetailCache(tmp_path / "cache.sqlite")
+    assert fetch_parsed_details(url, client=HttpClient(), cache=cache) == {}
+    assert cache.lookup(url) is None
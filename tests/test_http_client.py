@@ -0,0 +1,41 @@
+import gzip
+import json
+from http_client import HttpClient
+from notifier import notify_discord
+from scraper import fetch_details, parse_details
+from test_deep_fetch import SAMPLE_DETAIL_HTML
+
+
+def test_connections_are_reused_across_calls(local_server):
+    local_server.routes["/item.html"] = (200, {"Content-Encoding": "gzip"}, gzip.compress(SAMPLE_DETAIL_HTML.encode()))
+    local_server.routes["/webhook"] = (204, {}, b"")
+    client = HttpClient(headers={"User-Agent": "test-agent"})
+
+    for _ in range(3):
+        details = parse_details(fetch_details(f"{local_server.url}/item.html", client=client))
+        assert details["images"] == ["image1.jpg", "image2.jpg"]
+    notify_discord(f"{local_server.url}/webhook", {"title": "monitor", "price": 100, "link": "x"}, "Test", client=client)
+
+    stats = client.stats()
+    host = f"127.0.0.1:{local_server.server_address[1]}"
+    assert stats[host] == {"requests": 4, "connections": 1}
+
+    method, path, headers, body = local_server.requests[-1]
+    assert (method, path) == ("POST", "/webhook")
+    assert json.loads(body)["embeds"][0]["title"] == "monitor"
+    assert "gzip" in local_server.requests[0][2]["Accept-Encoding"]
+    assert local_server.requests[0][2]["User-Agent"] == "test-agent"
+
+
+def test_timeout_comes_from_http_config_or_legacy_fetch_key(local_server):
+    assert HttpClient.from_config({"timeout": 5}, fetch_config={"timeout": 3}).timeout == 5
+    assert HttpClient.from_config(None, fetch_config={"timeout": 3}).timeout == 3
+
+    # The notifier leaves the timeout to the client
+    local_server.routes["/webhook"] = (204, {}, b"")
+    client = HttpClient(timeout=2)
+    sent = []
+    post = client.session.post
+    client.session.post = lambda url, **kwargs: sent.append(kwargs["timeout"]) or post(url, **kwargs)
+    notify_discord(f"{local_server.url}/webhook", {"title": "monitor", "price": 100, "link": "x"}, "Test", client=client)
+    assert sent == [2]
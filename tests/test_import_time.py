@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import pytest
+from conftest import PROJECT_ROOT
+
+# Generous enough for a slow CI machine; torch alone takes several seconds
+IMPORT_BUDGET_SECONDS = 1.0
+HEAVY_MODULES = ("torch", "sentence_transformers", "sklearn", "joblib")
+
+
+def _import_times(module):
+    """
+    Returns {module name: cumulative import microseconds} from `python -X importtime`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", ["scraper", "filters", "state", "notifier"])
+def test_cli_modules_import_within_budget(module):
+    times = _import_times(module)
+    assert times[module] / 1e6 < IMPORT_BUDGET_SECONDS
+    assert not [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+
+
+@pytest.mark.parametrize("module", ["deal_evaluator", "main"])
+def test_ml_stack_is_not_imported_until_first_encode(module):
+    times = _import_times(module)
+    assert not [name for name in times if name.split(".")[0] in HEAVY_MODULES]
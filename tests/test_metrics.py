@@ -0,0 +1,70 @@
+import json
+import pytest
+import metrics
+from http_client import HttpClient
+from scraper import fetch_details
+from test_deep_fetch import SAMPLE_DETAIL_HTML
+
+
+@pytest.fixture
+def enabled_metrics(tmp_path):
+    metrics.registry.reset()
+    metrics.enable(tmp_path / "metrics.prom", tmp_path / "summary.json")
+    yield tmp_path
+    metrics.disable()
+    metrics.registry.reset()
+
+
+def test_disabled_metrics_record_nothing():
+    metrics.registry.reset()
+    metrics.disable()
+    metrics.inc("things_total")
+    with metrics.timer("thing_seconds"):
+        pass
+    assert metrics.registry.summary() == {"counters": {}, "histograms": {}}
+
+
+def test_counters_and_histograms_are_exposed(enabled_metrics):
+    metrics.inc("requests_total", page="search", status=200)
+    metrics.inc("requests_total", 2, page="search", status=200)
+    for value in (0.002, 0.02, 0.2):
+        metrics.observe("request_seconds", value, page="details")
+
+    text = metrics.registry.prometheus_text()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{page="search",status="200"} 3' in text
+    assert "# TYPE request_seconds histogram" in text
+    assert 'request_seconds_bucket{page="details",le="0.0025"} 1' in text
+    assert 'request_seconds_bucket{page="details",le="+Inf"} 3' in text
+    assert 'request_seconds_count{page="details"} 3' in text
+
+    summary = metrics.registry.summary()["histograms"]['request_seconds{page="details"}']
+    assert summary["count"] == 3 and summary["p50"] == 0.02 and summary["max"] == 0.2
+
+
+def test_write_produces_both_files(enabled_metrics):
+    with metrics.timer("run_seconds"):
+        pass
+    metrics.write()
+    assert "run_seconds_count 1" in (enabled_metrics / "metrics.prom").read_text()
+    assert json.loads((enabled_metrics / "summary.json").read_text())["histograms"]["run_seconds"]["count"] == 1
+
+
+def test_written_values_are_cumulative_across_runs(enabled_metrics):
+    for _ in range(2):
+        metrics.inc("runs_total")
+        metrics.write()
+    summary = json.loads((enabled_metrics / "summary.json").read_text())
+    assert summary["counters"]["runs_total"] == 2
+    assert summary["since"] == metrics.registry.started
+    assert "runs_total 2" in (enabled_metrics / "metrics.prom").read_text()
+
+
+def test_scraper_records_fetch_latency(enabled_metrics, local_server):
+    local_server.routes["/item.html"] = (200, {}, SAMPLE_DETAIL_HTML)
+    fetch_details(f"{local_server.url}/item.html", client=HttpClient())
+
+    summary = metrics.registry.summary()
+    assert summary["counters"]['scraper_responses_total{page="details",status="200"}'] == 1
+    assert summary["histograms"]["scraper_fetch_details_seconds"]["count"] == 1
+    assert summary["histograms"]['scraper_parse_seconds{page="details"}']["count"] == 1
@@ -0,0 +1,150 @@
+import json
+import time
+from http_client import HttpClient
+from notifier import DiscordDispatcher, build_embed
+
+
+def _item(n, **extra):
+    return {"title": f"monitor {n}", "price": 100 + n, "link": f"https://example.org/{n}.html", **extra}
+
+
+def _posted_embeds(server):
+    return [json.loads(body)["embeds"] for method, _, _, body in server.requests if method == "POST"]
+
+
+def _dispatcher(server, tmp_path, **kwargs):
+    kwargs.setdefault("flush_interval", 0.05)
+    return DiscordDispatcher(f"{server.url}/webhook", client=HttpClient(), outbox_path=tmp_path / "outbox.sqlite", **kwargs)
+
+
+def test_alerts_are_packed_ten_per_message(local_server, tmp_path):
+    local_server.routes["/webhook"] = (204, {}, b"")
+    dispatcher = _dispatcher(local_server, tmp_path, flush_interval=10)
+    for n in range(25):
+        dispatcher.enqueue(_item(n), "Test")
+    dispatcher.close()
+
+    messages = _posted_embeds(local_server)
+    assert [len(embeds) for embeds in messages] == [10, 10, 5]
+    assert [embed["title"] for embeds in messages for embed in embeds] == [f"monitor {n}" for n in range(25)]
+
+
+def test_large_embeds_respect_message_size(local_server, tmp_path):
+    local_server.routes["/webhook"] = (204, {}, b"")
+    dispatcher = _dispatcher(local_server, tmp_path, flush_interval=10)
+    for n in range(6):
+        dispatcher.enqueue(_item(n, description="x" * 2000, attributes=["y" * 1200]), "Test")
+    dispatcher.close()
+
+    # Each embed carries ~2000 characters, so only two fit under Discord's 6000
+    assert [len(embeds) for embeds in _posted_embeds(local_server)] == [2, 2, 2]
+
+
+def test_429_waits_for_retry_after(local_server, tmp_path):
+    attempts = []
+
+    def respond(handler, body):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            return 429, {"Content-Type": "application/json"}, json.dumps({"retry_after": 0.3, "global": False})
+        return 204, {}, b""
+
+    local_server.routes["/webhook"] = (200, {}, respond)
+    dispatcher = _dispatcher(local_server, tmp_path)
+    dispatcher.enqueue(_item(1), "Test")
+    dispatcher.close()
+
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.3
+    assert dispatcher.embeds_sent == 1 and dispatcher.retries == 1
+
+
+def test_exhausted_bucket_delays_next_message(local_server, tmp_path):
+    attempts = []
+
+    def respond(handler, body):
+        attempts.append(time.monotonic())
+        return 204, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.3"}, b""
+
+    local_server.routes["/webhook"] = (200, {}, respond)
+    dispatcher = _dispatcher(local_server, tmp_path, flush_interval=10)
+    for n in range(11):
+        dispatcher.enqueue(_item(n), "Test")
+    dispatcher.close()
+
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.3
+
+
+def test_undelivered_alerts_survive_restart(local_server, tmp_path):
+    local_server.routes["/webhook"] = (503, {}, b"unavailable")
+    dispatcher = _dispatcher(local_server, tmp_path, max_retries=1, backoff_base=0.01)
+    dispatcher.enqueue(_item(1), "Test")
+    dispatcher.enqueue(_item(2, old_price=150), "Test")
+    dispatcher.close(timeout=1)
+    assert dispatcher.embeds_sent == 0
+
+    local_server.routes["/webhook"] = (204, {}, b"")
+    restarted = _dispatcher(local_server, tmp_path)
+    restarted.close()
+
+    delivered = _posted_embeds(local_server)[-1]
+    assert [embed["title"] for embed in delivered] == ["monitor 1", "📉 PRICE DROP: monitor 2"]
+    assert restarted.embeds_sent == 2
+
+
+def test_rejected_payloads_are_dropped(local_server, tmp_path):
+    local_server.routes["/webhook"] = (400, {}, b'{"message": "Invalid Form Body"}')
+    dispatcher = _dispatcher(local_server, tmp_path)
+    dispatcher.enqueue(_item(1), "Test")
+    dispatcher.close()
+    assert dispatcher.embeds_dropped == 1
+
+
+def test_rejected_message_is_resent_one_embed_at_a_time(local_server, tmp_path):
+    def reject_bad(handler, body):
+        titles = [embed["title"] for embed in json.loads(body)["embeds"]]
+        if any("bad" in title for title in titles):
+            return 400, {}, b'{"message": "Invalid Form Body"}'
+        return 204, {}, b""
+
+    local_server.routes["/webhook"] = (204, {}, reject_bad)
+    dispatcher = _dispatcher(local_server, tmp_path, flush_interval=0.2)
+    dispatcher.enqueue(_item(1), "Test")
+    dispatcher.enqueue(_item(2, title="bad monitor"), "Test")
+    dispatcher.enqueue(_item(3), "Test")
+    dispatcher.close()
+    assert (dispatcher.embeds_sent, dispatcher.embeds_dropped) == (2, 1)
+
+
+def test_refused_webhook_gives_up_after_max_retries(local_server, tmp_path):
+    local_server.routes["/webhook"] = (403, {}, b'{"message": "Missing Access"}')
+    dispatcher = _dispatcher(local_server, tmp_path, max_retries=2, backoff_cap=0.05)
+    dispatcher.enqueue(_item(1), "Test")
+    deadline = time.monotonic() + 5
+    while dispatcher.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    dispatcher.close()
+    assert dispatcher.embeds_dropped == 1
+    assert len(_posted_embeds(local_server)) == 3
+
+
+def test_refused_webhook_keeps_alerts_queued(local_server, tmp_path):
+    local_server.routes["/webhook"] = (404, {}, b'{"message": "Unknown Webhook"}')
+    dispatcher = _dispatcher(local_server, tmp_path)
+    dispatcher.enqueue(_item(1), "Test")
+    dispatcher.close(timeout=0.5)
+    assert dispatcher.embeds_dropped == 0
+    # Backs off instead of hammering the refused webhook
+    assert len(_posted_embeds(local_server)) == 1
+
+    local_server.routes["/webhook"] = (204, {}, b"")
+    restarted = _dispatcher(local_server, tmp_path)
+    restarted.close()
+    assert restarted.embeds_sent == 1
+
+
+def test_price_drop_is_labelled_once():
+    embed = build_embed(_item(1, old_price=200), "Test")
+    assert embed["title"] == "📉 PRICE DROP: monitor 1"
+    assert [field["name"] for field in embed["fields"]].count("Old Price") == 1
@@ -0,0 +1,61 @@
+from fetcher import AsyncFetcher
+from http_cache import DetailCache
+import scraper
+from parse_pool import ParsePool
+from scraper import fetch_parsed_details_many, parse_details
+from html_parsing import make_soup, DETAIL_PAGE
+from test_html_parsing import SAMPLE_SEARCH_HTML, FULL_DETAIL_HTML
+from test_deep_fetch import SAMPLE_DETAIL_HTML
+
+
+def test_pool_matches_in_process_parsing():
+    pages = [SAMPLE_DETAIL_HTML, FULL_DETAIL_HTML, "<html>not a listing</html>"] * 5
+    with ParsePool(workers=0, chunk_size=4) as inline, ParsePool(workers=2, chunk_size=4) as pool:
+        expected = inline.parse_details_many(pages)
+        assert pool.parse_details_many(pages) == expected
+        assert pool.parse_search(SAMPLE_SEARCH_HTML) == inline.parse_search(SAMPLE_SEARCH_HTML)
+    assert expected[0] == parse_details(make_soup(SAMPLE_DETAIL_HTML, DETAIL_PAGE))
+    assert expected[2] == {}
+
+
+def test_search_page_rows_become_listing_dicts():
+    with ParsePool(workers=1) as pool:
+        items = pool.parse_search(SAMPLE_SEARCH_HTML)
+    assert [(item["title"], item["price"]) for item in items] == [('27" gaming monitor 144hz', 1150), ("ipad air", None)]
+
+
+def test_fetch_many_parses_in_pool_and_fills_cache(local_server, tmp_path):
+    local_server.routes["/a.html"] = (200, {"ETag": '"a"'}, SAMPLE_DETAIL_HTML)
+    local_server.routes["/b.html"] = (200, {}, FULL_DETAIL_HTML)
+    urls = [f"{local_server.url}/a.html", f"{local_server.url}/b.html", f"{local_server.url}/missing.html"]
+    fetcher = AsyncFetcher(rate_limits={"default": {"rate": 100, "burst": 10}})
+    cache = DetailCache(tmp_path / "cache.sqlite")
+
+    with ParsePool(workers=2, chunk_size=1) as pool:
+        results = fetch_parsed_details_many(urls, fetcher, cache=cache, pool=pool)
+
+    assert results[0] == parse_details(make_soup(SAMPLE_DETAIL_HTML, DETAIL_PAGE))
+    assert results[1] == parse_details(make_soup(FULL_DETAIL_HTML, DETAIL_PAGE))
+    assert results[2] == {}
+    assert cache.lookup(urls[0]).etag == '"a"'
+    assert cache.stats()["misses"] == 2
+
+
+def test_malformed_page_yields_empty_details_in_process(local_server, tmp_path, monkeypatch):
+    local_server.routes["/a.html"] = (200, {}, SAMPLE_DETAIL_HTML)
+    local_server.routes["/bad.html"] = (200, {}, "<html><body><section id='postingbody'>broken</section></body></html>")
+    urls = [f"{local_server.url}/a.html", f"{local_server.url}/bad.html"]
+    fetcher = AsyncFetcher(rate_limits={"default": {"rate": 100, "burst": 10}})
+    cache = DetailCache(tmp_path / "cache.sqlite")
+
+    def parse(soup):
+        if "broken" in soup.get_text():
+            raise KeyError("href")
+        return parse_details(soup)
+
+    monkeypatch.setattr(scraper, "parse_details", parse)
+    results = fetch_parsed_details_many(urls, fetcher, cache=cache)
+
+    assert results == [parse_details(make_soup(SAMPLE_DETAIL_HTML, DETAIL_PAGE)), {}]
+    # The failed parse is retried on the next run instead of being cached
+    assert cache.lookup(urls[1]) is None
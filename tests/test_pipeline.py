@@ -0,0 +1,124 @@
+import threading
+import time
+import main
+from pipeline import Pipeline, Stage
+from state import SeenStore
+
+
+def test_stages_flat_map_and_batch():
+    batches = []
+
+    def split(n):
+        return [n, n + 100]
+
+    def keep_even(n):
+        return [n] if n % 2 == 0 else None
+
+    def collect(batch):
+        batches.append(len(batch))
+        return [sum(batch)]
+
+    pipeline = Pipeline([
+        Stage("split", split, workers=3),
+        Stage("even", keep_even, workers=2),
+        Stage("sum", collect, batch_size=4, batch_wait=0.05),
+    ])
+    results = pipeline.run(range(10))
+
+    assert sum(results) == sum(n + (n + 100) for n in range(0, 10, 2))
+    assert all(size <= 4 for size in batches)
+    assert sum(batches) == 10
+
+
+def test_slow_stages_overlap():
+    def download(n):
+        time.sleep(0.1)
+        return [n]
+
+    def encode(n):
+        time.sleep(0.1)
+        return [n]
+
+    pipeline = Pipeline([Stage("download", download, workers=4), Stage("encode", encode, workers=1)])
+    start = time.monotonic()
+    assert sorted(pipeline.run(range(8))) == list(range(8))
+    # Serial would take 1.6s; downloads run 4 at a time while encoding proceeds
+    assert time.monotonic() - start < 1.2
+
+
+def test_failures_are_counted_and_dropped():
+    def explode(n):
+        if n == 3:
+            raise ValueError("bad row")
+        return [n]
+
+    stage = Stage("explode", explode, workers=2)
+    assert sorted(Pipeline([stage]).run(range(5))) == [0, 1, 2, 4]
+    assert (stage.processed, stage.failed) == (4, 1)
+
+
+def test_bounded_queue_applies_backpressure():
+    produced = []
+    release = threading.Event()
+
+    def produce(n):
+        produced.append(n)
+        return [n]
+
+    def blocked(n):
+        release.wait()
+        return [n]
+
+    pipeline = Pipeline([Stage("produce", produce), Stage("blocked", blocked, queue_size=2)])
+    runner = threading.Thread(target=pipeline.run, args=(range(20),))
+    runner.start()
+    time.sleep(0.2)
+    # One item in the blocked worker, two queued, one waiting to be put
+    assert len(produced) <= 4
+    release.set()
+    runner.join()
+    assert len(produced) == 20
+
+
+def _scanner(searches, tmp_path):
+    scanner = main.Scanner.__new__(main.Scanner)
+    scanner.fetcher = scanner.detail_cache = None
+    scanner.seen = SeenStore(tmp_path / "state.sqlite")
+    scanner._seen_lock = threading.Lock()
+    scanner.configure({"searches": searches})
+    return scanner
+
+
+def test_failed_detail_fetch_checks_includes_against_title(tmp_path, monkeypatch):
+    def fail(link, fetcher=None, cache=None):
+        raise ConnectionError("timed out")
+
+    monkeypatch.setattr(main, "fetch_parsed_details", fail)
+    search = {"name": "monitors", "keywords": {"include": ["144hz"], "match_description": True}}
+    scanner = _scanner([search], tmp_path)
+
+    assert scanner.details_stage(([search], {"title": "gaming monitor", "price": 100, "link": "a"}, None)) == []
+    item = {"title": "144hz gaming monitor", "price": 100, "link": "b"}
+    assert scanner.details_stage(([search], item, None)) == [(search, item, None)]
+
+    monkeypatch.setattr(main, "fetch_parsed_details", lambda link, fetcher=None, cache=None: {})
+    assert scanner.details_stage(([search], {"title": "gaming monitor", "price": 100, "link": "c"}, None)) == []
+    # Only the listing that matched is recorded as seen
+    assert "b" in scanner.seen and "a" not in scanner.seen and "c" not in scanner.seen
+
+
+def test_listing_goes_to_the_next_search_when_the_description_check_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "fetch_parsed_details", lambda link, fetcher=None, cache=None: {"description": "screen is broken"})
+    described = {"name": "Working", "keywords": {"include": ["monitor"], "exclude": ["broken"], "match_description": True}}
+    titled = {"name": "Any", "keywords": {"include": ["monitor"]}}
+    scanner = _scanner([described, titled], tmp_path)
+
+    row = {"title": "gaming monitor", "price": 100, "link": "a"}
+    item = dict(row)
+    [work] = scanner.dedupe_stage(([described, titled], item))
+    assert scanner.details_stage(work) == [(titled, item, None)]
+    assert scanner.seen["a"] == 100
+
+    # Seen at the same price: a second copy of the listing (e.g. from another fetch) is not alerted twice
+    assert scanner.details_stage(([described, titled], dict(row), None)) == []
+    assert scanner.dedupe_stage(([titled], dict(row))) == []
@@ -0,0 +1,61 @@
+from planner import plan_searches
+
+BASE = {"location": "ames", "category": "sya", "lat": 42.0, "lon": -93.6, "search_distance": 72}
+
+
+def search(name, query, **overrides):
+    return {**BASE, "name": name, "query": query, **overrides}
+
+
+def test_identical_requests_are_coalesced():
+    searches = [
+        search("Monitor A", "monitor"),
+        search("Monitor B", "Monitor", max_price=100),
+        search("iPad", "ipad"),
+        search("Monitor elsewhere", "monitor", location="dallas"),
+    ]
+    plans = plan_searches(searches)
+
+    assert len(plans) == 3
+    assert [s["name"] for s, _ in plans[0].searches] == ["Monitor A", "Monitor B"]
+    assert plans[0].params["query"] == "monitor"
+
+
+def test_geo_is_ignored_unless_complete():
+    plans = plan_searches([search("A", "tv", lat=None), search("B", "tv", lat=None, lon=1.0)])
+    assert len(plans) == 1
+
+
+def test_subsumed_queries_filter_titles():
+    searches = [search("Gaming", "gaming monitor"), search("Any", "monitor"), search("Everything", "")]
+    assert len(plan_searches(searches)) == 3
+
+    plans = plan_searches(searches, subsume_queries=True)
+    assert len(plans) == 1
+    plan = plans[0]
+    assert plan.params["query"] == ""
+
+    items = [{"title": "27 gaming monitor"}, {"title": "office monitor"}, {"title": "desk"}]
+    served = {s["name"]: [i["title"] for i in plan.rows_for(items, terms)] for s, terms in plan.searches}
+    assert served == {
+        "Everything": ["27 gaming monitor", "office monitor", "desk"],
+        "Any": ["27 gaming monitor", "office monitor"],
+        "Gaming": ["27 gaming monitor"],
+    }
+
+
+def test_queries_with_operators_are_not_subsumed():
+    searches = [
+        search("Working", "monitor -broken"),
+        search("Either", "monitor dell|hp"),
+        search("Phrase", '"gaming monitor"'),
+        search("Any", "monitor"),
+        search("Everything", ""),
+    ]
+    plans = plan_searches(searches, subsume_queries=True)
+    assert sorted(plan.params["query"] for plan in plans) == ["", '"gaming monitor"', "monitor -broken", "monitor dell|hp"]
+    extra = {s["name"]: terms for plan in plans for s, terms in plan.searches}
+    assert extra == {
+        "Working": frozenset(), "Either": frozenset(), "Phrase": frozenset(),
+        "Any": frozenset({"monitor"}), "Everything": frozenset(),
+    }
@@ -0,0 +1,86 @@
+import numpy as np
+import deal_evaluator
+from deal_evaluator import DealEvaluator
+import price_clusters
+from price_clusters import PriceClusters
+from test_ann_index import clustered_vectors
+from test_evaluator_index import FakeModel
+
+
+def test_stats_track_adds_and_survive_reopen(tmp_path):
+    vectors = clustered_vectors(400, clusters=4)
+    prices = [100 + (i % 7) * 10 for i in range(400)]
+    clusters = PriceClusters.build(tmp_path / "clusters", vectors[:300], prices[:300], n_clusters=4)
+    clusters.add(vectors[300:], prices[300:-1] + [None])
+    assert clusters.count == 400
+
+    # Every priced row lands in exactly one cluster
+    assert sum(len(values) for values in clusters.prices) == 399
+    assert clusters.counts.sum() == 400
+
+    stats = clusters.stats(vectors[0], min_samples=1)
+    k = stats["clusters"][0]
+    assert stats["count"] == len(clusters.prices[k])
+    assert stats["median"] == np.median(clusters.prices[k])
+    assert stats["mean"] == np.mean(clusters.prices[k])
+    assert stats["p25"] <= stats["median"] <= stats["p75"]
+    clusters.close()
+
+    reopened = PriceClusters(tmp_path / "clusters")
+    assert reopened.count == 400
+    assert np.allclose(reopened.centroids, clusters.centroids)
+    assert reopened.prices == clusters.prices
+    reopened.close()
+
+
+def test_sparse_clusters_pool_with_neighbours_and_exclude_own_price(tmp_path):
+    vectors = clustered_vectors(200, clusters=4)
+    clusters = PriceClusters.build(tmp_path / "clusters", vectors, [50] * 200, n_clusters=4)
+    k = clusters.cluster_of(0)
+    assert clusters.stats(vectors[0], min_samples=10**6)["clusters"][0] == k
+
+    alone = len(clusters.prices[k])
+    assert clusters.stats(vectors[0], min_samples=1, exclude=(k, 50))["count"] == alone - 1
+    assert clusters.stats(-vectors[0], threshold=0.99) is None
+
+
+def test_cluster_rating_is_opt_in_and_uses_the_median(tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", FakeModel)
+    neighbours = DealEvaluator(storage_file=tmp_path / "a" / "deal_data.pkl")
+    assert neighbours.clusters is None
+
+    evaluator = DealEvaluator(storage_file=tmp_path / "b" / "deal_data.pkl", rating="clusters", n_clusters=2, cluster_min_rows=10)
+    monitors = [{"title": f"gaming monitor 27 inch {i}", "price": 200 + i, "link": f"m{i}"} for i in range(10)]
+    assert evaluator.add_listings(monitors) == 10
+    assert evaluator.clusters is not None and evaluator.clusters.count == 10
+    # Added after the clusters exist, so it goes through the incremental update
+    evaluator.add_listing({"title": "gaming monitor 27 inch outlier", "price": 5000, "link": "m-out"})
+
+    rating, stats = evaluator.evaluate_deal({"title": "gaming monitor 27 inch", "price": 100, "link": "new"})
+    assert rating == "Incredible Deal"
+    assert stats["median_price"] < 300 and stats["sample_size"] >= 5
+
+    reopened = DealEvaluator(storage_file=tmp_path / "b" / "deal_data.pkl", rating="clusters", n_clusters=2, cluster_min_rows=10)
+    assert reopened.clusters.count == 11
+
+
+def test_centroids_are_saved_per_batch_of_rows_and_on_close(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_clusters, "SAVE_EVERY", 50)
+    vectors = clustered_vectors(300, clusters=4)
+    clusters = PriceClusters.build(tmp_path / "clusters", vectors[:200], [100] * 200, n_clusters=4)
+    saved = np.load(tmp_path / "clusters" / "counts.npy")
+
+    clusters.add(vectors[200:230], [100] * 30)
+    assert (np.load(tmp_path / "clusters" / "counts.npy") == saved).all()
+    clusters.add(vectors[230:260], [100] * 30)
+    assert np.load(tmp_path / "clusters" / "counts.npy").sum() == 260
+
+    # Crash without close: the rows are kept and the counts lag instead of running ahead
+    clusters.add(vectors[260:], [100] * 40)
+    crashed = PriceClusters(tmp_path / "clusters")
+    assert crashed.count == 300
+    assert crashed.counts.sum() == 260
+    crashed.close()
+
+    clusters.close()
+    assert PriceClusters(tmp_path / "clusters").counts.sum() == 300
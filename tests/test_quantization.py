@@ -0,0 +1,57 @@
+import numpy as np
+import deal_evaluator
+from deal_evaluator import DealEvaluator
+from deal_store import DealStore
+from quantization import agreement_report, quantize_int8
+from test_ann_index import clustered_vectors
+from test_evaluator_index import FakeModel
+
+
+def test_int8_round_trip_is_close():
+    vectors = clustered_vectors(200, dim=64)
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8
+    assert np.abs(codes * scales[:, None] - vectors).max() <= scales.max() / 2 + 1e-6
+    assert quantize_int8(np.zeros((1, 4)))[0].tolist() == [[0, 0, 0, 0]]
+
+
+def test_compact_copy_follows_the_store(tmp_path):
+    vectors = clustered_vectors(300, dim=16)
+    store = DealStore(tmp_path / "store")
+    store.extend([{"link": str(i)} for i in range(200)], vectors[:200])
+    store.close()
+
+    # Built from the float32 rows on first open, then appended alongside them
+    store = DealStore(tmp_path / "store", compact_dtype="int8")
+    assert len(store.compact) == 200
+    store.extend([{"link": str(i)} for i in range(200, 300)], vectors[200:])
+    assert store.compact.nbytes == 300 * (16 + 4)
+    assert np.allclose(store.compact[np.arange(300)], vectors, atol=0.02)
+    assert np.allclose(store.compact.scores(vectors[:3]), vectors[:3] @ vectors.T, atol=0.05)
+    store.close()
+
+    half = DealStore(tmp_path / "store", compact_dtype="float16")
+    assert half.compact.nbytes == 300 * 16 * 2
+    assert np.allclose(half.compact[np.arange(300)], vectors, atol=1e-3)
+
+
+def test_quantized_search_rescores_to_exact_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(deal_evaluator, "SentenceTransformer", FakeModel)
+    exact = DealEvaluator(storage_file=tmp_path / "deal_data.pkl")
+    # A wide vocabulary keeps exact ties (which either path may order differently) rare
+    words = [f"word{i}" for i in range(40)]
+    rng = np.random.default_rng(0)
+    exact.add_listings(
+        {"title": " ".join(rng.choice(words, 5)), "price": int(rng.integers(50, 900)), "link": f"l{i}"}
+        for i in range(300)
+    )
+    quantized = DealEvaluator(storage_file=tmp_path / "deal_data.pkl", embedding_dtype="int8", rescore=20)
+    queries = [{"title": " ".join(rng.choice(words, 3)), "price": 300, "link": f"q{i}"} for i in range(20)]
+
+    report = agreement_report(exact, quantized, queries)
+    assert report["dtype"] == "int8"
+    assert report["recall"] >= 0.9 and report["rating_agreement"] >= 0.9
+    assert report["compact_bytes"] * 3 < report["float32_bytes"]
+    # Rescored similarities are the exact ones
+    for (score, item), (expected, _) in zip(quantized.find_similar_listings(queries[0]), exact.find_similar_listings(queries[0])):
+        assert np.isclose(score, expected)
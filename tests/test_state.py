@@ -1,4 +1,5 @@
-from state import load_seen, save_seen
+import json
+from state import load_seen, save_seen, SeenStore
 
 def test_state_round_trip(tmp_path, monkeypatch):
     fake_state = tmp_path / "state.json"
@@ -13,3 +14,53 @@ def test_state_round_trip(tmp_path, monkeypatch):
     reloaded = load_seen()
     assert "https://example.com/item" in reloaded
     assert reloaded["https://example.com/item"] == 100
+
+
+def test_seen_store_batches_and_round_trips(tmp_path, monkeypatch):
+    monkeypatch.setattr("state.STATE_FILE", tmp_path / "state.json")
+    store = SeenStore(tmp_path / "state.sqlite", batch_size=2)
+
+    store["a"] = 100
+    assert "a" in store and store["a"] == 100
+    store["b"] = None
+    # The second write filled the batch, so both are on disk
+    other = SeenStore(tmp_path / "state.sqlite")
+    other.prefetch(["a", "b", "c"])
+    assert other["a"] == 100
+    assert "b" in other and other["b"] is None
+    assert "c" not in other
+    store.close()
+
+
+def test_seen_store_migrates_both_legacy_formats(tmp_path, monkeypatch):
+    legacy = tmp_path / "state.json"
+    monkeypatch.setattr("state.STATE_FILE", legacy)
+
+    legacy.write_text(json.dumps({"seen": ["https://example.com/old"]}))
+    store = SeenStore(tmp_path / "list.sqlite")
+    assert "https://example.com/old" in store and store["https://example.com/old"] is None
+
+    legacy.write_text(json.dumps({"seen": {"https://example.com/new": 75}}))
+    store = SeenStore(tmp_path / "dict.sqlite")
+    assert store["https://example.com/new"] == 75
+
+    # Migration only happens once per database
+    legacy.write_text(json.dumps({"seen": {"https://example.com/later": 1}}))
+    assert "https://example.com/later" not in SeenStore(tmp_path / "dict.sqlite")
+
+
+def test_seen_store_expires_stale_listings(tmp_path, monkeypatch):
+    monkeypatch.setattr("state.STATE_FILE", tmp_path / "state.json")
+    clock = [1_000_000.0]
+    monkeypatch.setattr("state.time.time", lambda: clock[0])
+
+    store = SeenStore(tmp_path / "state.sqlite")
+    store["stale"] = 10
+    store["fresh"] = 20
+    store.flush()
+
+    clock[0] += 10 * 86400
+    store.touch("fresh")
+    assert store.expire(ttl_days=5) == 1
+    assert "stale" not in store
+    assert store["fresh"] == 20